@@ -0,0 +1,373 @@
+# admission.py
+
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+
+# 🚩 서버 전체 LLM 작업 입장 제어 (공정 대기열 + 부하 차단)
+# 반 전체가 동시에 메시지를 보내도 OpenAI 호출은 동시에 max_concurrent개까지만 실행하고, 나머지는 대기열에서 기다립니다.
+#   - 순서: 사용자 메시지가 침묵 재촉보다 먼저, 같은 우선순위에서는 진행 중/대기 중인 요청이 적은 학생이 먼저,
+#           그다음 가장 오래전에 차례를 받은 학생, 마지막으로 도착 순서
+#           (한 학생이 연달아 보내도 학생 단위로 번갈아 입장하므로 다른 학생이 밀리지 않음)
+#   - 대기열이 max_queue를 넘거나 queue_timeout 안에 차례가 오지 않으면 AdmissionRejected → 429 + Retry-After
+#   - 대기 중에는 대기 순번(position, 1 = 다음 차례)을 알 수 있어 스트리밍 라우트가 SSE로 전달합니다.
+# 여러 gunicorn 워커가 같은 한도를 공유하도록 표(admission_tickets)는 SQLite 파일에 두고,
+# 대기 중 티켓은 heartbeat, 실행 중 티켓은 lease가 지나면 (워커 비정상 종료로 보고) 정리합니다.
+# 대기 중에는 티켓 표가 바뀔 때마다 올라가는 generation만 읽어 보고, 바뀌었을 때만 순서를 다시 계산합니다.
+# 바뀌지 않으면 확인 간격을 poll_interval에서 max_poll_interval까지 늘리고, 같은 워커에서 자리가 나면 바로 깨웁니다.
+
+KIND_PRIORITY = {'user': 0, 'nudge': 1, 'prefetch': 2, 'summary': 3}  # 작을수록 먼저 (사전 생성 재촉, 이전 대화 요약은 가장 나중)
+
+
+class AdmissionRejected(Exception):
+    """대기열이 가득 찼거나 기다리는 시간이 queue_timeout을 넘음"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """LLM 작업 입장 티켓 저장소 (티켓 하나 = 요청 하나)"""
+
+    def __init__(self, db_path, max_concurrent=12, max_queue=60, queue_timeout=20.0, nudge_queue_timeout=5.0,
+                 lease=120.0, heartbeat_timeout=10.0, poll_interval=0.1, max_poll_interval=1.0, metrics=None):
+        self.db_path = db_path
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout              # 사용자 메시지가 기다리는 최대 시간
+        self.nudge_queue_timeout = nudge_queue_timeout  # 재촉/사전 생성은 짧게 기다리고 포기 (다음 침묵 타이머에 다시 시도)
+        self.lease = lease
+        self.heartbeat_timeout = heartbeat_timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.metrics = metrics
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_full': 0, 'shed_timeout': 0}
+        self._local = threading.local()
+        self._released = threading.Condition()  # 이 워커에서 자리가 나면 기다리는 요청 스레드를 바로 깨움
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS admission_tickets (
+                ticket TEXT PRIMARY KEY,
+                student_id TEXT,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS admission_students (
+                student_id TEXT PRIMARY KEY,
+                last_admitted_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS admission_state (
+                id INTEGER PRIMARY KEY,
+                generation INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO admission_state (id, generation) VALUES (1, 0);
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def ticket(self, student_id, kind):
+        """with/async with 블록 하나 = LLM 작업 하나 (블록 안에서 OpenAI 호출)"""
+        return AdmissionTicket(self, student_id, kind)
+
+    def retry_after(self):
+        """지금 차단된 요청에 안내할 재시도 대기 시간(초)"""
+        return max(int(self.queue_timeout / 2), 1)
+
+    def _count(self, reason, kind):
+        self.stats[reason] += 1
+        if self.metrics:
+            self.metrics.inc('llm_admission_total', kind, reason)
+
+    # --- 티켓 단계 (DB 트랜잭션 하나) ---
+    def _expire(self, conn, now):
+        if conn.execute("DELETE FROM admission_tickets WHERE expires_at < ?", (now,)).rowcount:
+            self._bump(conn)
+
+    @staticmethod
+    def _bump(conn):
+        # 티켓 표가 바뀜 → 기다리는 요청들이 다음 확인 때 순서를 다시 계산
+        conn.execute("UPDATE admission_state SET generation = generation + 1 WHERE id = 1")
+
+    def _generation(self):
+        """티켓 표 변경 횟수 (잠금 없는 조회)"""
+        return self._connect().execute("SELECT generation FROM admission_state WHERE id = 1").fetchone()[0]
+
+    def _enqueue(self, ticket, student_id, priority):
+        """대기열에 넣습니다. 대기열이 가득 차면 False."""
+        now = time.time()
+
+        def enqueue(conn):
+            self._expire(conn, now)
+            (waiting,) = conn.execute("SELECT COUNT(*) FROM admission_tickets WHERE status = 'waiting'").fetchone()
+            if waiting >= self.max_queue:
+                return False
+            conn.execute(
+                "INSERT INTO admission_tickets (ticket, student_id, priority, status, enqueued_at, expires_at) VALUES (?, ?, ?, 'waiting', ?, ?)",
+                (ticket, student_id, priority, now, now + self.heartbeat_timeout)
+            )
+            self._bump(conn)
+            return True
+
+        return self._transaction(enqueue)
+
+    def _try_admit(self, ticket, student_id, priority):
+        """차례가 되면 실행 상태로 바꾸고 0, 아니면 대기 순번(1 = 다음 차례)을 반환합니다. → (순번, 확인 후 generation)"""
+        now = time.time()
+
+        def admit(conn):
+            # 순서를 확인하는 것 자체가 heartbeat → 오래 기다려도 만료되어 도착 순서를 잃지 않음
+            conn.execute(
+                "UPDATE admission_tickets SET expires_at = ? WHERE ticket = ? AND status = 'waiting'",
+                (now + self.heartbeat_timeout, ticket)
+            )
+            self._expire(conn, now)
+            rows = conn.execute(
+                "SELECT ticket, student_id, priority, status, enqueued_at FROM admission_tickets"
+            ).fetchall()
+            running = [row for row in rows if row[3] == 'running']
+            last_admitted = dict(conn.execute("SELECT student_id, last_admitted_at FROM admission_students").fetchall())
+            order = _fair_order(rows, last_admitted)
+            position = next((i for i, row in enumerate(order) if row[0] == ticket), None)
+            if position is None:
+                # heartbeat가 끊겨 정리된 티켓 (요청 스레드가 오래 멈춘 경우) → 다시 줄 서기
+                conn.execute(
+                    "INSERT INTO admission_tickets (ticket, student_id, priority, status, enqueued_at, expires_at) VALUES (?, ?, ?, 'waiting', ?, ?)",
+                    (ticket, student_id, priority, now, now + self.heartbeat_timeout)
+                )
+                self._bump(conn)
+                return len(order) + 1
+            free_slots = self.max_concurrent - len(running)
+            if position < free_slots:
+                conn.execute(
+                    "UPDATE admission_tickets SET status = 'running', expires_at = ? WHERE ticket = ?",
+                    (now + self.lease, ticket)
+                )
+                if student_id is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO admission_students (student_id, last_admitted_at) VALUES (?, ?)",
+                        (student_id, now)
+                    )
+                self._bump(conn)
+                return 0
+            return position - max(free_slots, 0) + 1
+
+        def admit_and_read(conn):
+            position = admit(conn)
+            return position, conn.execute("SELECT generation FROM admission_state WHERE id = 1").fetchone()[0]
+
+        return self._transaction(admit_and_read)
+
+    def _heartbeat(self, ticket):
+        """대기 중인 티켓이 살아 있음을 알림 (순서를 다시 계산하지 않는 동안 heartbeat_timeout의 1/3마다)"""
+        self._connect().execute(
+            "UPDATE admission_tickets SET expires_at = ? WHERE ticket = ? AND status = 'waiting'",
+            (time.time() + self.heartbeat_timeout, ticket)
+        )
+
+    def overloaded(self):
+        """대기열이 가득 찼는지 (스트리밍 라우트가 SSE를 시작하기 전에 429로 돌려보낼 때 사용)"""
+        (waiting,) = self._connect().execute(
+            "SELECT COUNT(*) FROM admission_tickets WHERE status = 'waiting' AND expires_at >= ?", (time.time(),)
+        ).fetchone()
+        return waiting >= self.max_queue
+
+    def has_waiting(self):
+        """입장을 기다리는 요청이 있는지 (있으면 헤징처럼 자리를 더 쓰는 작업을 건너뜀)"""
+        row = self._connect().execute(
+            "SELECT 1 FROM admission_tickets WHERE status = 'waiting' AND expires_at >= ? LIMIT 1", (time.time(),)
+        ).fetchone()
+        return row is not None
+
+    def _release(self, ticket):
+        def release(conn):
+            if conn.execute("DELETE FROM admission_tickets WHERE ticket = ?", (ticket,)).rowcount:
+                self._bump(conn)
+
+        self._transaction(release)
+        with self._released:
+            self._released.notify_all()
+
+    def _wait_for_release(self, timeout):
+        """최대 timeout초 쉬되, 이 워커에서 자리가 나면 바로 깨어남"""
+        with self._released:
+            self._released.wait(timeout)
+
+    def status(self):
+        now = time.time()
+        rows = self._connect().execute(
+            "SELECT status, priority, COUNT(*) FROM admission_tickets WHERE expires_at >= ? GROUP BY status, priority",
+            (now,)
+        ).fetchall()
+        names = {priority: kind for kind, priority in KIND_PRIORITY.items()}
+        running = {names.get(priority, priority): count for status, priority, count in rows if status == 'running'}
+        waiting = {names.get(priority, priority): count for status, priority, count in rows if status == 'waiting'}
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'running': running,
+            'waiting': waiting,
+            **self.stats,
+        }
+
+
+def _fair_order(rows, last_admitted):
+    """대기 중인 티켓의 입장 순서
+
+    (우선순위, 그 학생의 실행 중 요청 수 + 같은 우선순위에서 앞서 기다리는 요청 수, 그 학생의 마지막 입장 시각, 도착 시각)
+    """
+    running = {}
+    for ticket, student_id, priority, status, enqueued_at in rows:
+        if status == 'running':
+            running[student_id] = running.get(student_id, 0) + 1
+    ahead = {}
+    ordered = []
+    for row in sorted((row for row in rows if row[3] == 'waiting'), key=lambda row: row[4]):
+        ticket, student_id, priority, status, enqueued_at = row
+        rank = running.get(student_id, 0) + ahead.get((student_id, priority), 0)
+        ahead[(student_id, priority)] = ahead.get((student_id, priority), 0) + 1
+        ordered.append(((priority, rank, last_admitted.get(student_id, 0.0), enqueued_at), row))
+    ordered.sort(key=lambda item: item[0])
+    return [row for _, row in ordered]
+
+
+class AdmissionTicket:
+    """요청 하나의 입장 티켓
+
+    with 블록: 차례가 올 때까지 기다렸다가 실행, 블록을 벗어나면 자리를 반납합니다.
+    wait_positions()/await_positions(): 기다리는 동안 대기 순번이 바뀔 때마다 생성 (SSE 진행 표시용),
+    끝까지 순회하면 입장한 상태이므로 이후 release()로 반납합니다.
+    """
+
+    def __init__(self, controller, student_id, kind):
+        self.controller = controller
+        self.student_id = student_id
+        self.kind = kind
+        self.priority = KIND_PRIORITY.get(kind, 1)
+        self.ticket = uuid.uuid4().hex
+        self.admitted = False
+        self._enqueued = False
+        self._deadline = None
+        self._started = None
+        self._last_position = None
+        self._position = None        # 마지막으로 계산한 대기 순번
+        self._generation = None      # 그 계산 시점의 generation
+        self._checked_at = None      # 마지막 순서 계산 시각 (monotonic)
+        self._heartbeat_at = None    # 마지막 heartbeat 시각 (monotonic)
+        self.delay = controller.poll_interval  # 다음 확인까지 쉴 시간
+
+    def _step(self):
+        """한 단계 진행: 입장했으면 None, 아니면 대기 순번 (차단 시 AdmissionRejected)"""
+        controller = self.controller
+        if not self._enqueued:
+            self._started = time.monotonic()
+            timeout = controller.queue_timeout if self.kind == 'user' else controller.nudge_queue_timeout
+            self._deadline = self._started + timeout
+            if not controller._enqueue(self.ticket, self.student_id, self.priority):
+                controller._count('shed_full', self.kind)
+                raise AdmissionRejected("요청이 많아 대기열이 가득 찼습니다.", controller.retry_after())
+            self._enqueued = True
+            self._heartbeat_at = self._started
+            self._generation = None
+
+        now = time.monotonic()
+        changed = self._generation is None or controller._generation() != self._generation
+        if changed or now - self._checked_at >= controller.max_poll_interval:
+            # 티켓 표가 바뀌었거나 max_poll_interval이 지남(다른 워커의 만료 티켓 정리) → 순서 다시 계산
+            self._position, self._generation = controller._try_admit(self.ticket, self.student_id, self.priority)
+            self._checked_at = now
+            self._heartbeat_at = now
+        elif now - self._heartbeat_at >= controller.heartbeat_timeout / 3:
+            controller._heartbeat(self.ticket)
+            self._heartbeat_at = now
+        # 움직임이 있으면 짧게, 없으면 max_poll_interval까지 점점 길게 쉼
+        self.delay = controller.poll_interval if changed else min(self.delay * 2, controller.max_poll_interval)
+        position = self._position
+
+        if position == 0:
+            self.admitted = True
+            waited = time.monotonic() - self._started
+            controller._count('admitted' if waited < controller.poll_interval else 'queued', self.kind)
+            if controller.metrics:
+                controller.metrics.observe('llm_admission_wait_seconds', waited, self.kind)
+            return None
+        if time.monotonic() >= self._deadline:
+            controller._release(self.ticket)
+            self._enqueued = False
+            controller._count('shed_timeout', self.kind)
+            raise AdmissionRejected("대기 시간이 초과되었습니다.", controller.retry_after())
+        return position
+
+    def _changed(self, position):
+        changed = position != self._last_position
+        self._last_position = position
+        return changed
+
+    def wait_positions(self):
+        while True:
+            position = self._step()
+            if position is None:
+                return
+            if self._changed(position):
+                yield position
+            self.controller._wait_for_release(self.delay)
+
+    async def await_positions(self):
+        while True:
+            position = await asyncio.to_thread(self._step)
+            if position is None:
+                return
+            if self._changed(position):
+                yield position
+            await asyncio.sleep(self.delay)
+
+    def release(self):
+        if self._enqueued:
+            self.controller._release(self.ticket)
+            self._enqueued = False
+            self.admitted = False
+
+    def __enter__(self):
+        for _ in self.wait_positions():
+            pass
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    async def __aenter__(self):
+        async for _ in self.await_positions():
+            pass
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.to_thread(self.release)
+        return False
@@ -1,10 +1,12 @@
 ﻿# app.py
 
 import os
+import sys
 import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file 
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context, g, send_file, abort
 import json
 import time
+import uuid
 import shutil
 import mimetypes # 🚨 mimetypes 라이브러리 임포트
 
@@ -14,10 +16,22 @@ mimetypes.add_type('application/x-hwp', '.hwpx')
 # --- 분리된 설정 및 유틸리티 모듈 임포트 ---
 from config_utils import (
     # 🚨 수정: Tool 관련 임포트 제거
-    MODEL_NAME, INTEGRATED_SYSTEM_PROMPT, AUTHORIZED_USERS,
-    load_prompt_file, log_conversation_entry, update_scaffolding_count,
-    LOGS_DIR, format_scaffolding_counts, get_client_by_user # 🚩 get_client_by_user 임포트
+    AUTHORIZED_USERS,
+    load_prompt_file, log_conversation_entry, log_nudge_entry, update_scaffolding_count,
+    LOGS_DIR, CALL_POLICY, get_key_pool_status, # 🚩 키 풀/호출 정책 임포트
+    CONVERSATION_STORE,
+    parse_ai_response, build_response_messages, generate_nudge, choose_model,
+    NUDGE_PREFETCH_ENABLED, NUDGE_PREFETCHER, take_prefetched_nudge, wait_for_prefetched_nudge,
+    get_prompt_version, flush_conversation_logs, get_class_scaffolding_totals, ADMIN_TOKEN,
+    LOG_DOWNLOAD_GZIP, METRICS, EVENT_STORE, open_log_download, SESSION_FLIGHT, SESSION_BUSY_MESSAGE,
+    STATIC_ASSETS, CHAT_HISTORY_PAGE_SIZE, CHAT_HISTORY_MAX_PAGE_SIZE, ADMISSION, SERVER_BUSY_MESSAGE
 )
+from call_policy import NoAvailableKeyError
+from session_flight import SessionBusyError, KIND_USER, KIND_NUDGE
+from admission import AdmissionRejected
+from stream_utils import ResponseTextExtractor, format_sse
+from log_download import accepts_gzip, attachment_header, iter_class_zip
+from static_assets import choose_encoding, etag_matches, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
 # ----------------------------------------
 
 
@@ -28,6 +42,75 @@ app = Flask(__name__,
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'default-super-secret-key-for-session')
 
 
+# 🚩 연구자/관리자용 라우트 인증 (ADMIN_TOKEN 미설정 시 비활성화)
+# Prometheus 수집기는 Authorization: Bearer <토큰> 헤더를 사용할 수 있음
+def is_admin_request():
+    authorization = request.headers.get('Authorization', '')
+    bearer = authorization[7:] if authorization.startswith('Bearer ') else None
+    token = request.headers.get('X-Admin-Token') or bearer or request.args.get('token')
+    return bool(ADMIN_TOKEN) and token == ADMIN_TOKEN
+
+
+# 🚩 라우트별 요청 처리 시간 메트릭 (메모리 카운터만 갱신, 스트리밍 라우트는 응답 시작까지)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        METRICS.observe('http_request_duration_seconds', time.perf_counter() - started, route, request.method, response.status_code)
+    return response
+
+
+# 🚩 정적 파일: url_for('static', ...)은 지문 이름으로 변환하고, 빌드 결과(STATIC_ASSETS)에서 직접 제공
+# 지문 이름은 1년 immutable 캐시, 원본 이름은 ETag 재검증. 304 판단은 manifest의 해시로 하므로 파일을 열지 않음
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = STATIC_ASSETS.url_name(values['filename'])
+
+
+def serve_static(filename):
+    entry, immutable = STATIC_ASSETS.lookup(filename)
+    if entry is None:
+        # 빌드 이후 추가된 파일 등은 Flask 기본 처리
+        return app.send_static_file(filename)
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'), entry['encodings'])
+    headers = {
+        'ETag': STATIC_ASSETS.etag(entry, encoding),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        'Vary': 'Accept-Encoding',
+    }
+    if etag_matches(request.headers.get('If-None-Match'), headers['ETag']):
+        return Response(status=304, headers=headers)
+
+    mimetype = mimetypes.guess_type(entry['source'])[0] or 'application/octet-stream'
+    try:
+        response = send_file(STATIC_ASSETS.file_path(entry, encoding), mimetype=mimetype,
+                             conditional=False, etag=False, last_modified=None, max_age=None)
+    except FileNotFoundError:
+        abort(404)
+    response.headers.update(headers)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+app.view_functions['static'] = serve_static
+
+
+# 🚩 대화 이력은 서버 저장소(CONVERSATION_STORE)에 두고, 쿠키 세션에는 세션 ID만 보관
+def get_conversation_id():
+    """현재 세션의 대화 저장소 키를 반환합니다. (구버전 세션이면 새로 발급)"""
+    if 'conversation_id' not in session:
+        session['conversation_id'] = uuid.uuid4().hex
+    return session['conversation_id']
+
+
 # --- Flask 라우팅 ---
 # ... (login, consent, summary, chat 라우트 유지) ...
 @app.route('/', methods=['GET', 'POST'])
@@ -66,7 +149,7 @@ def login():
             count_filename = f"{student_id}_{name}.json"
             session['count_filename'] = count_filename
             
-            session['conversation'] = [] 
+            session['conversation_id'] = uuid.uuid4().hex
             
             return redirect(url_for('consent'))
         else:
@@ -82,16 +165,19 @@ def consent():
         return redirect(url_for('login'))
         
     log_filename = session.get('log_filename', 'temp.txt')
+    student_id = session['user']['student_id']
     
     if request.method == 'POST':
         consent_status = request.form.get('consent_check')
         
         if consent_status == 'agree':
-            log_conversation_entry('System', f"연구 참여 동의: {session['user']['name']} ({session['user']['student_id']}) 동의함", log_filename)
+            log_conversation_entry('System', f"연구 참여 동의: {session['user']['name']} ({student_id}) 동의함", log_filename,
+                                   student_id=student_id, session_id=get_conversation_id())
             
             return redirect(url_for('summary')) 
         else:
-            log_conversation_entry('System', f"연구 참여 동의: {session['user']['name']} ({session['user']['student_id']}) 비동의함. 접속 종료.", log_filename)
+            log_conversation_entry('System', f"연구 참여 동의: {session['user']['name']} ({student_id}) 비동의함. 접속 종료.", log_filename,
+                                   student_id=student_id, session_id=get_conversation_id())
             session.clear()
             return render_template('consent.html', error="비동의하셨습니다. 실험에 참여할 수 없습니다. 창을 닫아주세요.")
             
@@ -134,25 +220,55 @@ def chat():
     log_filename = session.get('log_filename', 'temp.txt')
     
     # --- 첫 접속 시 AI의 초기 인사말 처리 로직 ---
-    conversation = session.get('conversation', [])
-    if not conversation: 
+    conversation_id = get_conversation_id()
+    # 🚩 최근 한 페이지만 렌더링 (이전 대화는 스크롤 시 /chat_history?before=로 가져옴)
+    chat_history, has_older = CONVERSATION_STORE.page(conversation_id, limit=CHAT_HISTORY_PAGE_SIZE)
+    if not chat_history: 
         initial_greeting = f"안녕, {user_name}야! 나는 오늘 너와 함께 과제를 해결할 동료 학습자 AI야. 교내 쓰레기 처리 문제를 해결할 수 있는 학습 활동 설계를 지금부터 함께 시작해 보자! 어떻게 시작하면 좋을까?"
-        conversation.append({"role": "assistant", "content": initial_greeting})
-        session['conversation'] = conversation
+        greeting_message = {"role": "assistant", "content": initial_greeting}
+        seq = CONVERSATION_STORE.append(conversation_id, greeting_message)
+        chat_history = [dict(greeting_message, seq=seq)]
         
-        log_conversation_entry('AI', initial_greeting, log_filename, scaffolding_type="일반")
+        log_conversation_entry('AI', initial_greeting, log_filename, scaffolding_type="일반",
+                               student_id=session['user']['student_id'], session_id=conversation_id)
     # -----------------------------------------------
     
-    chat_history = conversation
-    
     return render_template('chat.html', 
                             user_name=user_name, 
                             situation=situation, 
                             rules=rules, 
                             task=task,
                             chat_history=chat_history,
+                            has_older=has_older,
                             AVATAR_URL=avatar_url)
 
+
+# 🚩 seq 커서 기반 대화 이력 조회 (스크롤 시 이전 페이지, 재연결 시 마지막으로 받은 메시지 이후만)
+#   GET /chat_history?after=<seq>   → seq 이후 메시지 (has_more면 마지막 seq로 다시 요청)
+#   GET /chat_history?before=<seq>  → seq 이전의 마지막 limit개 (has_more면 더 이전 메시지가 있음)
+@app.route('/chat_history', methods=['GET'])
+def chat_history():
+    if 'user' not in session:
+        return jsonify({'error': '세션 오류. 다시 로그인해주세요.'}), 401
+    try:
+        after = request.args.get('after', type=int)
+        before = request.args.get('before', type=int)
+        limit = min(max(int(request.args.get('limit', CHAT_HISTORY_PAGE_SIZE)), 1), CHAT_HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit은 정수여야 합니다.'}), 400
+    if after is not None and before is not None:
+        return jsonify({'error': 'after와 before는 함께 사용할 수 없습니다.'}), 400
+
+    messages, has_more = CONVERSATION_STORE.page(get_conversation_id(), after=after, before=before, limit=limit)
+    return jsonify({'messages': messages, 'has_more': has_more})
+
+def server_busy_response(retry_after):
+    """LLM 입장 대기열 부하 차단 응답 (429 + Retry-After)"""
+    response = jsonify({'error': SERVER_BUSY_MESSAGE, 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
 # ----------------------------------------------------
 # 🚩 /get_response 라우트 (RAG 안정화)
 # ----------------------------------------------------
@@ -163,129 +279,265 @@ def get_response():
         return jsonify({'error': '세션 오류. 다시 로그인해주세요.'}), 401
     
     student_id = session['user']['student_id']
-    # 🚨 수정: student_id를 기반으로 클라이언트 객체를 동적으로 가져옴
-    current_client = get_client_by_user(student_id)
+    user_message = request.json['message']
+    conversation_id = get_conversation_id()
+    log_filename = session.get('log_filename', 'temp.txt')
+    count_filename = session.get('count_filename', 'temp.json')
+    user_log_dir = session.get('user_log_dir', LOGS_DIR) 
+
+    # 🚩 같은 대화의 LLM 작업은 하나씩 실행 (같은 Idempotency-Key의 중복 제출은 결과 공유, 진행 중인 재촉은 취소)
+    try:
+        with SESSION_FLIGHT.flight(conversation_id, KIND_USER, request.headers.get('Idempotency-Key')) as flight:
+            if flight.replay:
+                status_code, payload = flight.replay
+                return jsonify(payload), status_code
+
+            # 1. 사용자 메시지 (응답 성공 시에만 저장소에 기록) - 앞선 요청이 끝난 뒤의 대화 이력 기준
+            conversation = CONVERSATION_STORE.get(conversation_id)
+            user_turn = {"role": "user", "content": user_message}
+
+            # 2. API 호출을 위한 메시지 리스트 구성
+            messages_for_api, context = build_response_messages(conversation + [user_turn], conversation_id)
+            prompt_version = get_prompt_version()
+            routing = choose_model('response', conversation + [user_turn]) # 🚩 맞장구/인사는 가벼운 모델로
+
+            try:
+                # 🚨 수정: Tool-Calling 구조 제거 및 단일 API 호출로 변경 (키 풀 + 마감 시간/재시도/헤징)
+                # 🚩 서버 전체 동시 호출 수 제한 - 차례가 올 때까지 대기 (대기열이 가득 차거나 시간 초과면 429)
+                with ADMISSION.ticket(student_id, 'user'):
+                    started = time.perf_counter()
+                    response = CALL_POLICY.call(
+                        'response', student_id,
+                        model=routing.model, 
+                        messages=messages_for_api, 
+                        response_format={"type": "json_object"}
+                    )
+                
+                ai_response_json_str = response.choices[0].message.content
+                
+                # 3. AI 응답 파싱 및 추출
+                scaffolding_type, response_text = parse_ai_response(ai_response_json_str)
+                    
+                # 4. 사용자 메시지와 AI 응답을 대화 저장소에 추가 (seq: AI 응답의 대화 내 순번)
+                seq = CONVERSATION_STORE.append(conversation_id, user_turn, {"role": "assistant", "content": response_text})
+                
+                # 5. 로그 기록 및 카운트 업데이트
+                log_conversation_entry('User', user_message, log_filename, student_id=student_id, session_id=conversation_id)
+                log_conversation_entry('AI', response_text, log_filename, scaffolding_type, prompt_version,
+                                       student_id=student_id, session_id=conversation_id,
+                                       latency=time.perf_counter() - started, usage=response.usage, routing=routing,
+                                       context_tokens_saved=context['tokens_saved'])
+                update_scaffolding_count(count_filename, user_log_dir, scaffolding_type)
+                
+                # 6. 최종 응답 반환 (같은 키로 다시 오면 이 결과를 그대로 반환)
+                payload = {'response': response_text, 'seq': seq}
+                flight.complete(200, payload)
+                return jsonify(payload)
+
+            except NoAvailableKeyError:
+                return jsonify({'error': 'AI 클라이언트 초기화 실패. API 키 설정 오류일 수 있습니다.'}), 503
+            except AdmissionRejected as e:
+                return server_busy_response(e.retry_after)
+            except Exception as e:
+                # 오류 발생 시 사용자 메시지는 저장소에 기록되지 않음 (같은 키로 재시도하면 다시 호출)
+                print(f"🚨 ERROR: OpenAI API 호출 오류: {e}")
+                log_conversation_entry('System_Error', f"API 호출 오류 발생: {e}", log_filename,
+                                       student_id=student_id, session_id=conversation_id)
+                return jsonify({'error': 'AI 응답을 가져오는 데 실패했습니다. 다시 시도해 주세요.'}), 500
+
+    except SessionBusyError:
+        return jsonify({'error': SESSION_BUSY_MESSAGE}), 409
+
+
+# ----------------------------------------------------
+# 🚩 /get_response_stream 라우트 (SSE 토큰 스트리밍)
+# ----------------------------------------------------
+@app.route('/get_response_stream', methods=['POST'])
+def get_response_stream():
+    """AI 답변을 Server-Sent Events로 토큰 단위 스트리밍합니다.
 
-    if not current_client:
-        return jsonify({'error': 'AI 클라이언트 초기화 실패. API 키 설정 오류일 수 있습니다.'}), 503
+    response_text 조각은 도착하는 즉시 전송하고, 스캐폴딩 유형 검증·대화 저장·로그 기록·카운트 업데이트는
+    스트림이 끝난 뒤에 한 번만 수행합니다.
+    """
+    if 'user' not in session:
+        return jsonify({'error': '세션 오류. 다시 로그인해주세요.'}), 401
 
+    student_id = session['user']['student_id']
     user_message = request.json['message']
-    conversation = session.get('conversation', [])
+    conversation_id = get_conversation_id()
     log_filename = session.get('log_filename', 'temp.txt')
     count_filename = session.get('count_filename', 'temp.json')
-    user_log_dir = session.get('user_log_dir', LOGS_DIR) 
+    user_log_dir = session.get('user_log_dir', LOGS_DIR)
+    request_key = request.headers.get('Idempotency-Key')
 
-    # 1. 사용자 메시지를 대화 이력에 추가 
-    conversation.append({"role": "user", "content": user_message})
+    # 대기열이 이미 가득 찼으면 SSE를 시작하기 전에 429로 돌려보냄 (스트림 시작 후에는 상태 코드를 바꿀 수 없음)
+    if ADMISSION.overloaded():
+        return server_busy_response(ADMISSION.retry_after())
 
-    # 2. API 호출을 위한 메시지 리스트 구성
-    messages_for_api = [
-        {"role": "system", "content": INTEGRATED_SYSTEM_PROMPT}
-    ] + conversation
-    
-    try:
-        # 🚨 수정: Tool-Calling 구조 제거 및 단일 API 호출로 변경
-        response = current_client.chat.completions.create(
-            model=MODEL_NAME, 
-            messages=messages_for_api, 
-            response_format={"type": "json_object"}
-        )
-        
-        ai_response_json_str = response.choices[0].message.content
-        
-        # 3. AI 응답 파싱 및 추출
+    def generate():
         try:
-            ai_response_data = json.loads(ai_response_json_str)
-            
-            scaffolding_type = ai_response_data.get("scaffolding_type", "분류실패")
-            valid_types = ["개념적 스캐폴딩", "전략적 스캐폴딩", "메타인지적 스캐폴딩", "동기적 스캐폴딩", "일반"]
-            if not scaffolding_type in valid_types:
-                scaffolding_type = "분류실패"
-                
-            response_text = ai_response_data.get("response_text", "AI 응답 생성에 실패했습니다.")
-            
-        except json.JSONDecodeError:
-            scaffolding_type = "JSON 파싱 실패"
-            response_text = "AI 응답 형식에 오류가 발생했어. 잠시 후 다시 시도해 봐."
-            
-        # 4. AI 응답을 대화 이력에 추가하고 세션에 저장
-        conversation.append({"role": "assistant", "content": response_text})
-        session['conversation'] = conversation
-        
-        # 5. 로그 기록 및 카운트 업데이트
-        log_conversation_entry('User', user_message, log_filename)
-        log_conversation_entry('AI', response_text, log_filename, scaffolding_type)
+            # 🚩 대화별 직렬화 - 스트림이 끝날 때(또는 연결이 끊길 때)까지 잠금 유지
+            with SESSION_FLIGHT.flight(conversation_id, KIND_USER, request_key) as flight:
+                if flight.replay:
+                    # 같은 키의 중복 제출: 조각 없이 저장된 최종 답변만 전송
+                    yield format_sse({'type': 'done', **flight.replay[1]})
+                    return
+                yield from stream_answer(flight)
+        except SessionBusyError:
+            yield format_sse({'type': 'error', 'error': SESSION_BUSY_MESSAGE})
+
+    def stream_answer(flight):
+        conversation = CONVERSATION_STORE.get(conversation_id)
+        user_turn = {"role": "user", "content": user_message}
+        messages_for_api, context = build_response_messages(conversation + [user_turn], conversation_id)
+        prompt_version = get_prompt_version()
+        routing = choose_model('response', conversation + [user_turn])
+
+        extractor = ResponseTextExtractor()
+        usage = None
+        # 🚩 서버 전체 동시 호출 수 제한 - 기다리는 동안 대기 순번을 'queued' 이벤트로 전송 (스피너 대신 표시)
+        ticket = ADMISSION.ticket(student_id, 'user')
+        try:
+            for position in ticket.wait_positions():
+                yield format_sse({'type': 'queued', 'position': position})
+            started = time.perf_counter()
+            # 연결(첫 응답)까지는 다른 키로 재시도, 이후 조각 사이 대기에도 마감 시간이 적용됨
+            lease, stream = CALL_POLICY.open_stream(
+                'stream', student_id,
+                model=routing.model,
+                messages=messages_for_api,
+                response_format={"type": "json_object"}
+            )
+            with lease:
+                for chunk in stream:
+                    usage = getattr(chunk, 'usage', None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    new_text = extractor.feed(delta)
+                    if new_text:
+                        yield format_sse({'type': 'delta', 'text': new_text})
+
+        except AdmissionRejected as e:
+            yield format_sse({'type': 'error', 'error': SERVER_BUSY_MESSAGE, 'retry_after': e.retry_after})
+            return
+        except Exception as e:
+            print(f"🚨 ERROR: OpenAI API 스트리밍 호출 오류: {e}")
+            log_conversation_entry('System_Error', f"API 스트리밍 호출 오류 발생: {e}", log_filename,
+                                   student_id=student_id, session_id=conversation_id)
+            yield format_sse({'type': 'error', 'error': 'AI 응답을 가져오는 데 실패했습니다. 다시 시도해 주세요.'})
+            return
+        finally:
+            ticket.release()
+
+        # 스트림 완료 후 전체 JSON 기준으로 검증 및 기록
+        scaffolding_type, response_text = parse_ai_response(extractor.buffer, 'stream')
+
+        seq = CONVERSATION_STORE.append(conversation_id, user_turn, {"role": "assistant", "content": response_text})
+        log_conversation_entry('User', user_message, log_filename, student_id=student_id, session_id=conversation_id)
+        log_conversation_entry('AI', response_text, log_filename, scaffolding_type, prompt_version,
+                               student_id=student_id, session_id=conversation_id,
+                               latency=time.perf_counter() - started, usage=usage, routing=routing,
+                               context_tokens_saved=context['tokens_saved'])
         update_scaffolding_count(count_filename, user_log_dir, scaffolding_type)
-        
-        # 6. 최종 응답 반환
-        return jsonify({'response': response_text})
 
-    except Exception as e:
-        # 오류 발생 시 사용자 메시지를 대화 이력에서 제거
-        if conversation and conversation[-1].get('role') == 'user':
-            conversation.pop()
-            session['conversation'] = conversation 
-            
-        print(f"🚨 ERROR: OpenAI API 호출 오류: {e}")
-        log_conversation_entry('System_Error', f"API 호출 오류 발생: {e}", log_filename)
-        return jsonify({'error': 'AI 응답을 가져오는 데 실패했습니다. 다시 시도해 주세요.'}), 500
+        payload = {'response': response_text, 'seq': seq}
+        flight.complete(200, payload)
+        yield format_sse({'type': 'done', **payload})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/get_prompt_response', methods=['POST'])
 def get_prompt_response():
-    """JavaScript 타이머에 의해 호출되어 AI의 재촉 메시지를 받습니다."""
+    """JavaScript 타이머에 의해 호출되어 AI의 재촉 메시지를 받습니다.
+
+    같은 대화의 다른 작업(사용자 메시지 답변 등)이 진행 중이거나, 생성 중에 사용자 메시지가 도착하면
+    재촉을 보내지 않고 {'cancelled': True}를 반환합니다.
+    """
     if 'user' not in session:
         return jsonify({'error': '세션 오류 또는 AI 클라이언트 초기화 실패'}), 401
 
     student_id = session['user']['student_id']
-    current_client = get_client_by_user(student_id)
-    if not current_client:
-        return jsonify({'error': 'AI 클라이언트 초기화 실패. API 키 설정 오류일 수 있습니다.'}), 401
-
-
-    conversation = session.get('conversation', [])
+    conversation_id = get_conversation_id()
     log_filename = session.get('log_filename', 'temp.txt')
     count_filename = session.get('count_filename', 'temp.json')
     user_log_dir = session.get('user_log_dir', LOGS_DIR) 
 
-    prompt_message = "5분 동안 사용자로부터 응답이 없습니다. 프롬프트 규칙 1번(침묵 감지 및 재촉)에 따라, '지금 어디까지 생각해봤거나 어디까지 진행되었어? 하면서 어떤 부분이 어렵니?'와 같은 내용으로 사용자의 대화를 재촉하는 메시지를 생성하세요."
-
-    messages_for_api = [
-        {"role": "system", "content": INTEGRATED_SYSTEM_PROMPT},
-        {"role": "user", "content": prompt_message} 
-    ] + conversation 
+    # 🚩 사전 생성이 아직 진행 중이면 대화 잠금을 잡기 전에 기다림 (그동안 사용자 메시지는 막히지 않음)
+    wait_for_prefetched_nudge(conversation_id)
 
     try:
-        chat_completion = current_client.chat.completions.create(
-            model=MODEL_NAME, 
-            messages=messages_for_api, 
-            response_format={"type": "json_object"}
-        )
-        ai_response_json_str = chat_completion.choices[0].message.content
-        
-        ai_response_data = json.loads(ai_response_json_str)
-        response_text = ai_response_data.get("response_text", "다시 시도해 주세요.")
-        scaffolding_type = ai_response_data.get("scaffolding_type", "동기적 스캐폴딩") 
-
-        conversation.append({"role": "assistant", "content": response_text})
-        session['conversation'] = conversation
-        log_conversation_entry('AI', response_text, log_filename, scaffolding_type)
-        
-        update_scaffolding_count(count_filename, user_log_dir, scaffolding_type)
-        
-        return jsonify({'response': response_text})
+        with SESSION_FLIGHT.flight(conversation_id, KIND_NUDGE, request.headers.get('Idempotency-Key')) as flight:
+            if flight.replay:
+                status_code, payload = flight.replay
+                return jsonify(payload), status_code
+            if flight.cancelled:
+                return jsonify({'cancelled': True}), 409
+
+            conversation = CONVERSATION_STORE.get(conversation_id)
+            started = time.perf_counter()
+            try:
+                # 🚩 타이머 만료 전에 미리 만들어 둔 재촉 메시지가 있으면 바로 사용 (그 사이 대화가 바뀌었으면 새로 생성)
+                nudge = take_prefetched_nudge(conversation_id, conversation)
+                if nudge is None:
+                    # 🚩 재촉은 사용자 메시지보다 나중 순서로 입장하고, 오래 기다리지 않음 (429면 다음 침묵 타이머에 다시 시도)
+                    # (모델 라우팅과 티어별 지연/토큰 메트릭은 generate_nudge에서 실제 호출 기준으로 반영)
+                    with ADMISSION.ticket(student_id, 'nudge'):
+                        nudge = generate_nudge(student_id, conversation_id, conversation)
+                scaffolding_type, response_text = nudge.scaffolding_type, nudge.response_text
+
+                # 생성하는 동안 사용자 메시지가 도착했으면 재촉 결과를 버림
+                if not flight.still_owner():
+                    return jsonify({'cancelled': True}), 409
+
+                seq = CONVERSATION_STORE.append(conversation_id, {"role": "assistant", "content": response_text})
+                log_nudge_entry(nudge, log_filename, student_id, conversation_id, time.perf_counter() - started)
+            
+                update_scaffolding_count(count_filename, user_log_dir, scaffolding_type)
+            
+                payload = {'response': response_text, 'seq': seq}
+                flight.complete(200, payload)
+                return jsonify(payload)
+
+            except NoAvailableKeyError:
+                return jsonify({'error': 'AI 클라이언트 초기화 실패. API 키 설정 오류일 수 있습니다.'}), 401
+            except AdmissionRejected as e:
+                return server_busy_response(e.retry_after)
+            except Exception as e:
+                print(f"🚨 ERROR: 침묵 감지 API 호출 오류: {e}")
+                log_conversation_entry('System_Error', f"침묵 감지 오류 발생: {e}", log_filename,
+                                       student_id=student_id, session_id=conversation_id)
+                return jsonify({'error': 'AI 재촉 메시지를 가져오는 데 실패했습니다.'}), 500
+
+    except SessionBusyError:
+        # 같은 멱등 키의 앞선 재촉이 끝나지 않음 → 이번 재촉은 보내지 않음
+        return jsonify({'cancelled': True}), 409
+
+
+@app.route('/prefetch_prompt_response', methods=['POST'])
+def prefetch_prompt_response():
+    """침묵 타이머 만료 직전에 호출되어, 현재 대화에 대한 재촉 메시지를 백그라운드에서 미리 생성합니다."""
+    if 'user' not in session:
+        return jsonify({'error': '세션 오류. 다시 로그인해주세요.'}), 401
+    if not NUDGE_PREFETCH_ENABLED:
+        return jsonify({'scheduled': False}), 202
 
-    except Exception as e:
-        print(f"🚨 ERROR: 침묵 감지 API 호출 오류: {e}")
-        log_conversation_entry('System_Error', f"침묵 감지 오류 발생: {e}", log_filename)
-        return jsonify({'error': 'AI 재촉 메시지를 가져오는 데 실패했습니다.'}), 500
+    conversation_id = get_conversation_id()
+    conversation = CONVERSATION_STORE.get(conversation_id)
+    scheduled = NUDGE_PREFETCHER.schedule(session['user']['student_id'], conversation_id, conversation)
+    return jsonify({'scheduled': scheduled}), 202
 
 # ----------------------------------------------------
 # 🚩 /submit_and_download_log 라우트 (로그 다운로드 기능)
 # ----------------------------------------------------
 @app.route('/submit_and_download_log')
 def submit_and_download_log():
-    """최종 로그 파일과 카운트 횟수를 통합하여 다운로드 제공합니다. (세션 유지)"""
+    """최종 로그 파일과 카운트 횟수를 통합하여 스트리밍 다운로드로 제공합니다. (세션 유지, 임시 파일 없음)"""
     if 'user' not in session or 'user_log_dir' not in session:
         return redirect(url_for('login'))
         
@@ -296,64 +548,151 @@ def submit_and_download_log():
     log_filename_relative = session.get('log_filename') 
     count_filename = session.get('count_filename')
     
-    # 🚨 핵심: 파일 경로 구성 및 존재 확인
-    main_log_path = os.path.join(LOGS_DIR, log_filename_relative)
-    
-    print(f"DEBUG: 로그 다운로드 시도 (LOG): {main_log_path}")
-    
-    # 1. 메인 대화 로그 읽기
+    # 1. 대화 로그 확인 (🚩 이벤트 저장소에서 렌더링 + 스캐폴딩 카운트 요약)
     try:
-        from config_utils import format_scaffolding_counts 
-        
-        if not os.path.exists(main_log_path):
-            print(f"🚨 CRITICAL ERROR: Main log file not found at {main_log_path}. Check server restart.")
+        download = open_log_download(log_filename_relative, count_filename, user_log_dir)
+
+        if download is None:
+            print(f"🚨 CRITICAL ERROR: No conversation log for {log_filename_relative}. Check server restart.")
             
-            # 🚨 수정: 파일이 없으면 세션을 클리어하고 로그인 화면으로 돌려보냅니다.
-            # 이 메시지를 통해 사용자는 파일이 저장되지 않았음을 알 수 있습니다.
+            # 🚨 수정: 기록이 없으면 세션을 클리어하고 로그인 화면으로 돌려보냅니다.
+            # 이 메시지를 통해 사용자는 대화 기록이 저장되지 않았음을 알 수 있습니다.
             session.clear() 
             return f"오류: 대화 로그 파일이 서버에 존재하지 않습니다. 서버가 재시작되었거나 대화 기록이 없습니다. 다시 로그인하여 처음부터 시도해 주세요.", 404
-        
-        with open(main_log_path, 'r', encoding='utf-8') as f:
-            conversation_log = f.read()
             
     except Exception as e:
         print(f"🚨 ERROR: 메인 로그 파일 읽기 오류: {e}")
         return "로그 파일을 읽는 중 서버 오류가 발생했습니다.", 500
 
-    # 2. 스캐폴딩 카운트 포맷하여 가져오기
-    count_summary = format_scaffolding_counts(count_filename, user_log_dir)
-    
-    # 3. 최종 통합 내용 생성 (다운로드를 위한 임시 파일)
+    # 3. 내용이 바뀌지 않았으면 304 (반복 클릭 시 재전송하지 않음)
+    cache_headers = {
+        'ETag': download.etag,
+        'Last-Modified': download.last_modified,
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+    if download.is_not_modified(request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+        return Response(status=304, headers=cache_headers)
+
+    # 4. 로그 파일 + 카운트 요약을 조각 단위로 스트리밍 (선택적 gzip)
     final_download_filename = f"{user_info['name']}_{user_info['student_id']}_AI_Log.txt"
-    final_download_path = os.path.join('/tmp', final_download_filename)
-    final_content = conversation_log + count_summary
+    headers = dict(cache_headers)
+    headers['Content-Disposition'] = attachment_header(final_download_filename)
+
+    if LOG_DOWNLOAD_GZIP and accepts_gzip(request.headers.get('Accept-Encoding')):
+        headers['Content-Encoding'] = 'gzip'
+        body = download.iter_gzip_chunks()
+    else:
+        headers['Content-Length'] = str(download.content_length)
+        body = download.iter_chunks()
+
+    return Response(body, mimetype='text/plain', headers=headers)
+
+
+# ----------------------------------------------------
+# 🚩 /admin/download_class_logs 라우트 (강사용 반 전체 로그 zip)
+# ----------------------------------------------------
+@app.route('/admin/download_class_logs')
+def admin_download_class_logs():
+    """강사용: 모든 학생의 대화 로그와 카운트 파일을 하나의 zip으로 스트리밍합니다."""
+    if not is_admin_request():
+        return jsonify({'error': '권한이 없습니다.'}), 403
+
+    flush_conversation_logs()
+    get_class_scaffolding_totals() # 카운트 JSON 스냅샷 갱신
+    filename = f"class_logs_{datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S')}.zip"
+    return Response(
+        iter_class_zip(LOGS_DIR, EVENT_STORE.iter_transcripts(), exclude_dirs=[METRICS.snapshot_dir]),
+        mimetype='application/zip',
+        headers={'Content-Disposition': attachment_header(filename)}
+    )
 
+
+# ----------------------------------------------------
+# 🚩 /admin/scaffolding_counts 라우트 (반 전체 실시간 스캐폴딩 현황)
+# ----------------------------------------------------
+@app.route('/admin/scaffolding_counts')
+def admin_scaffolding_counts():
+    """연구자용: 스캐폴딩 유형별 반 전체 합계와 학생별 카운트를 JSON으로 반환합니다."""
+    if not is_admin_request():
+        return jsonify({'error': '권한이 없습니다.'}), 403
+    return jsonify(get_class_scaffolding_totals())
+
+
+# ----------------------------------------------------
+# 🚩 /admin/events 라우트 (이벤트 저장소 조회)
+# ----------------------------------------------------
+def parse_time_arg(name):
+    """?since=2025-03-04 / ?until=2025-03-04T10:30 형식(서버 현지 시각)을 epoch 초로 변환합니다."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+@app.route('/admin/events')
+def admin_events():
+    """연구자용: 대화 이벤트를 조건(student_id, scaffolding_type, speaker, since, until, limit)으로 조회합니다. (최신순)"""
+    if not is_admin_request():
+        return jsonify({'error': '권한이 없습니다.'}), 403
     try:
-        with open(final_download_path, 'w', encoding='utf-8') as f:
-            f.write(final_content)
-            
-        # 4. 파일 전송 (다운로드 시작)
-        response = send_file(
-            final_download_path, 
-            mimetype='text/plain',
-            as_attachment=True,
-            download_name=final_download_filename
+        events = EVENT_STORE.query(
+            student_id=request.args.get('student_id'),
+            scaffolding_type=request.args.get('scaffolding_type'),
+            speaker=request.args.get('speaker'),
+            since=parse_time_arg('since'),
+            until=parse_time_arg('until'),
+            limit=min(int(request.args.get('limit', 500)), 5000),
         )
-        
-        # 5. 응답 반환
-        return response
+    except ValueError as e:
+        return jsonify({'error': f'잘못된 조회 조건입니다: {e}'}), 400
+    return jsonify({'count': len(events), 'events': events})
+
+@app.route('/admin/events/summary')
+def admin_events_summary():
+    """연구자용: 기간(since, until) 내 스캐폴딩 유형별 합계와 학생별 턴 수·평균 응답 지연·토큰 사용량"""
+    if not is_admin_request():
+        return jsonify({'error': '권한이 없습니다.'}), 403
+    try:
+        since, until = parse_time_arg('since'), parse_time_arg('until')
+    except ValueError as e:
+        return jsonify({'error': f'잘못된 조회 조건입니다: {e}'}), 400
+    flush_conversation_logs()
+    return jsonify(EVENT_STORE.summarize(since=since, until=until))
 
-    except Exception as e:
-        print(f"🚨 ERROR: 최종 로그 파일 생성/다운로드 중 오류 발생: {e}")
-        return "최종 로그 파일 다운로드 중 서버 오류가 발생했습니다.", 500
+
+# ----------------------------------------------------
+# 🚩 /admin/key_pool 라우트 (API 키 상태 현황)
+# ----------------------------------------------------
+@app.route('/admin/key_pool')
+def admin_key_pool():
+    """관리자용: 키별 쿨다운/진행 중 요청/남은 RPM·TPM, 누적 429·401 횟수와 라우트별 지연·재시도·헤징 현황 (이 워커 기준)"""
+    if not is_admin_request():
+        return jsonify({'error': '권한이 없습니다.'}), 403
+    return jsonify(get_key_pool_status())
+
+
+# ----------------------------------------------------
+# 🚩 /metrics 라우트 (Prometheus 수집용)
+# ----------------------------------------------------
+@app.route('/metrics')
+def metrics():
+    """라우트별 지연, 키별 OpenAI 지연/오류, 학생·라우트별 토큰, JSON 파싱 실패, 진행 중 LLM 호출 수 (전체 워커 합계)"""
+    if not is_admin_request():
+        return jsonify({'error': '권한이 없습니다.'}), 403
+    return Response(METRICS.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 if __name__ == "__main__":
     # 🚨 주의: 이 블록은 Gunicorn이 아닌 로컬 개발 환경에서만 실행됩니다.
+
+    # 🚩 배포 전 점검: python app.py --check [--offline] (서버를 띄우지 않고 파일/키 확인 후 종료)
+    if '--check' in sys.argv:
+        from preflight import run_preflight
+        sys.exit(run_preflight(offline='--offline' in sys.argv))
     
     # 🚩 진단 코드 추가: 모든 클라이언트 로드 상태 확인
-    from config_utils import API_CLIENTS
-    loaded_count = len(API_CLIENTS)
+    from config_utils import KEY_POOL
+    loaded_count = len(KEY_POOL)
     print("-------------------- API Client Diagnostic --------------------")
     print(f"INFO: 총 {loaded_count}개의 학생 클라이언트가 로드되었습니다.")
     if loaded_count < 27:
@@ -0,0 +1,388 @@
+# asgi_app.py
+#
+# 🚩 비동기(ASGI) 실행 모드
+#   uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+#   gunicorn asgi_app:app -k uvicorn.workers.UvicornWorker -w 3 -b 0.0.0.0:$PORT
+#
+# LLM 호출이 있는 채팅/재촉 라우트와 로그 다운로드 라우트만 async 핸들러로 처리하고,
+# 나머지(로그인, 동의서, 개요, 채팅 페이지, 정적 파일 등)는 기존 Flask 앱을 그대로 마운트합니다.
+# 세션은 Flask의 서명 쿠키를 동일한 secret_key로 읽고 써서 두 모드가 같은 세션을 공유합니다.
+
+import asyncio
+import functools
+import time
+import uuid
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from itsdangerous import BadSignature
+
+from app import app as flask_app
+from config_utils import (
+    LOGS_DIR, CONVERSATION_STORE,
+    log_conversation_entry, update_scaffolding_count, open_log_download,
+    CALL_POLICY,
+    parse_ai_response, build_response_messages, choose_model, agenerate_nudge, log_nudge_entry,
+    get_prompt_version, LOG_DOWNLOAD_GZIP, take_prefetched_nudge, await_prefetched_nudge, METRICS,
+    SESSION_FLIGHT, SESSION_BUSY_MESSAGE, ADMISSION, SERVER_BUSY_MESSAGE
+)
+from call_policy import NoAvailableKeyError
+from session_flight import SessionBusyError, KIND_USER, KIND_NUDGE
+from admission import AdmissionRejected
+from stream_utils import ResponseTextExtractor, format_sse
+from log_download import accepts_gzip, attachment_header
+
+
+# --- Flask 서명 쿠키 세션 브리지 ---
+class FlaskSessionBridge:
+    """Flask(SecureCookieSessionInterface)와 동일한 방식으로 세션 쿠키를 읽고 씁니다."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.interface = wsgi_app.session_interface
+        self.serializer = self.interface.get_signing_serializer(wsgi_app)
+        self.cookie_name = wsgi_app.config['SESSION_COOKIE_NAME']
+        self.max_age = int(wsgi_app.permanent_session_lifetime.total_seconds())
+
+    def load(self, request):
+        cookie_value = request.cookies.get(self.cookie_name)
+        if not cookie_value:
+            return {}
+        try:
+            return dict(self.serializer.loads(cookie_value, max_age=self.max_age))
+        except BadSignature:
+            return {}
+
+    def save(self, response, session_data):
+        config = self.wsgi_app.config
+        response.set_cookie(
+            self.cookie_name,
+            self.serializer.dumps(session_data),
+            path=config['SESSION_COOKIE_PATH'] or config['APPLICATION_ROOT'] or '/',
+            domain=config['SESSION_COOKIE_DOMAIN'],
+            secure=config['SESSION_COOKIE_SECURE'],
+            httponly=config['SESSION_COOKIE_HTTPONLY'],
+            samesite=config['SESSION_COOKIE_SAMESITE'] or 'lax',
+        )
+        return response
+
+    def clear(self, response):
+        response.delete_cookie(self.cookie_name, path=self.wsgi_app.config['APPLICATION_ROOT'] or '/')
+        return response
+
+
+session_bridge = FlaskSessionBridge(flask_app)
+
+
+def get_conversation_id(session):
+    """app.get_conversation_id와 동일: 세션의 대화 저장소 키 (없으면 새로 발급)"""
+    if 'conversation_id' not in session:
+        session['conversation_id'] = uuid.uuid4().hex
+    return session['conversation_id']
+
+
+def timed(route):
+    """비동기 라우트 처리 시간 메트릭 (Flask 쪽 after_request와 같은 http_request_duration_seconds에 기록)"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: Request):
+            started = time.perf_counter()
+            response = await handler(request)
+            METRICS.observe('http_request_duration_seconds', time.perf_counter() - started, route, request.method, response.status_code)
+            return response
+        return wrapper
+    return decorator
+
+
+# --- 비동기 라우트 핸들러 ---
+def server_busy_response(retry_after):
+    """LLM 입장 대기열 부하 차단 응답 (429 + Retry-After)"""
+    return JSONResponse({'error': SERVER_BUSY_MESSAGE, 'retry_after': retry_after}, status_code=429,
+                        headers={'Retry-After': str(retry_after)})
+
+
+@timed('/get_response')
+async def get_response(request: Request):
+    """/get_response의 비동기 버전 (AsyncOpenAI 사용, 대기 중 워커 스레드를 점유하지 않음)"""
+    session = session_bridge.load(request)
+    if 'user' not in session:
+        return JSONResponse({'error': '세션 오류. 다시 로그인해주세요.'}, status_code=401)
+
+    user_message = (await request.json())['message']
+    student_id = session['user']['student_id']
+    conversation_id = get_conversation_id(session)
+    log_filename = session.get('log_filename', 'temp.txt')
+    count_filename = session.get('count_filename', 'temp.json')
+    user_log_dir = session.get('user_log_dir', LOGS_DIR)
+
+    # 같은 대화의 LLM 작업은 하나씩 (기다리는 동안 이벤트 루프를 막지 않음)
+    try:
+        async with SESSION_FLIGHT.flight(conversation_id, KIND_USER, request.headers.get('idempotency-key')) as flight:
+            if flight.replay:
+                status_code, payload = flight.replay
+                return session_bridge.save(JSONResponse(payload, status_code=status_code), session)
+
+            conversation = await asyncio.to_thread(CONVERSATION_STORE.get, conversation_id)
+            user_turn = {"role": "user", "content": user_message}
+            messages_for_api, context = build_response_messages(conversation + [user_turn], conversation_id)
+            prompt_version = get_prompt_version()
+            routing = choose_model('response', conversation + [user_turn])
+
+            try:
+                # 서버 전체 동시 호출 수 제한 (대기열이 가득 차거나 시간 초과면 429)
+                async with ADMISSION.ticket(student_id, 'user'):
+                    started = time.perf_counter()
+                    response = await CALL_POLICY.acall(
+                        'response', student_id,
+                        model=routing.model,
+                        messages=messages_for_api,
+                        response_format={"type": "json_object"}
+                    )
+                scaffolding_type, response_text = parse_ai_response(response.choices[0].message.content)
+
+                # 저장소·파일 기록은 이벤트 루프를 막지 않도록 스레드에서 처리
+                seq = await asyncio.to_thread(CONVERSATION_STORE.append, conversation_id, user_turn, {"role": "assistant", "content": response_text})
+                await asyncio.to_thread(log_conversation_entry, 'User', user_message, log_filename,
+                                        student_id=student_id, session_id=conversation_id)
+                await asyncio.to_thread(log_conversation_entry, 'AI', response_text, log_filename, scaffolding_type, prompt_version,
+                                        student_id=student_id, session_id=conversation_id,
+                                        latency=time.perf_counter() - started, usage=response.usage, routing=routing,
+                                        context_tokens_saved=context['tokens_saved'])
+                await asyncio.to_thread(update_scaffolding_count, count_filename, user_log_dir, scaffolding_type)
+
+                payload = {'response': response_text, 'seq': seq}
+                await asyncio.to_thread(flight.complete, 200, payload)
+                return session_bridge.save(JSONResponse(payload), session)
+
+            except NoAvailableKeyError:
+                return JSONResponse({'error': 'AI 클라이언트 초기화 실패. API 키 설정 오류일 수 있습니다.'}, status_code=503)
+            except AdmissionRejected as e:
+                return server_busy_response(e.retry_after)
+            except Exception as e:
+                print(f"🚨 ERROR: OpenAI API 호출 오류 (async): {e}")
+                await asyncio.to_thread(log_conversation_entry, 'System_Error', f"API 호출 오류 발생: {e}", log_filename,
+                                        student_id=student_id, session_id=conversation_id)
+                return JSONResponse({'error': 'AI 응답을 가져오는 데 실패했습니다. 다시 시도해 주세요.'}, status_code=500)
+
+    except SessionBusyError:
+        return JSONResponse({'error': SESSION_BUSY_MESSAGE}, status_code=409)
+
+
+@timed('/get_response_stream')
+async def get_response_stream(request: Request):
+    """/get_response_stream의 비동기 버전 (SSE)"""
+    session = session_bridge.load(request)
+    if 'user' not in session:
+        return JSONResponse({'error': '세션 오류. 다시 로그인해주세요.'}, status_code=401)
+
+    user_message = (await request.json())['message']
+    conversation_id = get_conversation_id(session)
+    log_filename = session.get('log_filename', 'temp.txt')
+    count_filename = session.get('count_filename', 'temp.json')
+    user_log_dir = session.get('user_log_dir', LOGS_DIR)
+    request_key = request.headers.get('idempotency-key')
+
+    student_id = session['user']['student_id']
+
+    # 대기열이 이미 가득 찼으면 SSE를 시작하기 전에 429
+    if await asyncio.to_thread(ADMISSION.overloaded):
+        return server_busy_response(ADMISSION.retry_after())
+
+    async def generate():
+        # 스트림이 끝날 때(또는 연결이 끊길 때)까지 대화 잠금 유지
+        try:
+            async with SESSION_FLIGHT.flight(conversation_id, KIND_USER, request_key) as flight:
+                if flight.replay:
+                    yield format_sse({'type': 'done', **flight.replay[1]})
+                    return
+                async for event in stream_answer(flight):
+                    yield event
+        except SessionBusyError:
+            yield format_sse({'type': 'error', 'error': SESSION_BUSY_MESSAGE})
+
+    async def stream_answer(flight):
+        conversation = await asyncio.to_thread(CONVERSATION_STORE.get, conversation_id)
+        user_turn = {"role": "user", "content": user_message}
+        messages_for_api, context = build_response_messages(conversation + [user_turn], conversation_id)
+        prompt_version = get_prompt_version()
+        routing = choose_model('response', conversation + [user_turn])
+
+        extractor = ResponseTextExtractor()
+        usage = None
+        # 기다리는 동안 대기 순번을 'queued' 이벤트로 전송
+        ticket = ADMISSION.ticket(student_id, 'user')
+        try:
+            async for position in ticket.await_positions():
+                yield format_sse({'type': 'queued', 'position': position})
+            started = time.perf_counter()
+            lease, stream = await CALL_POLICY.aopen_stream(
+                'stream', student_id,
+                model=routing.model,
+                messages=messages_for_api,
+                response_format={"type": "json_object"}
+            )
+            with lease:
+                async for chunk in stream:
+                    usage = getattr(chunk, 'usage', None) or usage
+                    if not chunk.choices:
+                        continue
+                    new_text = extractor.feed(chunk.choices[0].delta.content)
+                    if new_text:
+                        yield format_sse({'type': 'delta', 'text': new_text})
+
+        except AdmissionRejected as e:
+            yield format_sse({'type': 'error', 'error': SERVER_BUSY_MESSAGE, 'retry_after': e.retry_after})
+            return
+        except Exception as e:
+            print(f"🚨 ERROR: OpenAI API 스트리밍 호출 오류 (async): {e}")
+            await asyncio.to_thread(log_conversation_entry, 'System_Error', f"API 스트리밍 호출 오류 발생: {e}", log_filename,
+                                    student_id=student_id, session_id=conversation_id)
+            yield format_sse({'type': 'error', 'error': 'AI 응답을 가져오는 데 실패했습니다. 다시 시도해 주세요.'})
+            return
+        finally:
+            await asyncio.to_thread(ticket.release)
+
+        scaffolding_type, response_text = parse_ai_response(extractor.buffer, 'stream')
+
+        seq = await asyncio.to_thread(CONVERSATION_STORE.append, conversation_id, user_turn, {"role": "assistant", "content": response_text})
+        await asyncio.to_thread(log_conversation_entry, 'User', user_message, log_filename,
+                                student_id=student_id, session_id=conversation_id)
+        await asyncio.to_thread(log_conversation_entry, 'AI', response_text, log_filename, scaffolding_type, prompt_version,
+                                student_id=student_id, session_id=conversation_id,
+                                latency=time.perf_counter() - started, usage=usage, routing=routing,
+                                context_tokens_saved=context['tokens_saved'])
+        await asyncio.to_thread(update_scaffolding_count, count_filename, user_log_dir, scaffolding_type)
+
+        payload = {'response': response_text, 'seq': seq}
+        await asyncio.to_thread(flight.complete, 200, payload)
+        yield format_sse({'type': 'done', **payload})
+
+    return session_bridge.save(StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    ), session)
+
+
+@timed('/get_prompt_response')
+async def get_prompt_response(request: Request):
+    """/get_prompt_response의 비동기 버전 (침묵 감지 재촉 메시지)"""
+    session = session_bridge.load(request)
+    if 'user' not in session:
+        return JSONResponse({'error': '세션 오류 또는 AI 클라이언트 초기화 실패'}, status_code=401)
+
+    student_id = session['user']['student_id']
+    conversation_id = get_conversation_id(session)
+    log_filename = session.get('log_filename', 'temp.txt')
+    count_filename = session.get('count_filename', 'temp.json')
+    user_log_dir = session.get('user_log_dir', LOGS_DIR)
+
+    # 사전 생성이 아직 진행 중이면 대화 잠금을 잡기 전에 기다림
+    await await_prefetched_nudge(conversation_id)
+
+    # 다른 작업이 진행 중이거나 생성 중에 사용자 메시지가 오면 재촉을 보내지 않음
+    try:
+        async with SESSION_FLIGHT.flight(conversation_id, KIND_NUDGE, request.headers.get('idempotency-key')) as flight:
+            if flight.replay:
+                status_code, payload = flight.replay
+                return session_bridge.save(JSONResponse(payload, status_code=status_code), session)
+            if flight.cancelled:
+                return JSONResponse({'cancelled': True}, status_code=409)
+
+            conversation = await asyncio.to_thread(CONVERSATION_STORE.get, conversation_id)
+            started = time.perf_counter()
+            try:
+                # 미리 만들어 둔 재촉 메시지(/prefetch_prompt_response)가 현재 대화 버전과 같으면 바로 사용
+                nudge = await asyncio.to_thread(take_prefetched_nudge, conversation_id, conversation)
+                if nudge is None:
+                    # 재촉은 사용자 메시지보다 나중 순서로 입장 (오래 기다리지 않고 429)
+                    async with ADMISSION.ticket(student_id, 'nudge'):
+                        nudge = await agenerate_nudge(student_id, conversation_id, conversation)
+                scaffolding_type, response_text = nudge.scaffolding_type, nudge.response_text
+
+                if not await asyncio.to_thread(flight.still_owner):
+                    return JSONResponse({'cancelled': True}, status_code=409)
+
+                seq = await asyncio.to_thread(CONVERSATION_STORE.append, conversation_id, {"role": "assistant", "content": response_text})
+                await asyncio.to_thread(log_nudge_entry, nudge, log_filename, student_id, conversation_id,
+                                        time.perf_counter() - started)
+                await asyncio.to_thread(update_scaffolding_count, count_filename, user_log_dir, scaffolding_type)
+
+                payload = {'response': response_text, 'seq': seq}
+                await asyncio.to_thread(flight.complete, 200, payload)
+                return session_bridge.save(JSONResponse(payload), session)
+
+            except NoAvailableKeyError:
+                return JSONResponse({'error': 'AI 클라이언트 초기화 실패. API 키 설정 오류일 수 있습니다.'}, status_code=401)
+            except AdmissionRejected as e:
+                return server_busy_response(e.retry_after)
+            except Exception as e:
+                print(f"🚨 ERROR: 침묵 감지 API 호출 오류 (async): {e}")
+                await asyncio.to_thread(log_conversation_entry, 'System_Error', f"침묵 감지 오류 발생: {e}", log_filename,
+                                        student_id=student_id, session_id=conversation_id)
+                return JSONResponse({'error': 'AI 재촉 메시지를 가져오는 데 실패했습니다.'}, status_code=500)
+
+    except SessionBusyError:
+        # 같은 멱등 키의 앞선 재촉이 끝나지 않음 → 이번 재촉은 보내지 않음
+        return JSONResponse({'cancelled': True}, status_code=409)
+
+
+@timed('/submit_and_download_log')
+async def submit_and_download_log(request: Request):
+    """/submit_and_download_log의 비동기 버전 (임시 파일 없이 스트리밍, ETag/304, 선택적 gzip)"""
+    session = session_bridge.load(request)
+    if 'user' not in session or 'user_log_dir' not in session:
+        return RedirectResponse('/', status_code=302)
+
+    user_info = session['user']
+    user_log_dir = session['user_log_dir']
+    log_filename = session.get('log_filename')
+    count_filename = session.get('count_filename')
+
+    # 기록 대기 중인 항목을 반영한 뒤 이벤트 저장소에서 대화 로그를 렌더링
+    try:
+        download = await asyncio.to_thread(open_log_download, log_filename, count_filename, user_log_dir)
+    except Exception as e:
+        print(f"🚨 ERROR: 메인 로그 파일 읽기 오류: {e}")
+        return Response("로그 파일을 읽는 중 서버 오류가 발생했습니다.", status_code=500, media_type='text/html')
+
+    if download is None:
+        print(f"🚨 CRITICAL ERROR: No conversation log for {log_filename}. Check server restart.")
+        response = Response("오류: 대화 로그 파일이 서버에 존재하지 않습니다. 서버가 재시작되었거나 대화 기록이 없습니다. 다시 로그인하여 처음부터 시도해 주세요.", status_code=404, media_type='text/html')
+        return session_bridge.clear(response)
+
+    cache_headers = {
+        'ETag': download.etag,
+        'Last-Modified': download.last_modified,
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+    if download.is_not_modified(request.headers.get('if-none-match'), request.headers.get('if-modified-since')):
+        return Response(status_code=304, headers=cache_headers)
+
+    final_download_filename = f"{user_info['name']}_{user_info['student_id']}_AI_Log.txt"
+    headers = dict(cache_headers)
+    headers['Content-Disposition'] = attachment_header(final_download_filename)
+
+    # 동기 생성기는 StreamingResponse가 스레드풀에서 순회하므로 이벤트 루프를 막지 않음
+    if LOG_DOWNLOAD_GZIP and accepts_gzip(request.headers.get('accept-encoding')):
+        headers['Content-Encoding'] = 'gzip'
+        body = download.iter_gzip_chunks()
+    else:
+        headers['Content-Length'] = str(download.content_length)
+        body = download.iter_chunks()
+
+    return StreamingResponse(body, media_type='text/plain; charset=utf-8', headers=headers)
+
+
+app = Starlette(routes=[
+    Route('/get_response', get_response, methods=['POST']),
+    Route('/get_response_stream', get_response_stream, methods=['POST']),
+    Route('/get_prompt_response', get_prompt_response, methods=['POST']),
+    Route('/submit_and_download_log', submit_and_download_log, methods=['GET']),
+    # 그 외 모든 경로는 기존 Flask 앱이 처리
+    Mount('/', app=WsgiToAsgi(flask_app)),
+])
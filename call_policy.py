@@ -0,0 +1,425 @@
+# call_policy.py
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import openai
+
+# 🚩 chat.completions.create 호출 정책 (마감 시간 + 재시도 + 헤징)
+# - 라우트별 마감 시간(deadline) 안에서만 시도하고, 남은 시간을 요청 timeout으로 넘겨 멈춘 호출이 스레드를 붙잡지 않게 함
+# - 일시적 오류(타임아웃/연결 오류/429/5xx, 키 문제인 401)는 지터를 준 지수 백오프 후 다른 키로 재시도
+#   (403/409 등 요청 자체의 문제는 키를 바꿔도 같으므로 바로 실패)
+# - 헤징: 첫 요청이 그 라우트의 관측 p95 지연을 넘기면 다른 키로 같은 요청을 한 번 더 보내고, 먼저 끝난 응답을 사용
+#   (비동기 모드에서는 늦은 쪽을 취소하고, 동기 모드에서는 늦은 쪽 결과를 버림 - 요청 timeout으로 길이는 제한됨)
+#   헤징 요청은 입장 제어 자리 하나 안에서 키를 하나 더 쓰므로, hedge_allowed()가 False(입장 대기열에 기다리는 요청이 있음)면 보내지 않음
+
+
+class NoAvailableKeyError(Exception):
+    """키 풀에 쓸 수 있는 키가 없음 (키 미설정 또는 모두 인증 실패)"""
+
+
+class DeadlineExceededError(Exception):
+    """라우트 마감 시간 안에 응답을 받지 못함"""
+
+
+def is_retryable(error):
+    """다른 키로 다시 시도할 만한 오류인지 판단합니다."""
+    if isinstance(error, openai.APIConnectionError):  # APITimeoutError 포함
+        return True
+    status = getattr(error, 'status_code', None)
+    return status in (401, 408, 429) or (status is not None and status >= 500)
+
+
+def _cancel_lease_if_cancelled(lease):
+    """future/task done 콜백: 시작 전에 취소되면 with lease 블록을 거치지 않으므로 여기서 키를 반납"""
+    def callback(future):
+        if future.cancelled():
+            lease.cancel()
+    return callback
+
+
+class LatencyTracker:
+    """라우트별 최근 성공 지연 시간(초) 기록 → 헤징 기준(p95) 계산"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds):
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, route, q, min_samples):
+        with self._lock:
+            samples = sorted(self._samples.get(route, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    def summary(self):
+        with self._lock:
+            routes = {route: sorted(samples) for route, samples in self._samples.items()}
+        return {
+            route: {
+                'samples': len(samples),
+                'p50': round(samples[len(samples) // 2], 3),
+                'p95': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 3),
+            }
+            for route, samples in routes.items() if samples
+        }
+
+
+class CallPolicy:
+    """KeyPool 위에서 마감 시간/재시도/헤징을 적용해 chat.completions.create를 호출합니다.
+
+    call / acall         : 일반 응답 (헤징 가능)
+    open_stream / aopen_stream : 스트리밍 응답 (첫 응답 전까지만 재시도, 헤징 없음) → (lease, stream)
+    """
+
+    def __init__(self, pool, deadlines, default_deadline=30.0, max_attempts=3,
+                 backoff_base=0.5, backoff_max=4.0, hedge=True, hedge_quantile=0.95,
+                 hedge_min_delay=2.0, hedge_default_delay=8.0, hedge_min_samples=20,
+                 hedge_workers=32, hedge_allowed=None, token_estimator=None, metrics=None):
+        self.pool = pool
+        self.deadlines = dict(deadlines)
+        self.default_deadline = default_deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_workers = hedge_workers
+        self.hedge_allowed = hedge_allowed  # 헤징 직전에 호출 - False면 이번 헤징을 건너뜀 (서버가 붐빌 때)
+        self.token_estimator = token_estimator
+        self.metrics = metrics
+        self.latency = LatencyTracker()
+        self.stats = {'calls': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0, 'hedges_skipped': 0, 'deadline_exceeded': 0}
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+    # --- 공통 ---
+    def deadline_for(self, route):
+        return self.deadlines.get(route, self.default_deadline)
+
+    def hedge_delay(self, route):
+        p95 = self.latency.quantile(route, self.hedge_quantile, self.hedge_min_samples)
+        return max(p95, self.hedge_min_delay) if p95 is not None else self.hedge_default_delay
+
+    def _may_hedge(self):
+        if self.hedge_allowed is None or self.hedge_allowed():
+            return True
+        self.stats['hedges_skipped'] += 1
+        return False
+
+    def backoff(self, attempt):
+        """full jitter 지수 백오프"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _acquire(self, student_id, create_kwargs, exclude=()):
+        messages = create_kwargs.get('messages')
+        estimated = self.token_estimator(messages) if (self.token_estimator and messages) else 0
+        lease = self.pool.acquire(student_id, estimated, exclude=exclude)
+        if lease is None:
+            raise NoAvailableKeyError("사용 가능한 API 키가 없습니다.")
+        return lease
+
+    def _give_up(self, route, last_error):
+        if last_error is not None:
+            raise last_error
+        self.stats['deadline_exceeded'] += 1
+        raise DeadlineExceededError(f"{route}: {self.deadline_for(route):.0f}초 안에 응답을 받지 못했습니다.")
+
+    def status(self):
+        return {'latency': self.latency.summary(), **self.stats}
+
+    # --- 메트릭 ---
+    def _record_success(self, route, student_id, lease, elapsed, usage):
+        if self.metrics is None:
+            return
+        self.metrics.observe('llm_call_duration_seconds', elapsed, route, lease.key_number)
+        if usage is not None:
+            self.metrics.inc('llm_tokens_total', route, student_id, 'prompt', value=getattr(usage, 'prompt_tokens', 0) or 0)
+            self.metrics.inc('llm_tokens_total', route, student_id, 'completion', value=getattr(usage, 'completion_tokens', 0) or 0)
+
+    def _record_error(self, route, lease, error):
+        if self.metrics is None:
+            return
+        status = getattr(error, 'status_code', None)
+        if status is None:
+            status = 'timeout' if isinstance(error, openai.APITimeoutError) else (
+                'connection' if isinstance(error, openai.APIConnectionError) else 'other')
+        self.metrics.inc('llm_call_errors_total', route, lease.key_number, status)
+
+    # --- 동기 (Flask/gunicorn) ---
+    def _get_executor(self):
+        # fork 이후(gunicorn preload) 워커마다 헤징 스레드 풀을 새로 만듦
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._executor_lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix='hedge')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _submit(self, executor, route, student_id, lease, create_kwargs, deadline):
+        future = executor.submit(self._run_once, route, student_id, lease, create_kwargs, deadline - time.monotonic())
+        future.add_done_callback(_cancel_lease_if_cancelled(lease))
+        return future
+
+    def _run_once(self, route, student_id, lease, create_kwargs, timeout):
+        with lease:
+            started = time.monotonic()
+            try:
+                result = lease.client.chat.completions.create(**create_kwargs, timeout=timeout)
+            except Exception as e:
+                self._record_error(route, lease, e)
+                raise
+            elapsed = time.monotonic() - started
+            lease.record_usage(getattr(result, 'usage', None))
+            self._record_success(route, student_id, lease, elapsed, getattr(result, 'usage', None))
+        return result, elapsed
+
+    def _iter_stream(self, route, student_id, lease, stream, started):
+        """스트림 조각을 그대로 넘기면서 마지막 usage 조각(include_usage)으로 토큰 사용량을 기록합니다."""
+        usage = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, 'usage', None) or usage
+                yield chunk
+        except Exception as e:
+            self._record_error(route, lease, e)
+            raise
+        lease.record_usage(usage)
+        self._record_success(route, student_id, lease, time.monotonic() - started, usage)
+
+    def call(self, route, student_id, **create_kwargs):
+        """마감 시간 안에서 재시도/헤징하며 응답 하나를 반환합니다."""
+        self.stats['calls'] += 1
+        deadline = time.monotonic() + self.deadline_for(route)
+        last_error = None
+        tried = set()
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.stats['retries'] += 1
+            try:
+                result, elapsed = self._attempt(route, student_id, create_kwargs, deadline, tried)
+                self.latency.record(route, elapsed)
+                return result
+            except NoAvailableKeyError:
+                raise
+            except DeadlineExceededError:
+                self.stats['deadline_exceeded'] += 1
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                print(f"🚨 WARNING: {route} 호출 실패({attempt + 1}/{self.max_attempts}), 재시도합니다: {e}")
+            time.sleep(min(self.backoff(attempt), max(deadline - time.monotonic(), 0)))
+        self._give_up(route, last_error)
+
+    def _attempt(self, route, student_id, create_kwargs, deadline, tried):
+        primary = self._acquire(student_id, create_kwargs, exclude=tried)
+        tried.add(primary.key_number)
+        if not self.hedge or len(self.pool) < 2:
+            return self._run_once(route, student_id, primary, create_kwargs, deadline - time.monotonic())
+
+        executor = self._get_executor()
+        futures = {self._submit(executor, route, student_id, primary, create_kwargs, deadline): 'primary'}
+        done, _ = wait(futures, timeout=min(self.hedge_delay(route), max(deadline - time.monotonic(), 0)))
+        if not done and deadline > time.monotonic() and self._may_hedge():
+            backup = self._acquire(student_id, create_kwargs, exclude=tried)
+            if backup.key_number == primary.key_number:
+                backup.release()
+            else:
+                tried.add(backup.key_number)
+                self.stats['hedges'] += 1
+                futures[self._submit(executor, route, student_id, backup, create_kwargs, deadline)] = 'hedge'
+
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()  # 시작 전이면 done 콜백에서 키 반납, 이미 실행 중이면 결과만 버려짐 (키는 완료 시 반납)
+                    if futures[future] == 'hedge':
+                        self.stats['hedge_wins'] += 1
+                    return future.result()
+                errors.append(future.exception())
+        if errors:
+            raise errors[0]
+        raise DeadlineExceededError(f"{route}: {self.deadline_for(route):.0f}초 안에 응답을 받지 못했습니다.")
+
+    def open_stream(self, route, student_id, **create_kwargs):
+        """스트림 연결까지 재시도한 뒤 (lease, stream)을 반환합니다. 호출한 쪽에서 with lease: 로 스트림을 소비합니다."""
+        self.stats['calls'] += 1
+        deadline = time.monotonic() + self.deadline_for(route)
+        last_error = None
+        tried = set()
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.stats['retries'] += 1
+            lease = self._acquire(student_id, create_kwargs, exclude=tried)
+            tried.add(lease.key_number)
+            started = time.monotonic()
+            try:
+                # timeout은 스트림 조각 사이 대기 시간에도 적용되어 멈춘 스트림을 끊어 줌
+                stream = lease.client.chat.completions.create(
+                    **create_kwargs, stream=True, stream_options={"include_usage": True}, timeout=remaining
+                )
+                return lease, self._iter_stream(route, student_id, lease, stream, started)
+            except Exception as e:
+                self._record_error(route, lease, e)
+                lease.release(e)
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                print(f"🚨 WARNING: {route} 스트림 연결 실패({attempt + 1}/{self.max_attempts}), 재시도합니다: {e}")
+            time.sleep(min(self.backoff(attempt), max(deadline - time.monotonic(), 0)))
+        self._give_up(route, last_error)
+
+    # --- 비동기 (ASGI) ---
+    async def _arun_once(self, route, student_id, lease, create_kwargs, timeout):
+        with lease:
+            started = time.monotonic()
+            try:
+                result = await lease.async_client.chat.completions.create(**create_kwargs, timeout=timeout)
+            except Exception as e:
+                self._record_error(route, lease, e)
+                raise
+            elapsed = time.monotonic() - started
+            lease.record_usage(getattr(result, 'usage', None))
+            self._record_success(route, student_id, lease, elapsed, getattr(result, 'usage', None))
+        return result, elapsed
+
+    async def _aiter_stream(self, route, student_id, lease, stream, started):
+        usage = None
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, 'usage', None) or usage
+                yield chunk
+        except Exception as e:
+            self._record_error(route, lease, e)
+            raise
+        lease.record_usage(usage)
+        self._record_success(route, student_id, lease, time.monotonic() - started, usage)
+
+    async def acall(self, route, student_id, **create_kwargs):
+        """call()의 비동기 버전. 헤징에서 늦은 요청은 실제로 취소됩니다."""
+        self.stats['calls'] += 1
+        deadline = time.monotonic() + self.deadline_for(route)
+        last_error = None
+        tried = set()
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.stats['retries'] += 1
+            try:
+                result, elapsed = await self._aattempt(route, student_id, create_kwargs, deadline, tried)
+                self.latency.record(route, elapsed)
+                return result
+            except NoAvailableKeyError:
+                raise
+            except DeadlineExceededError:
+                self.stats['deadline_exceeded'] += 1
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                print(f"🚨 WARNING: {route} 호출 실패({attempt + 1}/{self.max_attempts}, async), 재시도합니다: {e}")
+            await asyncio.sleep(min(self.backoff(attempt), max(deadline - time.monotonic(), 0)))
+        self._give_up(route, last_error)
+
+    def _schedule(self, route, student_id, lease, create_kwargs, deadline):
+        task = asyncio.ensure_future(self._arun_once(route, student_id, lease, create_kwargs, deadline - time.monotonic()))
+        task.add_done_callback(_cancel_lease_if_cancelled(lease))
+        return task
+
+    async def _aattempt(self, route, student_id, create_kwargs, deadline, tried):
+        primary = self._acquire(student_id, create_kwargs, exclude=tried)
+        tried.add(primary.key_number)
+        tasks = {self._schedule(route, student_id, primary, create_kwargs, deadline): 'primary'}
+        try:
+            if self.hedge and len(self.pool) >= 2:
+                done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_delay(route), max(deadline - time.monotonic(), 0)))
+                if not done and deadline > time.monotonic() and await asyncio.to_thread(self._may_hedge):
+                    backup = self._acquire(student_id, create_kwargs, exclude=tried)
+                    if backup.key_number == primary.key_number:
+                        backup.release()
+                    else:
+                        tried.add(backup.key_number)
+                        self.stats['hedges'] += 1
+                        tasks[self._schedule(route, student_id, backup, create_kwargs, deadline)] = 'hedge'
+
+            errors = []
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] == 'hedge':
+                            self.stats['hedge_wins'] += 1
+                        return task.result()
+                    errors.append(task.exception())
+            if errors:
+                raise errors[0]
+            raise DeadlineExceededError(f"{route}: {self.deadline_for(route):.0f}초 안에 응답을 받지 못했습니다.")
+        finally:
+            # 늦은 요청(또는 마감 초과 요청) 취소 → lease는 with 블록(시작 전이면 done 콜백)에서 결과 없이 반납됨
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def aopen_stream(self, route, student_id, **create_kwargs):
+        """open_stream()의 비동기 버전"""
+        self.stats['calls'] += 1
+        deadline = time.monotonic() + self.deadline_for(route)
+        last_error = None
+        tried = set()
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.stats['retries'] += 1
+            lease = self._acquire(student_id, create_kwargs, exclude=tried)
+            tried.add(lease.key_number)
+            started = time.monotonic()
+            try:
+                stream = await lease.async_client.chat.completions.create(
+                    **create_kwargs, stream=True, stream_options={"include_usage": True}, timeout=remaining
+                )
+                return lease, self._aiter_stream(route, student_id, lease, stream, started)
+            except Exception as e:
+                self._record_error(route, lease, e)
+                lease.release(e)
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                print(f"🚨 WARNING: {route} 스트림 연결 실패({attempt + 1}/{self.max_attempts}, async), 재시도합니다: {e}")
+            await asyncio.sleep(min(self.backoff(attempt), max(deadline - time.monotonic(), 0)))
+        self._give_up(route, last_error)
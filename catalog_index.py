@@ -0,0 +1,169 @@
+# catalog_index.py
+
+import math
+import re
+from collections import Counter, defaultdict
+
+# 🚩 에듀테크 도구/사이트 카탈로그(MD 표) 검색 인덱스
+# 매 요청마다 카탈로그 전체를 시스템 프롬프트에 넣는 대신, 현재 대화와 관련된 상위 k개 항목만 골라 넣습니다.
+# 한국어는 띄어쓰기·조사 때문에 단어 단위 매칭이 약하므로 한글은 음절 bigram으로, 영문/숫자는 단어로 색인합니다.
+# "도구", "추천"처럼 어느 항목에나 붙는 일반어는 색인/질의에서 빼고(STOPWORDS),
+# 카탈로그에는 영문 이름만 있으므로 "패들렛" 같은 한글 표기는 영문 이름으로 질의를 확장합니다(NAME_ALIASES).
+
+_MD_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+_HANGUL_RUN = re.compile(r'[가-힣]+')
+_LATIN_WORD = re.compile(r'[a-z0-9]+')
+
+# 질의에 자주 나오지만 특정 항목을 가리키지 못하는 일반어 (질의와 문서 모두에서 제외)
+STOPWORDS = (
+    '도구', '추천', '사이트', '웹사이트', '프로그램', '서비스', '플랫폼', '앱', '웹',
+    '수업', '활용', '사용', '학생', '교사', '선생님', '방법', '관련', '소개',
+    '어떤', '좋은', '무엇', '뭐가', '알려', '있을까', '해줘', '주세요', '하는', '싶어',
+)
+
+# 한글 표기 → 카탈로그의 영문 이름 (질의의 단어가 이 표기로 시작하면 영문 이름 토큰을 추가, 표기 중간의 공백은 무시)
+NAME_ALIASES = {
+    '패들렛': 'padlet', '띵커벨': 'thinkerbell', '카훗': 'kahoot', '퀴즈앤': 'quizn',
+    '폴에브리웨어': 'poll everywhere', '피어그레이드': 'peergrade', '헤드스페이스': 'headspace', '고누들': 'gonoodle',
+    '클래스도조': 'classdojo', '김킷': 'gimkit', '북크리에이터': 'book creator', '타이니탭': 'tinytap',
+    '익스플레인에브리띵': 'explain everything', '에드모도': 'edmodo', '스쿨로지': 'schoology', '프로디지': 'prodigy',
+    '커먼릿': 'commonlit', '뉴셀라': 'newsela', '코드닷오알지': 'code org', '지오지브라': 'geogebra',
+    '에드퍼즐': 'edpuzzle', '니어팟': 'nearpod', '퀴지즈': 'quizizz', '퀴즈지즈': 'quizizz', '포머티브': 'formative',
+    '피어덱': 'pear deck', '데스모스': 'desmos', '구글렌즈': 'google lens', '칸아카데미': 'khan academy',
+    '애니모토': 'animoto', '소크라티브': 'socrative', '캔버스': 'canvas', '하이퍼닥스': 'hyperdocs',
+    '구글사이트': 'google sites', '구글설문': 'google forms', '구글폼': 'google forms', '멘티미터': 'mentimeter',
+    '웨이크렛': 'wakelet', '타임토스트': 'timetoast', '프레지': 'prezi', '퀴즐렛': 'quizlet', '유튜브': 'youtube',
+    '테드에드': 'ted ed', '듀오링고': 'duolingo', '스크래치': 'scratch', '리마인드': 'remind', '줌': 'zoom',
+    '아이무비': 'imovie', '캔바': 'canva', 'qr코드': 'qr code', '그래머리': 'grammarly', '카미': 'kami',
+    '스토리버드': 'storybird', '앱인벤터': 'app inventor', '디스코드': 'discord', '픽토차트': 'piktochart',
+    '에버노트': 'evernote', '트위터': 'twitter', '드롭박스': 'dropbox', '마인크래프트': 'minecraft',
+    '구글어스': 'google earth', '슬라이드쉐어': 'slideshare', '팝플렛': 'popplet', '시소': 'seesaw',
+    '케리스': 'keris', '에드서지': 'edsurge', '아이스테': 'iste',
+}
+
+
+# 두 음절 이하 표기('줌', '카미', '시소')는 다른 단어 안에 흔히 들어 있으므로('알려줌') 단어 전체이거나 뒤에 조사만 붙은 경우만 인정
+_PARTICLES = ('은', '는', '이', '가', '을', '를', '에', '에서', '으로', '로', '와', '과', '랑', '이랑', '도', '만', '의', '처럼')
+
+
+def _alias_pattern(alias):
+    body = r'\s*'.join(re.escape(char) for char in alias)
+    tail = '' if len(alias) >= 3 else '(?:%s)?(?![가-힣])' % '|'.join(sorted(_PARTICLES, key=len, reverse=True))
+    return re.compile(r'(?<![가-힣a-z0-9])' + body + tail)
+
+
+def tokenize(text):
+    """한글은 음절 bigram(한 글자 단어는 unigram), 영문/숫자는 소문자 단어로 토큰화합니다."""
+    text = text.lower()
+    tokens = _LATIN_WORD.findall(text)
+    for run in _HANGUL_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+_STOP_TOKENS = frozenset(token for word in STOPWORDS for token in tokenize(word))
+
+
+def index_tokens(text):
+    """색인용 토큰 (일반어 제외)"""
+    return [token for token in tokenize(text) if token not in _STOP_TOKENS]
+
+
+_ALIAS_PATTERNS = [(_alias_pattern(alias), tokenize(name)) for alias, name in NAME_ALIASES.items()]
+
+
+def query_tokens(query):
+    """질의 토큰: 일반어를 빼고, 한글 표기된 도구 이름은 영문 이름 토큰으로 확장"""
+    tokens = index_tokens(query)
+    text = query.lower()
+    for pattern, name_tokens in _ALIAS_PATTERNS:
+        if pattern.search(text):
+            tokens.extend(name_tokens)
+    return tokens
+
+
+def parse_markdown_table(md_text):
+    """MD 표를 (헤더 행 목록, [(원문 행, 셀 리스트), ...])로 파싱합니다."""
+    header_lines = []
+    rows = []
+    for line in md_text.splitlines():
+        line = line.strip()
+        if not line.startswith('|'):
+            continue
+        cells = [c.strip() for c in line.strip('|').split('|')]
+        if len(header_lines) < 2:
+            header_lines.append(line)  # 헤더 + 구분선(:---)
+            continue
+        rows.append((line, cells))
+    return header_lines, rows
+
+
+class BM25Index:
+    """문서 토큰 리스트에 대한 최소 BM25 역색인"""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.doc_lengths) / len(documents)) if documents else 0.0
+        self.postings = defaultdict(list)  # term -> [(doc_id, tf), ...]
+        for doc_id, doc in enumerate(documents):
+            for term, tf in Counter(doc).items():
+                self.postings[term].append((doc_id, tf))
+        n = len(documents)
+        self.idf = {
+            term: math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+
+    def search(self, query_tokens, k):
+        if not self.doc_lengths:
+            return []
+        scores = defaultdict(float)
+        for term in set(query_tokens):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in posting:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+class CatalogIndex:
+    """MD 표 하나(도구 목록 또는 사이트 목록)에 대한 검색 인덱스"""
+
+    def __init__(self, md_text, name_column, group_column=None, min_score_ratio=0.25):
+        self.header_lines, self.rows = parse_markdown_table(md_text)
+        self.name_column = name_column
+        self.group_column = group_column
+        self.min_score_ratio = min_score_ratio  # 1위 점수 대비 이 비율 미만인 항목은 k개를 채우려고 넣지 않음
+        self.index = BM25Index([index_tokens(_MD_LINK.sub(r'\1', line)) for line, _ in self.rows])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query, k):
+        """질의와 관련된 상위 k개 행의 원문(MD)을 원래 표 순서대로 반환합니다."""
+        hits = self.index.search(query_tokens(query), k)
+        if hits:
+            cutoff = hits[0][1] * self.min_score_ratio
+            hits = [(doc_id, score) for doc_id, score in hits if score >= cutoff]
+        return [self.rows[doc_id][0] for doc_id in sorted(doc_id for doc_id, _ in hits)]
+
+    def render(self, row_lines):
+        return "\n".join(self.header_lines + list(row_lines))
+
+    def group_summary(self):
+        """카테고리별 항목 수 (그룹별 한 줄) - 전체 이름 목록 대신, 발췌 밖에도 어떤 분류의 항목이 있는지만 알림"""
+        groups = {}
+        for _, cells in self.rows:
+            if self.group_column is None or len(cells) <= self.group_column:
+                continue
+            group = cells[self.group_column]
+            groups[group] = groups.get(group, 0) + 1
+        return "\n".join(f"- {group} ({count}개)" for group, count in groups.items())
@@ -1,12 +1,31 @@
-# config_utils.py
+﻿# config_utils.py
 
 import os
 import json
-from openai import OpenAI
+import time
 import datetime
+from collections import namedtuple
+from conversation_store import create_conversation_store
+from context_manager import ContextWindowManager, estimate_message_tokens
+from prompt_registry import PromptRegistry
+from catalog_index import CatalogIndex
+from log_writer import BufferedLogWriter
+from event_store import ConversationEventStore, format_transcript_entry
+from log_download import LogDownload, TranscriptDownload
+from scaffolding_counter import ScaffoldingCounter
+from key_pool import KeyPool
+from http_transport import SharedHTTPTransport
+from call_policy import CallPolicy
+from nudge_prefetch import NudgePrefetcher, NudgeResult
+from session_flight import SessionFlightControl
+from admission import AdmissionController
+from metrics import create_app_metrics
+from static_assets import StaticAssets
+from model_router import ModelRouter, RoutingDecision
 
 # --- 환경 변수 로드 및 초기 설정 ---
 LOGS_DIR = '/tmp/logs' 
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') # 🚩 연구자/관리자용 라우트 접근 토큰 (미설정 시 해당 라우트 비활성화)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 PROMPT_DIR = os.path.join(DATA_DIR, 'prompts')
@@ -14,100 +33,166 @@ PROMPT_DIR = os.path.join(DATA_DIR, 'prompts')
 os.makedirs(LOGS_DIR, exist_ok=True)
 os.makedirs(PROMPT_DIR, exist_ok=True)
 
+# 🚩 정적 파일 지문 빌드 + 사전 압축 (원본이 바뀌었을 때만 다시 빌드, STATIC_FINGERPRINT=0이면 원본 이름 그대로)
+STATIC_DIR = os.path.join(BASE_DIR, 'homepage', 'static')
+STATIC_ASSETS = StaticAssets(
+    STATIC_DIR,
+    os.getenv('STATIC_BUILD_DIR', os.path.join(BASE_DIR, 'homepage', 'static_build')),
+    enabled=os.getenv('STATIC_FINGERPRINT', '1') == '1'
+)
+
+# 🚩 Prometheus 메트릭 (/metrics) - 요청 경로에서는 메모리 카운터만 올리고, 워커별 스냅샷을 주기적으로 파일에 기록
+METRICS = create_app_metrics(
+    os.getenv('METRICS_DIR', os.path.join(LOGS_DIR, 'metrics')),
+    flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', 5.0))
+)
+
+# 🚩 대화 이력 서버 저장소 (세션 쿠키에는 세션 ID만 저장)
+CONVERSATION_STORE = create_conversation_store(LOGS_DIR)
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_PAGE_SIZE', 30)) # /chat 첫 화면과 /chat_history 한 번에 보내는 메시지 수
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
 # --- OpenAI 클라이언트 초기화 ---
 STUDENT_KEY_NAMES = [f'OPENAI_KEY_{i}' for i in range(1, 28)] 
-API_CLIENTS = {}
-LAST_RESORT_CLIENT = None
+API_KEYS = {}
 MODEL_NAME = "gpt-4o" 
+LIGHT_MODEL_NAME = os.getenv('LIGHT_MODEL_NAME', 'gpt-4o-mini') # 🚩 맞장구/인사/침묵 재촉용 가벼운 모델
 
+for i, key_name in enumerate(STUDENT_KEY_NAMES):
+    api_key = os.getenv(key_name)
+    if api_key:
+        API_KEYS[i + 1] = api_key
+    else:
+        print(f"🚨 WARNING: {key_name} 환경 변수가 누락되었습니다. 키 풀에서 제외됩니다.")
+
+# 🚩 모든 키가 공유하는 HTTP 연결 풀 (keep-alive 연결을 키와 관계없이 재사용, h2 설치 시 HTTP/2)
+OPENAI_TRANSPORT = SharedHTTPTransport(
+    max_connections=int(os.getenv('OPENAI_HTTP_MAX_CONNECTIONS', 100)),
+    max_keepalive_connections=int(os.getenv('OPENAI_HTTP_MAX_KEEPALIVE', 40)),
+    keepalive_expiry=float(os.getenv('OPENAI_HTTP_KEEPALIVE_EXPIRY', 60)),
+    http2=os.getenv('OPENAI_HTTP2', '1') == '1',
+)
+
+# 🚩 API 키 풀: 학생을 키 하나에 고정하지 않고 여유 있는 키 중 부하가 가장 적은 키로 라우팅
+# (KEY_POOL_RPM/TPM은 워커 하나 기준 키별 한도, 429/401을 받은 키는 자동으로 잠시 제외)
 try:
-    for i, key_name in enumerate(STUDENT_KEY_NAMES):
-        api_key = os.getenv(key_name)
-        if api_key:
-            API_CLIENTS[i + 1] = OpenAI(api_key=api_key) 
-        else:
-            print(f"🚨 WARNING: {key_name} 환경 변수가 누락되었습니다. {i+1}번 학생에게 키가 할당되지 않습니다.")
-
-    last_key_name = STUDENT_KEY_NAMES[-1] 
-    last_api_key = os.getenv(last_key_name)
-    
-    if last_api_key:
-        LAST_RESORT_CLIENT = API_CLIENTS.get(27, OpenAI(api_key=last_api_key)) 
-        
-    print(f"✅ INFO: 총 {len(API_CLIENTS)}개의 학생 API 클라이언트와 관리자용 클라이언트가 준비되었습니다.")
-
+    KEY_POOL = KeyPool(
+        API_KEYS,
+        rpm=int(os.getenv('KEY_POOL_RPM', 500)),
+        tpm=int(os.getenv('KEY_POOL_TPM', 30000)),
+        sticky=os.getenv('KEY_POOL_STICKY', '1') == '1',
+        cooldown=float(os.getenv('KEY_POOL_COOLDOWN', 20)),
+        auth_cooldown=float(os.getenv('KEY_POOL_AUTH_COOLDOWN', 600)),
+        transport=OPENAI_TRANSPORT,
+    )
+    print(f"✅ INFO: 총 {len(KEY_POOL)}개의 API 키로 키 풀이 준비되었습니다.")
 except Exception as e:
     print(f"🚨 ERROR: OpenAI 클라이언트 초기화 오류: {e}")
-
-# 🚨 학번에 따라 클라이언트를 반환하는 함수 (app.py에서 사용)
-def get_client_by_user(student_id):
-    """학번의 순서(인덱스)를 기반으로 고유한 API 클라이언트를 반환합니다."""
-    
-    try:
-        user_list = list(AUTHORIZED_USERS.keys())
-        user_index = user_list.index(student_id)
-    except ValueError:
-        print(f"DEBUG: Unknown Student ID {student_id}. Assigning Last Resort Client.")
-        return LAST_RESORT_CLIENT
-        
-    if user_index >= 26: 
-        client_key_number = 27
-    else:
-        client_key_number = user_index + 1
-        
-    client_to_use = API_CLIENTS.get(client_key_number)
-
-    return client_to_use if client_to_use else LAST_RESORT_CLIENT
+    KEY_POOL = KeyPool({})
+
+# 🚩 호출 정책: 라우트별 마감 시간 + 일시적 오류 재시도(다른 키로) + 느린 요청 헤징
+CALL_POLICY = CallPolicy(
+    KEY_POOL,
+    deadlines={
+        'response': float(os.getenv('CALL_DEADLINE_RESPONSE', 30)),
+        'stream': float(os.getenv('CALL_DEADLINE_STREAM', 30)),
+        'nudge': float(os.getenv('CALL_DEADLINE_NUDGE', 15)),
+        'nudge_prefetch': float(os.getenv('CALL_DEADLINE_NUDGE_PREFETCH', 45)),
+        'context_summary': float(os.getenv('CALL_DEADLINE_CONTEXT_SUMMARY', 45)),
+    },
+    max_attempts=int(os.getenv('CALL_MAX_ATTEMPTS', 3)),
+    hedge=os.getenv('CALL_HEDGE', '1') == '1',
+    hedge_default_delay=float(os.getenv('CALL_HEDGE_DEFAULT_DELAY', 8)),
+    hedge_allowed=lambda: not ADMISSION.has_waiting(), # 입장 대기열에 기다리는 요청이 있으면 헤징으로 키를 더 쓰지 않음
+    token_estimator=estimate_message_tokens,
+    metrics=METRICS,
+)
+METRICS.gauge('llm_in_flight', '진행 중인 OpenAI 호출 수 (키별, 워커 합계)', ('key',),
+              lambda: {(key.number,): key.in_flight for key in KEY_POOL.keys.values()})
+
+def get_key_pool_status():
+    """키별 상태(쿨다운, 진행 중 요청, 남은 RPM/TPM 등)와 라우트별 지연/재시도/헤징, 대화별 직렬화, 모델 라우팅 설정, 입장 대기열 - 관리자용"""
+    return {**KEY_POOL.status(), 'calls': CALL_POLICY.status(), 'sessions': SESSION_FLIGHT.status(),
+            'routing': MODEL_ROUTER.status(), 'admission': ADMISSION.status()}
 # ----------------------------------------------------
 
 
 # --- 프롬프트 및 사용자 데이터 로드 함수 ---
 
+# 🚩 프롬프트 파일은 메모리에 캐시하고 mtime 변경 시에만 다시 읽음 (재배포 없이 수정 반영)
+PROMPT_RELOAD_INTERVAL = float(os.getenv('PROMPT_RELOAD_INTERVAL', 2.0))
+PROMPT_FILES = [
+    'system_prompt.md', 'situation.md', 'rules.md', 'task.md', 'learner_model.md',
+    'ai_edutech_tools.md', 'edutech_websites.md',
+]
+PROMPT_REGISTRY = PromptRegistry(PROMPT_DIR, check_interval=PROMPT_RELOAD_INTERVAL, tracked_files=PROMPT_FILES)
+
 def load_prompt_file(filename):
-    """지정된 프롬프트 파일을 읽어옵니다. 파일이 없을 경우 빈 문자열을 반환합니다."""
-    file_path = os.path.join(PROMPT_DIR, filename)
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
-        # 🚩 수정: 파일 로드 실패 시 오류 문자열 대신 빈 문자열 반환 (시스템 프롬프트 안정화)
-        print(f"🚨 오류: '{file_path}' 파일을 찾을 수 없습니다.")
-        return ""
+    """지정된 프롬프트 파일을 (캐시에서) 읽어옵니다. 파일이 없을 경우 빈 문자열을 반환합니다."""
+    return PROMPT_REGISTRY.get(filename)
+
+def get_prompt_version():
+    """현재 프롬프트 리비전(프롬프트 파일 내용 해시)을 반환합니다."""
+    return PROMPT_REGISTRY.version
     
-# 🚩 RAG 데이터 경로 (JSON 파일 로드가 성공했다는 전제하에 유지)
-EDUTECH_TOOLS_PATH = os.path.join(PROMPT_DIR, 'ai_edutech_tools.json')
-WEBSITES_PATH = os.path.join(PROMPT_DIR, 'edutech_websites.json')
+# 🚩 RAG 카탈로그 검색 인덱스 (에듀테크 도구/사이트 MD 표 → BM25, 프롬프트 파일이 바뀔 때만 재구성)
+CATALOG_RETRIEVAL_ENABLED = os.getenv('CATALOG_RETRIEVAL', '1') != '0'
+CATALOG_TOP_K_TOOLS = int(os.getenv('CATALOG_TOP_K_TOOLS', 8))
+CATALOG_TOP_K_SITES = int(os.getenv('CATALOG_TOP_K_SITES', 3))
+CATALOG_QUERY_MESSAGES = 3 # 검색 질의로 사용할 최근 메시지 수 (직전 AI 답변에 나온 도구명 포함)
 
-# 🚩 서버 시작 시 데이터를 메모리에 로드 (JSON 로드 실패 시에도 빈 리스트로 초기화)
-try:
-    with open(EDUTECH_TOOLS_PATH, 'r', encoding='utf-8') as f:
-        EDUTECH_TOOLS_DATA = json.load(f)
-    print("INFO: Edutech tools data loaded successfully.")
-except Exception as e:
-    print(f"🚨 ERROR: Edutech tools data loading failed: {e}")
-    EDUTECH_TOOLS_DATA = []
+def build_catalog_indexes():
+    tools_index = CatalogIndex(load_prompt_file('ai_edutech_tools.md'), name_column=1, group_column=0)
+    sites_index = CatalogIndex(load_prompt_file('edutech_websites.md'), name_column=0)
+    print(f"INFO: 에듀테크 카탈로그 인덱스 구성 완료 (도구 {len(tools_index)}개, 사이트 {len(sites_index)}개)")
+    return tools_index, sites_index
 
-try:
-    with open(WEBSITES_PATH, 'r', encoding='utf-8') as f:
-        EDUTECH_WEBSITES_DATA = json.load(f)
-    print("INFO: Edutech websites data loaded successfully.")
-except Exception as e:
-    print(f"🚨 ERROR: Edutech websites data loading failed: {e}")
-    EDUTECH_WEBSITES_DATA = []
+def get_catalog_indexes():
+    return PROMPT_REGISTRY.compiled('catalog_indexes', build_catalog_indexes)
 
 def get_integrated_system_prompt():
-    """시스템 프롬프트, 상황, 규칙, 과제를 통합하여 반환합니다."""
+    """시스템 프롬프트, 상황, 규칙, 과제를 통합하여 반환합니다. (프롬프트 파일이 바뀐 경우에만 재구성)"""
+    return PROMPT_REGISTRY.compiled('integrated_system_prompt', build_integrated_system_prompt)
+
+def get_system_prompt_for_query(query):
+    """카탈로그 중 질의와 관련된 항목만 포함한 시스템 프롬프트를 반환합니다.
+
+    고정 부분(기본 프롬프트)을 앞에 두고 발췌한 카탈로그를 맨 뒤에 붙여, 요청마다 달라지는 부분을 최소화합니다.
+    """
+    if not CATALOG_RETRIEVAL_ENABLED:
+        return get_integrated_system_prompt()
+
+    base_prompt = PROMPT_REGISTRY.compiled('base_system_prompt', build_base_system_prompt)
+    tools_index, sites_index = get_catalog_indexes()
+    tool_rows = tools_index.search(query, CATALOG_TOP_K_TOOLS)
+    site_rows = sites_index.search(query, CATALOG_TOP_K_SITES)
+
+    tools_section = tools_index.render(tool_rows) if tool_rows else "(현재 대화와 직접 관련된 도구 없음)"
+    sites_section = sites_index.render(site_rows) if site_rows else "(현재 대화와 직접 관련된 사이트 없음)"
+    return base_prompt + f"""
+## 에듀테크 도구 및 사이트 자료
+학습자가 에듀테크 도구(질문 유형 2)나 참고 사이트(질문 유형 3)에 대해 물어볼 경우, 반드시 아래 자료를 **참조하여 답변**해야 한다.
+아래 표는 현재 대화와 관련된 항목만 발췌한 것이며, 목록에 없는 도구·사이트를 지어내지 않는다.
+
+### 2. 에듀테크 도구 목록 (관련 항목 발췌)
+{tools_section}
+
+#### 전체 도구 카테고리 (발췌에 없는 도구가 필요하면 학습자에게 목적을 더 묻고, 이름을 지어내지 않는다)
+{tools_index.group_summary()}
+
+### 3. 참고 웹사이트 목록 (관련 항목 발췌)
+{sites_section}
+---
+"""
+
+def build_base_system_prompt():
+    """카탈로그(에듀테크 도구/사이트 자료)를 제외한 통합 시스템 프롬프트"""
     system_base = load_prompt_file('system_prompt.md')
     situation = load_prompt_file('situation.md')
     rules = load_prompt_file('rules.md')
     task = load_prompt_file('task.md')
     learner_model_data = load_prompt_file('learner_model.md') 
-    
-    # 🚩 RAG 데이터를 MD 파일로 로드 (시스템 프롬프트에 직접 포함하여 안정화)
-    edutech_tools = load_prompt_file('ai_edutech_tools.md')
-    edutech_sites = load_prompt_file('edutech_websites.md')
-    
-    # 통합된 시스템 프롬프트 구성
+
     return f"""
 {system_base}
 ---
@@ -129,7 +214,16 @@ def get_integrated_system_prompt():
 ## 학습 모델 자료
 학습자 중심 학습 모델에 대한 질문을 받을 경우, 반드시 아래 자료에 기반하여 답변해야 한다.
 {learner_model_data}
+"""
 
+def build_integrated_system_prompt():
+    """카탈로그 전체를 포함한 통합 시스템 프롬프트 (CATALOG_RETRIEVAL=0일 때 사용)"""
+    # 🚩 RAG 데이터를 MD 파일로 로드 (시스템 프롬프트에 직접 포함하여 안정화)
+    edutech_tools = load_prompt_file('ai_edutech_tools.md')
+    edutech_sites = load_prompt_file('edutech_websites.md')
+    
+    # 통합된 시스템 프롬프트 구성
+    return build_base_system_prompt() + f"""
 ## 에듀테크 도구 및 사이트 자료
 학습자가 에듀테크 도구(질문 유형 2)나 참고 사이트(질문 유형 3)에 대해 물어볼 경우, 반드시 아래 자료를 **참조하여 답변**해야 한다.
 
@@ -141,7 +235,24 @@ def get_integrated_system_prompt():
 ---
 """
 
-INTEGRATED_SYSTEM_PROMPT = get_integrated_system_prompt()
+def preload():
+    """요청과 무관한 불변 데이터(프롬프트 파일, 카탈로그 인덱스, 기본 시스템 프롬프트, 정적 파일 manifest)를 미리 구성합니다.
+
+    gunicorn preload_app(gunicorn.conf.py)에서는 마스터 프로세스가 한 번만 실행하고, 워커는 fork 시 이를 공유(copy-on-write)합니다.
+    OpenAI 클라이언트·백그라운드 스레드·DB 커넥션은 여기서 만들지 않고 각 워커에서 처음 사용할 때 생성됩니다.
+    """
+    for filename in PROMPT_FILES:
+        load_prompt_file(filename)
+    if CATALOG_RETRIEVAL_ENABLED:
+        get_catalog_indexes()
+        PROMPT_REGISTRY.compiled('base_system_prompt', build_base_system_prompt)
+    else:
+        get_integrated_system_prompt()
+    STATIC_ASSETS.preload()
+
+# 🚩 CONFIG_PRELOAD=0이면 임포트 시 구성하지 않고 첫 요청에서 구성 (점검/도구 스크립트용 빠른 임포트)
+if os.getenv('CONFIG_PRELOAD', '1') == '1':
+    preload()
 
 # 사용자 데이터 로드 (유지)
 try:
@@ -156,65 +267,313 @@ except json.JSONDecodeError as e:
     print(f"🚨 오류: users.json 파일 형식이 잘못되었습니다. ({e})")
     AUTHORIZED_USERS = {}
 
+KEY_POOL.assign_home_keys(AUTHORIZED_USERS) # 명단 순서대로 초기 키 배정 (이후 부하에 따라 이동)
 
-# config_utils.py 내 log_conversation_entry 함수 확인
-def log_conversation_entry(speaker, text, log_filename, scaffolding_type=None):
-    """대화 항목을 TXT 로그 파일에 추가합니다. (portalocker 제거)"""
-    log_file_path = os.path.join(LOGS_DIR, log_filename)
-    now_str = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    if speaker == 'User':
-        log_entry = f"[{now_str}] 사용자: {text}\n\n"
-    else: # AI
-        label = f" ({scaffolding_type})" if scaffolding_type else ""
-        log_entry = f"[{now_str}] AI{label}: {text}\n"
-        log_entry += f"----------------------------------------\n\n"
-        
-    log_dir = os.path.dirname(log_file_path)
-    
-    print(f"DEBUG: Attempting to write log to: {log_file_path}")
-    
+
+# 🚩 스캐폴딩 유형 검증 및 AI 응답(JSON) 파싱 (일반/스트리밍 라우트 공용)
+VALID_SCAFFOLDING_TYPES = ["개념적 스캐폴딩", "전략적 스캐폴딩", "메타인지적 스캐폴딩", "동기적 스캐폴딩", "일반"]
+
+def parse_ai_response(ai_response_json_str, route='response'):
+    """AI의 JSON 응답 문자열을 (scaffolding_type, response_text) 튜플로 변환합니다."""
     try:
-        # 🚩 수정: portalocker 없이 표준 os.makedirs와 with open('a') 사용
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir, exist_ok=True) 
-            
-        # 'a' (append) 모드로 열어 기존 내용을 덮어쓰지 않고 추가만 합니다.
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-            
-    except Exception as e:
-        print(f"🚨🚨 CRITICAL LOG WRITE FAIL: 로그 파일 저장 실패: {log_file_path} ({e})")
+        ai_response_data = json.loads(ai_response_json_str)
+
+        scaffolding_type = ai_response_data.get("scaffolding_type", "분류실패")
+        if not scaffolding_type in VALID_SCAFFOLDING_TYPES:
+            scaffolding_type = "분류실패"
+
+        response_text = ai_response_data.get("response_text", "AI 응답 생성에 실패했습니다.")
+
+    except json.JSONDecodeError:
+        METRICS.inc('llm_json_parse_failures_total', route)
+        scaffolding_type = "JSON 파싱 실패"
+        response_text = "AI 응답 형식에 오류가 발생했어. 잠시 후 다시 시도해 봐."
+
+    return scaffolding_type, response_text
+
+
+# 🚩 API 호출 메시지 구성 (Flask/ASGI 라우트 공용)
+# 입력 토큰 예산: 시스템 프롬프트 + 최근 메시지를 유지하고, 초과분은 가벼운 모델의 롤링 요약(+ 아직 요약 전인 메시지 발췌)으로 대체
+# (CONTEXT_SUMMARY=0이면 요약 없이 메시지별 앞부분만 잘라낸 발췌만 사용)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 12000))
+CONTEXT_KEEP_LAST_MESSAGES = int(os.getenv('CONTEXT_KEEP_LAST_MESSAGES', 12))
+CONTEXT_SUMMARY_ENABLED = os.getenv('CONTEXT_SUMMARY', '1') == '1'
+CONTEXT_SUMMARY_PROMPT = "너는 학습 대화의 앞부분을 요약하는 도우미야. 기존 요약과 새 대화를 합쳐, 학습자가 정한 목표·결정한 내용·사용하기로 한 도구·진행 상황·아직 어려워하는 부분이 드러나도록 600자 이내의 한국어 요약 하나로 다시 써. 요약문만 출력해."
+
+def summarize_context(previous_summary, messages):
+    """이전 요약 + 새로 접힌 메시지로 롤링 요약을 갱신합니다. (CONTEXT_MANAGER의 백그라운드 스레드에서 호출)"""
+    transcript = "\n".join(f"{'사용자' if m.get('role') == 'user' else 'AI'}: {m.get('content', '')}" for m in messages)
+    content = (f"# 기존 요약\n{previous_summary}\n\n" if previous_summary else "") + f"# 새 대화\n{transcript}"
+    # 요약도 입장 대기열을 거침 (우선순위 가장 낮음, 차단되면 이번에는 발췌로 보내고 다음 호출 때 다시 시도)
+    with ADMISSION.ticket(None, 'summary'):
+        chat_completion = CALL_POLICY.call(
+            'context_summary', None,
+            model=LIGHT_MODEL_NAME,
+            messages=[{"role": "system", "content": CONTEXT_SUMMARY_PROMPT}, {"role": "user", "content": content}]
+        )
+    return chat_completion.choices[0].message.content.strip()
+
+CONTEXT_MANAGER = ContextWindowManager(
+    CONTEXT_TOKEN_BUDGET, CONTEXT_KEEP_LAST_MESSAGES,
+    summarizer=summarize_context if CONTEXT_SUMMARY_ENABLED else None,
+    summary_min_messages=int(os.getenv('CONTEXT_SUMMARY_MIN_MESSAGES', 4)), # 새로 접힌 메시지가 이만큼 쌓여야 요약 갱신
+)
+
+def fit_context(prefix_messages, conversation, conversation_id=None, kind='response'):
+    """토큰 예산에 맞춰 (API 메시지, 통계 dict)를 구성합니다. 잘라내기가 적용되면 절감량을 메트릭에 기록하고,
+    호출자는 stats['tokens_saved']를 log_conversation_entry(context_tokens_saved=...)로 이벤트 저장소에 남깁니다."""
+    messages_for_api, stats = CONTEXT_MANAGER.fit(prefix_messages, conversation, cache_key=conversation_id)
+    if stats["tokens_saved"]:
+        METRICS.inc('llm_context_truncations_total', kind)
+        METRICS.inc('llm_context_tokens_saved_total', kind, value=stats["tokens_saved"])
+    return messages_for_api, stats
+
+NUDGE_PROMPT_MESSAGE = "5분 동안 사용자로부터 응답이 없습니다. 프롬프트 규칙 1번(침묵 감지 및 재촉)에 따라, '지금 어디까지 생각해봤거나 어디까지 진행되었어? 하면서 어떤 부분이 어렵니?'와 같은 내용으로 사용자의 대화를 재촉하는 메시지를 생성하세요."
+
+def catalog_query(conversation):
+    """카탈로그 검색 질의: 최근 메시지(현재 사용자 메시지 포함)의 내용"""
+    return "\n".join(m.get("content", "") for m in conversation[-CATALOG_QUERY_MESSAGES:])
+
+def build_response_messages(conversation, conversation_id=None):
+    """일반 답변용: 시스템 프롬프트(관련 카탈로그 발췌) + 대화 이력 (토큰 예산 적용). (messages, 통계 dict)"""
+    return fit_context([
+        {"role": "system", "content": get_system_prompt_for_query(catalog_query(conversation))}
+    ], conversation, conversation_id)
+
+def build_nudge_messages(conversation, conversation_id=None):
+    """침묵 감지 재촉용: 시스템 프롬프트(관련 카탈로그 발췌) + 재촉 지시 + 대화 이력 (토큰 예산 적용). (messages, 통계 dict)"""
+    return fit_context([
+        {"role": "system", "content": get_system_prompt_for_query(catalog_query(conversation))},
+        {"role": "user", "content": NUDGE_PROMPT_MESSAGE} 
+    ], conversation, conversation_id, kind='nudge')
+
+def parse_nudge_response(ai_response_json_str, route='nudge'):
+    """재촉 응답 JSON을 (scaffolding_type, response_text)로 변환합니다. JSON 오류는 호출자에게 전달됩니다."""
+    try:
+        ai_response_data = json.loads(ai_response_json_str)
+    except json.JSONDecodeError:
+        METRICS.inc('llm_json_parse_failures_total', route)
+        raise
+    response_text = ai_response_data.get("response_text", "다시 시도해 주세요.")
+    scaffolding_type = ai_response_data.get("scaffolding_type", "동기적 스캐폴딩") 
+    return scaffolding_type, response_text
+
+# 🚩 모델 라우팅: 맞장구·인사 같은 사소한 턴과 침묵 재촉은 LIGHT_MODEL_NAME, 실질적인 스캐폴딩 턴은 MODEL_NAME
+# (MODEL_ROUTING=0이면 모두 MODEL_NAME, NUDGE_LIGHT_MODEL=0이면 재촉도 MODEL_NAME)
+MODEL_ROUTER = ModelRouter(
+    MODEL_NAME, LIGHT_MODEL_NAME,
+    enabled=os.getenv('MODEL_ROUTING', '1') == '1',
+    light_nudges=os.getenv('NUDGE_LIGHT_MODEL', '1') == '1',
+    max_trivial_chars=int(os.getenv('MODEL_ROUTING_TRIVIAL_CHARS', 15)),
+    metrics=METRICS,
+)
+
+def choose_model(kind, conversation):
+    """이번 호출의 RoutingDecision(tier, model, reason). kind: 'response'(사용자 턴 포함 대화) / 'nudge'"""
+    return MODEL_ROUTER.route(kind, conversation)
+
+TokenUsage = namedtuple('TokenUsage', ['prompt_tokens', 'completion_tokens'])
+
+def _nudge_result(chat_completion, route, routing, prompt_version, context):
+    # 라우팅 결정과 티어별 지연/토큰은 실제로 생성한 시점에 반영 (사전 생성 결과를 꺼내 쓸 때는 다시 세지 않음)
+    usage = chat_completion.usage
+    scaffolding_type, response_text = parse_nudge_response(chat_completion.choices[0].message.content, route)
+    return NudgeResult(scaffolding_type, response_text, prompt_version, context['tokens_saved'],
+                       routing.model, routing.tier,
+                       getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
+
+def generate_nudge(student_id, conversation_id, conversation, route='nudge'):
+    """재촉 메시지를 생성해 NudgeResult를 반환합니다. (동기 라우트/사전 생성 공용)"""
+    messages_for_api, context = build_nudge_messages(conversation, conversation_id)
+    prompt_version = get_prompt_version()
+    routing = MODEL_ROUTER.route('nudge', conversation)
+    started = time.perf_counter()
+    chat_completion = CALL_POLICY.call(
+        route, student_id,
+        model=routing.model,
+        messages=messages_for_api,
+        response_format={"type": "json_object"}
+    )
+    MODEL_ROUTER.observe(routing, time.perf_counter() - started, chat_completion.usage)
+    return _nudge_result(chat_completion, route, routing, prompt_version, context)
+
+async def agenerate_nudge(student_id, conversation_id, conversation, route='nudge'):
+    """generate_nudge()의 비동기 버전 (ASGI 라우트용)"""
+    messages_for_api, context = build_nudge_messages(conversation, conversation_id)
+    prompt_version = get_prompt_version()
+    routing = MODEL_ROUTER.route('nudge', conversation)
+    started = time.perf_counter()
+    chat_completion = await CALL_POLICY.acall(
+        route, student_id,
+        model=routing.model,
+        messages=messages_for_api,
+        response_format={"type": "json_object"}
+    )
+    MODEL_ROUTER.observe(routing, time.perf_counter() - started, chat_completion.usage)
+    return _nudge_result(chat_completion, route, routing, prompt_version, context)
+
+# 🚩 서버 전체 LLM 작업 입장 제어: 동시 호출 수 제한 + 학생별 공정 대기열 + 사용자 메시지 우선 + 부하 차단(429)
+ADMISSION = AdmissionController(
+    os.getenv('ADMISSION_DB_PATH', os.path.join(LOGS_DIR, 'admission.db')),
+    max_concurrent=int(os.getenv('LLM_MAX_CONCURRENT', 12)),
+    max_queue=int(os.getenv('LLM_MAX_QUEUE', 60)),
+    queue_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT', 20)),
+    nudge_queue_timeout=float(os.getenv('LLM_NUDGE_QUEUE_TIMEOUT', 5)),
+    lease=float(os.getenv('LLM_ADMISSION_LEASE', 120)),
+    max_poll_interval=float(os.getenv('LLM_ADMISSION_MAX_POLL', 1.0)), # 대기열이 그대로일 때 순서를 다시 확인하는 최대 간격(초)
+    metrics=METRICS,
+)
+SERVER_BUSY_MESSAGE = "지금 질문하는 친구들이 많아서 잠시 기다려야 해. 조금 있다가 다시 보내 줘."
+
+# 🚩 침묵 재촉 메시지 사전 생성: 타이머 만료 전에 미리 만들어 두고, 대화 버전이 같을 때만 재사용
+NUDGE_PREFETCH_ENABLED = os.getenv('NUDGE_PREFETCH', '1') == '1'
+NUDGE_PREFETCH_WAIT = float(os.getenv('NUDGE_PREFETCH_WAIT', 10)) # 생성 중인 결과를 (대화 잠금을 잡기 전에) 기다릴 최대 시간(초)
+
+def generate_prefetched_nudge(student_id, conversation_id, conversation):
+    # 사전 생성도 입장 대기열을 거침 (우선순위 가장 낮음, 차단되면 사전 생성 실패로 기록되고 재촉 시점에 다시 생성)
+    with ADMISSION.ticket(student_id, 'prefetch'):
+        return generate_nudge(student_id, conversation_id, conversation, route='nudge_prefetch')
+
+NUDGE_PREFETCHER = NudgePrefetcher(
+    os.getenv('NUDGE_CACHE_DB_PATH', os.path.join(LOGS_DIR, 'nudge_cache.db')),
+    generate_prefetched_nudge,
+    max_workers=int(os.getenv('NUDGE_PREFETCH_WORKERS', 4)),
+)
+
+# 🚩 대화별 LLM 작업 직렬화 + 멱등 키 (중복 제출은 호출 하나를 공유, 사용자 메시지가 오면 재촉은 취소)
+SESSION_FLIGHT = SessionFlightControl(
+    os.getenv('SESSION_FLIGHT_DB_PATH', os.path.join(LOGS_DIR, 'session_flight.db')),
+    lease=float(os.getenv('SESSION_LOCK_LEASE', 120)),
+    wait_timeout=float(os.getenv('SESSION_WAIT_TIMEOUT', 60)),
+    result_ttl=float(os.getenv('SESSION_RESULT_TTL', 600)),
+)
+SESSION_BUSY_MESSAGE = "이전 메시지에 대한 답변을 아직 만들고 있어. 잠시 후 다시 보내 줘."
+
+def wait_for_prefetched_nudge(conversation_id):
+    """사전 생성이 진행 중이면 끝날 때까지 잠시 기다립니다. (대화 잠금을 잡기 전에 호출)"""
+    if NUDGE_PREFETCH_ENABLED:
+        NUDGE_PREFETCHER.wait_ready(conversation_id, NUDGE_PREFETCH_WAIT)
+
+async def await_prefetched_nudge(conversation_id):
+    """wait_for_prefetched_nudge()의 비동기 버전"""
+    if NUDGE_PREFETCH_ENABLED:
+        await NUDGE_PREFETCHER.await_ready(conversation_id, NUDGE_PREFETCH_WAIT)
+
+def take_prefetched_nudge(conversation_id, conversation):
+    """현재 대화 버전용으로 미리 만들어 둔 재촉 메시지 (없거나 아직 생성 중이면 None - 기다리지 않음)"""
+    if not NUDGE_PREFETCH_ENABLED:
+        return None
+    return NUDGE_PREFETCHER.take(conversation_id, len(conversation))
+
+
+# 🚩 대화 이벤트 저장소: 모든 로그 항목을 인덱스가 있는 SQLite 행으로 일괄 기록 (학생 다운로드 로그는 여기서 렌더링)
+# EVENT_DB_PATH를 마운트된 볼륨 경로로 지정하면 컨테이너 재시작 후에도 대화 기록이 유지됩니다.
+EVENT_STORE = ConversationEventStore(
+    os.getenv('EVENT_DB_PATH', os.path.join(LOGS_DIR, 'events.db')),
+    flush_interval=float(os.getenv('EVENT_FLUSH_INTERVAL', 0.5)),
+)
+
+# 🚩 TXT 대화 로그 파일은 백그라운드 기록 스레드가 배치로 기록 (log_analyzer.py 등 파일 기반 도구용, LOG_WRITE_TXT=0이면 생략)
+LOG_WRITE_TXT = os.getenv('LOG_WRITE_TXT', '1') == '1'
+LOG_WRITER = BufferedLogWriter(
+    flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', 0.5)),
+    fsync_policy=os.getenv('LOG_FSYNC', 'off'),
+    max_open_files=int(os.getenv('LOG_MAX_OPEN_FILES', 64)),
+    write_jsonl=os.getenv('LOG_WRITE_JSONL', '0') == '1',
+)
 
+# config_utils.py 내 log_conversation_entry 함수 확인
+def log_conversation_entry(speaker, text, log_filename, scaffolding_type=None, prompt_version=None,
+                           student_id=None, session_id=None, latency=None, usage=None, routing=None,
+                           context_tokens_saved=None, observe_routing=True):
+    """대화 항목을 이벤트 저장소와 TXT 로그 파일에 기록하도록 예약합니다. (실제 쓰기는 EVENT_STORE/LOG_WRITER 스레드)
+    prompt_version이 주어지면 AI 항목에 답변을 생성한 프롬프트 리비전을 함께 기록하고,
+    latency(초), usage(OpenAI 응답의 usage), routing(모델 라우팅 결정), context_tokens_saved(컨텍스트 잘라내기 절감 토큰)는
+    이벤트 저장소와 메트릭에만 기록합니다. (observe_routing=False: 티어별 메트릭은 생성 시점에 이미 반영됨)"""
+    now = datetime.datetime.now()
+    EVENT_STORE.record(
+        speaker, text, log_filename, now,
+        student_id=student_id, session_id=session_id,
+        scaffolding_type=scaffolding_type, prompt_version=prompt_version,
+        latency=latency, usage=usage,
+        model=routing.model if routing else None, model_tier=routing.tier if routing else None,
+        context_tokens_saved=context_tokens_saved,
+    )
+    if routing and observe_routing:
+        MODEL_ROUTER.observe(routing, latency, usage)
+    if not LOG_WRITE_TXT:
+        return
+
+    log_file_path = os.path.join(LOGS_DIR, log_filename)
+    log_entry = format_transcript_entry(speaker, text, now, scaffolding_type, prompt_version)
+
+    # 🚩 분석용 구조화 레코드 (LOG_WRITE_JSONL=1일 때 .txt 옆 .jsonl에 기록)
+    record = {
+        "timestamp": now.isoformat(timespec='seconds'),
+        "speaker": speaker,
+        "text": text,
+        "scaffolding_type": scaffolding_type,
+        "prompt_version": prompt_version,
+    }
+    LOG_WRITER.write(log_file_path, log_entry, record)
+
+def log_nudge_entry(nudge, log_filename, student_id, conversation_id, latency):
+    """재촉 메시지(NudgeResult) 로그. 모델/토큰은 생성한 호출의 값, latency는 학생이 기다린 시간입니다."""
+    usage = TokenUsage(nudge.prompt_tokens, nudge.completion_tokens) if nudge.prompt_tokens is not None else None
+    routing = RoutingDecision(nudge.model_tier, nudge.model, 'nudge') if nudge.model else None
+    log_conversation_entry('AI', nudge.response_text, log_filename, nudge.scaffolding_type, nudge.prompt_version,
+                           student_id=student_id, session_id=conversation_id, latency=latency, usage=usage,
+                           routing=routing, context_tokens_saved=nudge.context_tokens_saved, observe_routing=False)
+
+
+LOG_DOWNLOAD_GZIP = os.getenv('LOG_DOWNLOAD_GZIP', '1') == '1' # 🚩 클라이언트가 지원하면 로그 다운로드를 gzip으로 전송
+
+def flush_conversation_logs():
+    """예약된 로그 항목을 모두 이벤트 저장소와 파일에 기록합니다. (로그를 읽기 직전에 호출)"""
+    EVENT_STORE.flush()
+    LOG_WRITER.flush()
+
+def open_log_download(log_filename, count_filename, user_log_dir):
+    """학생 대화 로그 다운로드 객체를 만듭니다. 기록이 전혀 없으면 None.
+
+    이벤트 저장소에서 렌더링하고, 저장소 도입 전에 기록된 세션은 TXT 파일을 그대로 사용합니다.
+    """
+    flush_conversation_logs()
+    count_summary = format_scaffolding_counts(count_filename, user_log_dir)
+    transcript = EVENT_STORE.transcript_info(log_filename)
+    if transcript is not None:
+        return TranscriptDownload(EVENT_STORE, log_filename, count_summary, transcript)
+    log_path = os.path.join(LOGS_DIR, log_filename)
+    if os.path.exists(log_path):
+        return LogDownload(log_path, count_summary)
+    return None
+
+
+# 🚩 스캐폴딩 카운터: 메모리 증분 + 워커 공유 SQLite 원자적 upsert (주기적 반영, JSON 파일은 스냅샷)
+SCAFFOLDING_COUNTER = ScaffoldingCounter(
+    os.getenv('SCAFFOLDING_DB_PATH', os.path.join(LOGS_DIR, 'scaffolding_counts.db')),
+    VALID_SCAFFOLDING_TYPES + ["분류실패"],
+    flush_interval=float(os.getenv('SCAFFOLDING_FLUSH_INTERVAL', 2.0)),
+)
 
 def update_scaffolding_count(count_filename, user_log_dir, s_type): 
-    """스캐폴딩 유형별 횟수를 카운트하여 사용자 로그 폴더에 저장합니다. (portalocker 제거)"""
+    """스캐폴딩 유형별 횟수를 카운트합니다. (요청 스레드에서는 메모리 증분만, 반영은 SCAFFOLDING_COUNTER 스레드)"""
     
     count_file_path = os.path.join(user_log_dir, count_filename) 
     
-    valid_types = ["개념적 스캐폴딩", "전략적 스캐폴딩", "메타인지적 스캐폴딩", "동기적 스캐폴딩", "일반"]
+    valid_types = VALID_SCAFFOLDING_TYPES
     if s_type not in valid_types:
         s_type = "분류실패"
         
     try:
-        if not os.path.exists(user_log_dir):
-            os.makedirs(user_log_dir, exist_ok=True)
-            
-        if os.path.exists(count_file_path):
-            # 🚩 수정: portalocker 제거 후 표준 파일 읽기/쓰기 로직 복구
-            with open(count_file_path, 'r', encoding='utf-8') as f:
-                counts = json.load(f)
-        else:
-            counts = {t: 0 for t in valid_types + ["분류실패"]}
-
-        counts[s_type] = counts.get(s_type, 0) + 1
-        
-        # 🚩 수정: 덮어쓰기 모드 'w' 사용
-        with open(count_file_path, 'w', encoding='utf-8') as f:
-            json.dump(counts, f, ensure_ascii=False, indent=4)
-            
+        SCAFFOLDING_COUNTER.increment(count_file_path, s_type)
     except Exception as e:
-        print(f"🚨🚨 CRITICAL COUNT WRITE FAIL: 카운트 파일 저장 실패: {count_file_path} ({e})")
+        print(f"🚨🚨 CRITICAL COUNT WRITE FAIL: 카운트 저장 실패: {count_file_path} ({e})")
+
+def get_class_scaffolding_totals():
+    """반 전체 스캐폴딩 유형별 합계 및 학생별 카운트를 반환합니다. (학생 폴더를 스캔하지 않음)"""
+    SCAFFOLDING_COUNTER.flush()
+    return SCAFFOLDING_COUNTER.get_class_totals()
 
 # ----------------------------------------------------
 # 🚩 Tool 함수 정의 (Tool-Calling 제거됨)
@@ -222,15 +581,19 @@ def update_scaffolding_count(count_filename, user_log_dir, s_type):
 # (이전 Tool 함수 정의는 삭제되었습니다.)
 
 def format_scaffolding_counts(count_filename, user_log_dir):
-    """스캐폴딩 카운트 JSON 파일을 읽어 텍스트 형식으로 포맷합니다."""
+    """스캐폴딩 카운트(공유 카운터, 없으면 JSON 파일)를 읽어 텍스트 형식으로 포맷합니다."""
     count_file_path = os.path.join(user_log_dir, count_filename) 
     
     try:
-        if not os.path.exists(count_file_path):
-            return "\n\n--- 스캐폴딩 카운트 정보 --- \n카운트 파일을 찾을 수 없습니다."
+        counts = SCAFFOLDING_COUNTER.get_counts(count_file_path)
+
+        if counts is None:
+            # 카운터 도입 이전에 기록된 JSON 파일 호환
+            if not os.path.exists(count_file_path):
+                return "\n\n--- 스캐폴딩 카운트 정보 --- \n카운트 파일을 찾을 수 없습니다."
 
-        with open(count_file_path, 'r', encoding='utf-8') as f:
-            counts = json.load(f)
+            with open(count_file_path, 'r', encoding='utf-8') as f:
+                counts = json.load(f)
             
         formatted_text = "\n\n==================================================\n"
         formatted_text += "--- 📊 AI 스캐폴딩 유형별 최종 카운트 결과 ---\n"
@@ -0,0 +1,215 @@
+# context_manager.py
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 🚩 토큰 예산 기반 컨텍스트 관리 (오래된 메시지 롤링 요약)
+# 시스템 프롬프트와 최근 N개 메시지는 그대로 보내고, 예산을 넘는 경우에만 오래된 메시지를 접어 입력 토큰을 줄입니다.
+#   - 접힌 앞부분은 summarizer(가벼운 모델)가 만든 롤링 요약으로 대체: 기존 요약 + 새로 접힌 메시지만 넘겨 증분 갱신
+#   - 요약은 요청 경로를 막지 않도록 백그라운드 스레드에서 만들고, 요약된 앞부분(메시지 수 + 내용 digest)별로 캐시
+#   - 아직 요약에 들어가지 않은 접힌 메시지는 메시지당 한 줄(앞부분 excerpt_line_chars자) 발췌로 보냄
+# summarizer가 없으면(CONTEXT_SUMMARY=0) 발췌만 사용합니다. 캐시는 워커(프로세스)별입니다.
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role/구분자 등 메시지당 고정 비용 (대략값)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def estimate_tokens(text):
+    """로컬 토큰 추정치: 한글 등 비ASCII 문자는 약 1토큰, ASCII는 약 4글자당 1토큰으로 계산합니다."""
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    ascii_chars = len(text) - non_ascii
+    return non_ascii + (ascii_chars + 3) // 4
+
+
+def estimate_message_tokens(messages):
+    return sum(estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _digest(messages):
+    """요약된 앞부분 식별용 digest (대화가 중간에 바뀌었으면 캐시된 요약을 쓰지 않음)"""
+    h = hashlib.sha1()
+    for m in messages:
+        h.update(f"{m.get('role')}\x00{m.get('content', '')}\x01".encode('utf-8'))
+    return h.hexdigest()
+
+
+class ContextWindowManager:
+    """메시지 리스트를 토큰 예산 안으로 맞춥니다.
+
+    summarizer(이전 요약 또는 None, 새로 접힌 메시지 리스트) -> 요약 문자열
+    요약과 발췌 줄은 cache_key(대화 ID)별로 캐시합니다. 요약은 접힌 메시지가 summary_min_messages개 이상
+    새로 쌓였을 때만 백그라운드에서 갱신하고, 갱신이 끝나기 전에는 기존 요약 + 발췌 줄로 보냅니다.
+    """
+
+    def __init__(self, token_budget, keep_last_messages, excerpt_line_chars=120, max_cached=1000,
+                 summarizer=None, summary_min_messages=4, summary_workers=2):
+        self.token_budget = token_budget
+        self.keep_last_messages = keep_last_messages
+        self.excerpt_line_chars = excerpt_line_chars
+        self.max_cached = max_cached
+        self.summarizer = summarizer
+        self.summary_min_messages = summary_min_messages
+        self.summary_workers = summary_workers
+        self.stats = {'summaries': 0, 'summary_failures': 0}
+        self._line_cache = OrderedDict()  # cache_key -> 발췌 줄 리스트 (conversation 앞부분과 1:1)
+        self._summaries = OrderedDict()   # cache_key -> (요약된 메시지 수, 그 앞부분 digest, 요약)
+        self._pending = {}                # cache_key -> 진행 중인 요약 Future
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def _truncate_message(self, message):
+        speaker = "사용자" if message.get("role") == "user" else "AI"
+        text = _WHITESPACE.sub(" ", message.get("content", "")).strip()
+        if len(text) > self.excerpt_line_chars:
+            text = text[:self.excerpt_line_chars] + "…"
+        return f"- {speaker}: {text}"
+
+    def _remember(self, cache, cache_key, value):
+        # self._lock 안에서 호출
+        cache[cache_key] = value
+        cache.move_to_end(cache_key)
+        while len(cache) > self.max_cached:
+            cache.popitem(last=False)
+
+    def _excerpt_lines(self, conversation, upto, cache_key):
+        if cache_key is None:
+            return [self._truncate_message(m) for m in conversation[:upto]]
+
+        with self._lock:
+            lines = self._line_cache.get(cache_key, [])
+            if cache_key in self._line_cache:
+                self._line_cache.move_to_end(cache_key)
+
+        # 캐시보다 뒤의 부분만 새로 잘라냄 (대화는 뒤에만 추가되므로 앞부분은 재사용 가능)
+        if len(lines) < upto:
+            lines = lines + [self._truncate_message(m) for m in conversation[len(lines):upto]]
+            with self._lock:
+                self._remember(self._line_cache, cache_key, lines)
+        return lines[:upto]
+
+    # --- 롤링 요약 ---
+    def _cached_summary(self, conversation, fold_upto, cache_key):
+        """지금 쓸 수 있는 요약 → (요약된 메시지 수, 요약). 없으면 (0, None)"""
+        if cache_key is None:
+            return 0, None
+        with self._lock:
+            entry = self._summaries.get(cache_key)
+        if entry is None:
+            return 0, None
+        upto, digest, summary = entry
+        if upto > fold_upto or _digest(conversation[:upto]) != digest:
+            return 0, None
+        return upto, summary
+
+    def _get_executor(self):
+        # fork 이후(gunicorn preload) 워커마다 요약 스레드 풀을 새로 만듦
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.summary_workers, thread_name_prefix='context-summary')
+                    self._executor_pid = os.getpid()
+                    self._pending = {}
+        return self._executor
+
+    def _schedule_summary(self, cache_key, folded, upto, summary):
+        executor = self._get_executor()
+        with self._lock:
+            if cache_key in self._pending:
+                return
+            self._pending[cache_key] = executor.submit(self._summarize, cache_key, folded, upto, summary)
+
+    def _summarize(self, cache_key, folded, upto, summary):
+        try:
+            summary = self.summarizer(summary, folded[upto:])
+        except Exception as e:
+            self.stats['summary_failures'] += 1
+            print(f"🚨 WARNING: 이전 대화 요약 실패 ({str(cache_key)[:8]}), 발췌로 대체합니다: {e}")
+            with self._lock:
+                self._pending.pop(cache_key, None)
+            return
+        self.stats['summaries'] += 1
+        entry = (len(folded), _digest(folded), summary)
+        with self._lock:
+            current = self._summaries.get(cache_key)
+            if current is None or current[0] <= len(folded):
+                self._remember(self._summaries, cache_key, entry)
+            self._pending.pop(cache_key, None)
+
+    def fit(self, prefix_messages, conversation, cache_key=None):
+        """(API용 메시지 리스트, 통계 dict)를 반환합니다.
+
+        prefix_messages: 항상 그대로 보내는 시스템/지시 메시지
+        conversation: 시간순 대화 이력 (마지막이 최신)
+        요약/발췌 메시지는 prefix 앞쪽의 시스템 메시지 바로 뒤에 넣으므로, 재촉 지시처럼 그 뒤에 오는 지시 메시지는
+        계속 대화 이력 바로 앞에 위치합니다.
+        """
+        prefix_tokens = estimate_message_tokens(prefix_messages)
+        original_tokens = prefix_tokens + estimate_message_tokens(conversation)
+        stats = {
+            "original_tokens": original_tokens,
+            "sent_tokens": original_tokens,
+            "tokens_saved": 0,
+            "truncated_messages": 0,
+            "summarized_messages": 0,
+        }
+
+        fold_upto = len(conversation) - self.keep_last_messages
+        if original_tokens <= self.token_budget or fold_upto <= 0:
+            return list(prefix_messages) + list(conversation), stats
+
+        recent = conversation[fold_upto:]
+        summarized, summary = self._cached_summary(conversation, fold_upto, cache_key)
+        if self.summarizer is not None and cache_key is not None and fold_upto - summarized >= self.summary_min_messages:
+            self._schedule_summary(cache_key, list(conversation[:fold_upto]), summarized, summary)
+        lines = self._excerpt_lines(conversation, fold_upto, cache_key)[summarized:]
+
+        remaining = self.token_budget - prefix_tokens - estimate_message_tokens(recent) - MESSAGE_OVERHEAD_TOKENS
+        sections = []
+        if summary:
+            section = "# 이전 대화 요약\n" + summary
+            if estimate_tokens(section) + 1 <= remaining:
+                sections.append(section)
+                remaining -= estimate_tokens(section) + 1
+            else:
+                summarized = 0
+
+        # 요약 이후의 접힌 메시지는 발췌 - 예산을 넘으면 가장 오래된 줄부터 제외
+        kept_lines = []
+        for line in reversed(lines):
+            line_tokens = estimate_tokens(line) + 1
+            if line_tokens > remaining:
+                break
+            kept_lines.append(line)
+            remaining -= line_tokens
+        kept_lines.reverse()
+        if kept_lines:
+            omitted = len(lines) - len(kept_lines)
+            header = "# 이전 대화 발췌 (오래된 메시지는 앞부분만 잘라 포함됨)"
+            if omitted:
+                header += f"\n(더 이전의 대화 {omitted}건은 생략됨)"
+            sections.append(header + "\n" + "\n".join(kept_lines))
+
+        split = 0
+        while split < len(prefix_messages) and prefix_messages[split].get("role") == "system":
+            split += 1
+        messages = list(prefix_messages[:split])
+        if sections:
+            messages.append({"role": "system", "content": "\n\n".join(sections)})
+        messages += prefix_messages[split:]
+        messages += recent
+
+        sent_tokens = estimate_message_tokens(messages)
+        stats.update({
+            "sent_tokens": sent_tokens,
+            "tokens_saved": max(original_tokens - sent_tokens, 0),
+            "truncated_messages": fold_upto,
+            "summarized_messages": summarized,
+        })
+        return messages, stats
@@ -0,0 +1,159 @@
+# conversation_store.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# 🚩 대화 이력 서버 저장소
+# Flask 서명 쿠키(session['conversation'])에 전체 대화를 싣지 않고, 세션 ID로 서버에서 조회합니다.
+# 메시지마다 1부터 증가하는 seq가 있어, 채팅 화면은 page()로 seq 커서 기준의 일부만 가져갑니다.
+#   - memory : 단일 프로세스용 LRU 저장소 (최대 세션 수 초과 시 가장 오래 사용되지 않은 세션부터 제거)
+#   - sqlite : 여러 gunicorn 워커가 공유하는 WAL 모드 SQLite 파일
+
+
+class MemoryConversationStore:
+    """프로세스 내 LRU 대화 저장소"""
+
+    def __init__(self, max_sessions=1000):
+        self.max_sessions = max_sessions
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            conversation = self._data.get(session_id)
+            if conversation is None:
+                return []
+            self._data.move_to_end(session_id)
+            return list(conversation)
+
+    def append(self, session_id, *messages):
+        """메시지를 추가하고 마지막 메시지의 seq를 반환합니다."""
+        with self._lock:
+            conversation = self._data.setdefault(session_id, [])
+            conversation.extend(dict(m) for m in messages)
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+            return len(conversation)
+
+    def page(self, session_id, after=None, before=None, limit=50):
+        """seq 커서 기준 메시지 한 페이지 (seq 오름차순)와 이어지는 메시지가 더 있는지 여부
+
+        after: 이 seq 이후의 메시지 (앞에서부터 limit개, has_more = 더 최근 메시지가 남음)
+        before(또는 커서 없음): 이 seq 이전(없으면 전체)의 마지막 limit개 (has_more = 더 이전 메시지가 남음)
+        """
+        with self._lock:
+            conversation = list(self._data.get(session_id, ()))
+        numbered = [dict(m, seq=i + 1) for i, m in enumerate(conversation)]
+        if after is not None:
+            rest = numbered[after:]
+            return rest[:limit], len(rest) > limit
+        end = len(numbered) if before is None else max(min(before - 1, len(numbered)), 0)
+        start = max(end - limit, 0)
+        return numbered[start:end], start > 0
+
+    def delete(self, session_id):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+
+class SQLiteConversationStore:
+    """SQLite 대화 저장소 (메시지 1건 = 1행, 추가 시 기존 이력을 다시 쓰지 않음)"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS conversation_messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+        """)
+
+    def _connect(self):
+        # 스레드마다 별도 커넥션 사용 (gunicorn --threads 환경)
+        # fork 이후(gunicorn 워커)에는 부모 프로세스의 커넥션을 재사용하지 않음
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, session_id):
+        rows = self._connect().execute(
+            "SELECT role, content FROM conversation_messages WHERE session_id = ? ORDER BY seq",
+            (session_id,)
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def append(self, session_id, *messages):
+        """메시지를 추가하고 마지막 메시지의 seq를 반환합니다."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (last_seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM conversation_messages WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            conn.executemany(
+                "INSERT INTO conversation_messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(session_id, last_seq + i + 1, m["role"], m["content"], now) for i, m in enumerate(messages)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return last_seq + len(messages)
+
+    def page(self, session_id, after=None, before=None, limit=50):
+        """seq 커서 기준 메시지 한 페이지 (MemoryConversationStore.page와 동일, 기본 키 (session_id, seq) 범위 조회)"""
+        conn = self._connect()
+        if after is not None:
+            rows = conn.execute(
+                """SELECT seq, role, content FROM conversation_messages
+                   WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?""",
+                (session_id, after, limit + 1)
+            ).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = conn.execute(
+                """SELECT seq, role, content FROM conversation_messages
+                   WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?""",
+                (session_id, before if before is not None else 2 ** 62, limit + 1)
+            ).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit][::-1]
+        return [{"role": role, "content": content, "seq": seq} for seq, role, content in rows], has_more
+
+    def delete(self, session_id):
+        self._connect().execute("DELETE FROM conversation_messages WHERE session_id = ?", (session_id,))
+
+
+def create_conversation_store(logs_dir):
+    """환경 변수 CONVERSATION_STORE(memory|sqlite)에 따라 저장소를 생성합니다. 기본값은 다중 워커용 sqlite."""
+    backend = os.getenv('CONVERSATION_STORE', 'sqlite').lower()
+
+    if backend == 'memory':
+        max_sessions = int(os.getenv('CONVERSATION_STORE_MAX_SESSIONS', 1000))
+        print(f"INFO: 메모리 대화 저장소 사용 (최대 {max_sessions}개 세션)")
+        return MemoryConversationStore(max_sessions=max_sessions)
+
+    db_path = os.getenv('CONVERSATION_DB_PATH', os.path.join(logs_dir, 'conversations.db'))
+    print(f"INFO: SQLite 대화 저장소 사용 ({db_path})")
+    return SQLiteConversationStore(db_path)
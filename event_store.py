@@ -0,0 +1,293 @@
+# event_store.py
+
+import os
+import atexit
+import sqlite3
+import hashlib
+import datetime
+import threading
+from itertools import groupby
+
+# 🚩 대화 이벤트 저장소 (WAL 모드 SQLite)
+# log_conversation_entry로 기록되는 모든 항목을 행 하나로 저장합니다.
+# (학생, 세션, 화자, 스캐폴딩 유형, 시각, 프롬프트 버전, 응답 지연, 토큰 수, 모델/티어, 컨텍스트 잘라내기로 줄인 입력 토큰 수)
+# 요청 스레드는 메모리 버퍼에 추가만 하고, 반영 스레드가 flush_interval마다 한 트랜잭션으로 일괄 INSERT 합니다.
+# 학생이 내려받는 TXT 대화 로그는 이 테이블에서 렌더링한 뷰이므로, DB 파일을 볼륨에 두면 재시작 후에도 남습니다.
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+AI_SEPARATOR = '----------------------------------------'
+
+_COLUMNS = ('created_at', 'student_id', 'session_id', 'log_name', 'speaker', 'text',
+            'scaffolding_type', 'prompt_version', 'latency_ms', 'prompt_tokens', 'completion_tokens',
+            'model', 'model_tier', 'context_tokens_saved')
+
+
+def format_transcript_entry(speaker, text, timestamp, scaffolding_type=None, prompt_version=None):
+    """TXT 대화 로그 한 항목 (log_analyzer.py가 파싱하는 형식)"""
+    now_str = timestamp.strftime(TIME_FORMAT)
+    if speaker == 'User':
+        return f"[{now_str}] 사용자: {text}\n\n"
+    label = f" ({scaffolding_type})" if scaffolding_type else ""
+    if prompt_version:
+        label += f" [prompt:{prompt_version}]"
+    return f"[{now_str}] AI{label}: {text}\n{AI_SEPARATOR}\n\n"
+
+
+class ConversationEventStore:
+    """대화 이벤트 테이블 (행 하나 = 로그 항목 하나, log_name = 로그인 세션별 TXT 로그의 상대 경로)"""
+
+    def __init__(self, db_path, flush_interval=0.5):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS conversation_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                student_id TEXT,
+                session_id TEXT,
+                log_name TEXT NOT NULL,
+                speaker TEXT NOT NULL,
+                text TEXT NOT NULL,
+                scaffolding_type TEXT,
+                prompt_version TEXT,
+                latency_ms INTEGER,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                model TEXT,
+                model_tier TEXT,
+                context_tokens_saved INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_student ON conversation_events (student_id, created_at);
+            CREATE INDEX IF NOT EXISTS idx_events_time ON conversation_events (created_at);
+            CREATE INDEX IF NOT EXISTS idx_events_type ON conversation_events (scaffolding_type, created_at);
+            CREATE INDEX IF NOT EXISTS idx_events_log ON conversation_events (log_name, created_at);
+        """)
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_thread(self):
+        # fork 이후 워커마다 반영 스레드를 새로 시작
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pending = []
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='event-store', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"🚨🚨 CRITICAL LOG WRITE FAIL: 대화 이벤트 저장 실패 ({e})")
+
+    # --- 요청 스레드 쪽 API ---
+    def record(self, speaker, text, log_name, timestamp, student_id=None, session_id=None,
+               scaffolding_type=None, prompt_version=None, latency=None, usage=None, model=None, model_tier=None,
+               context_tokens_saved=None):
+        """이벤트 한 건을 버퍼에 추가합니다. (DB I/O 없음) usage는 OpenAI 응답의 usage 객체"""
+        self._ensure_thread()
+        row = (
+            timestamp.timestamp(), student_id, session_id, log_name, speaker, text,
+            scaffolding_type, prompt_version,
+            round(latency * 1000) if latency is not None else None,
+            getattr(usage, 'prompt_tokens', None),
+            getattr(usage, 'completion_tokens', None),
+            model, model_tier, context_tokens_saved,
+        )
+        with self._lock:
+            self._pending.append(row)
+
+    def flush(self):
+        """버퍼의 이벤트를 한 트랜잭션으로 기록합니다."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    f"INSERT INTO conversation_events ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    pending
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                # 기록 실패 시 버퍼 앞쪽에 되돌려 다음 주기에 재시도
+                with self._lock:
+                    self._pending[:0] = pending
+                raise
+
+    # --- 조회 ---
+    def _iter_transcript_rows(self, log_name, upto_id=None, batch_size=500):
+        """세션의 이벤트 행을 기록 순서대로 batch_size개씩 읽어 생성합니다.
+
+        커서를 yield 사이에 들고 있지 않으므로(키셋 페이지) 스트리밍 응답이 조각마다 다른 스레드에서 순회해도 됩니다.
+        upto_id가 주어지면 그 id까지만 (전송 도중 새로 기록된 항목 제외)
+        """
+        after = (-1.0, 0)
+        bound = "" if upto_id is None else " AND id <= ?"
+        while True:
+            rows = self._connect().execute(
+                f"""SELECT id, created_at, speaker, text, scaffolding_type, prompt_version FROM conversation_events
+                   WHERE log_name = ? AND (created_at, id) > (?, ?){bound} ORDER BY created_at, id LIMIT ?""",
+                (log_name, *after) + ((upto_id,) if upto_id is not None else ()) + (batch_size,)
+            ).fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1][1], rows[-1][0])
+
+    def transcript_info(self, log_name):
+        """TXT 대화 로그를 한 번 훑어 (마지막 id, 마지막 기록 시각, UTF-8 바이트 수, 내용 sha1)을 반환합니다.
+        기록이 없으면 None. 렌더링한 내용은 메모리에 모으지 않습니다."""
+        (last_id,) = self._connect().execute(
+            "SELECT MAX(id) FROM conversation_events WHERE log_name = ?", (log_name,)
+        ).fetchone()
+        if last_id is None:
+            return None
+        digest = hashlib.sha1()
+        length = 0
+        updated_at = None
+        for row in self._iter_transcript_rows(log_name, last_id):
+            data = _render_row(row[1:]).encode('utf-8')
+            digest.update(data)
+            length += len(data)
+            updated_at = row[1]
+        return last_id, updated_at, length, digest.hexdigest()
+
+    def iter_transcript(self, log_name, upto_id=None):
+        """TXT 대화 로그 항목(문자열)을 기록 순서대로 생성합니다. (다운로드 스트리밍용)"""
+        for row in self._iter_transcript_rows(log_name, upto_id):
+            yield _render_row(row[1:])
+
+    def iter_transcripts(self):
+        """모든 세션의 (log_name, TXT 대화 로그)를 log_name 순서로 생성합니다. (반 전체 zip용)"""
+        cursor = self._connect().execute(
+            """SELECT log_name, created_at, speaker, text, scaffolding_type, prompt_version FROM conversation_events
+               ORDER BY log_name, created_at, id"""
+        )
+        for log_name, rows in groupby(cursor, key=lambda row: row[0]):
+            yield log_name, "".join(_render_row(row[1:]) for row in rows)
+
+    def query(self, student_id=None, scaffolding_type=None, speaker=None, since=None, until=None, limit=500):
+        """조건에 맞는 이벤트를 최신순으로 반환합니다. since/until은 epoch 초."""
+        where, params = _where(student_id=student_id, scaffolding_type=scaffolding_type, speaker=speaker,
+                               since=since, until=until)
+        rows = self._connect().execute(
+            f"SELECT id, {', '.join(_COLUMNS)} FROM conversation_events{where} ORDER BY created_at DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(zip(('id',) + _COLUMNS, row)) for row in rows]
+
+    def summarize(self, since=None, until=None):
+        """기간 내 스캐폴딩 유형별 합계, 학생별 턴 수/유형별 수/평균 응답 지연/토큰(잘라내기로 줄인 토큰 포함), 모델 티어별 AI 답변 집계"""
+        where, params = _where(since=since, until=until)
+        conn = self._connect()
+        totals = {}
+        students = {}
+        for student_id, speaker, s_type, count in conn.execute(
+            f"""SELECT student_id, speaker, scaffolding_type, COUNT(*) FROM conversation_events{where}
+                GROUP BY student_id, speaker, scaffolding_type""",
+            params
+        ):
+            student = students.setdefault(student_id, {
+                'user_turns': 0, 'ai_turns': 0, 'scaffolding': {},
+                'avg_latency_ms': None, 'prompt_tokens': 0, 'completion_tokens': 0, 'context_tokens_saved': 0,
+            })
+            if speaker == 'User':
+                student['user_turns'] += count
+            elif speaker == 'AI':
+                student['ai_turns'] += count
+                if s_type:
+                    student['scaffolding'][s_type] = count
+                    totals[s_type] = totals.get(s_type, 0) + count
+        for student_id, avg_latency, prompt_tokens, completion_tokens, tokens_saved in conn.execute(
+            f"""SELECT student_id, AVG(latency_ms), SUM(prompt_tokens), SUM(completion_tokens), SUM(context_tokens_saved)
+                FROM conversation_events{where} GROUP BY student_id""",
+            params
+        ):
+            student = students[student_id]
+            student['avg_latency_ms'] = round(avg_latency) if avg_latency is not None else None
+            student['prompt_tokens'] = prompt_tokens or 0
+            student['completion_tokens'] = completion_tokens or 0
+            student['context_tokens_saved'] = tokens_saved or 0
+        return {'totals': totals, 'students': students, 'models': self._summarize_models(conn, where, params)}
+
+    def _summarize_models(self, conn, where, params):
+        # 티어별 스캐폴딩 유형 분포가 기본 모델과 달라지지 않는지 확인하기 위한 집계 (라우팅 이전 기록은 tier=None)
+        where = (where + " AND" if where else " WHERE") + " speaker = 'AI'"
+        models = {}
+        for tier, model, s_type, count in conn.execute(
+            f"""SELECT model_tier, model, scaffolding_type, COUNT(*) FROM conversation_events{where}
+                GROUP BY model_tier, model, scaffolding_type""",
+            params
+        ):
+            entry = models.setdefault(_model_key(tier, model), {
+                'tier': tier, 'model': model, 'ai_turns': 0, 'scaffolding': {},
+                'avg_latency_ms': None, 'prompt_tokens': 0, 'completion_tokens': 0,
+            })
+            entry['ai_turns'] += count
+            if s_type:
+                entry['scaffolding'][s_type] = count
+        for tier, model, avg_latency, prompt_tokens, completion_tokens in conn.execute(
+            f"""SELECT model_tier, model, AVG(latency_ms), SUM(prompt_tokens), SUM(completion_tokens)
+                FROM conversation_events{where} GROUP BY model_tier, model""",
+            params
+        ):
+            entry = models[_model_key(tier, model)]
+            entry['avg_latency_ms'] = round(avg_latency) if avg_latency is not None else None
+            entry['prompt_tokens'] = prompt_tokens or 0
+            entry['completion_tokens'] = completion_tokens or 0
+        return models
+
+
+def _model_key(tier, model):
+    # 템플릿 인사말·라우팅 도입 이전 기록은 model이 비어 있음
+    return f"{tier}:{model}" if model else 'unrouted'
+
+
+def _render_row(row):
+    created_at, speaker, text, scaffolding_type, prompt_version = row
+    return format_transcript_entry(speaker, text, datetime.datetime.fromtimestamp(created_at), scaffolding_type, prompt_version)
+
+
+def _where(student_id=None, scaffolding_type=None, speaker=None, since=None, until=None):
+    clauses, params = [], []
+    for column, value in (('student_id', student_id), ('scaffolding_type', scaffolding_type), ('speaker', speaker)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(until)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
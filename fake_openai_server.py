@@ -0,0 +1,210 @@
+# fake_openai_server.py
+#
+# 🚩 부하 테스트용 로컬 OpenAI 호환 chat.completions 서버 (실제 API 키/비용 없이 측정)
+#   python fake_openai_server.py --port 8787 --latency-median 1.5 --latency-sigma 0.5 --rpm-per-key 60
+#   OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_KEY_1=fake-1 ... gunicorn app:app
+#
+# - 지연 시간: 로그정규분포(중앙값/시그마), 스트리밍이면 첫 조각까지 --ttft-fraction 비율, 나머지는 조각마다 나눠서 전송
+# - 429 주입: 키(Authorization)별 분당 요청 한도(--rpm-per-key) 초과 시 + 무작위 확률(--rate-limit-rate)
+# - 500 주입(--error-rate), 잘못된 JSON 본문 주입(--malformed-rate)
+# - GET /stats : 지금까지의 요청/오류 수, GET /v1/models : 키 확인용 모델 목록
+
+import json
+import time
+import math
+import random
+import argparse
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCAFFOLDING_TYPES = ["개념적 스캐폴딩", "전략적 스캐폴딩", "메타인지적 스캐폴딩", "동기적 스캐폴딩", "일반"]
+SAMPLE_SENTENCES = [
+    "좋은 질문이야. 지금 설계하려는 활동의 학습 목표부터 다시 정리해 볼까?",
+    "학습자가 그 도구를 쓰면서 어떤 사고 과정을 거치게 될지 한번 떠올려 봐.",
+    "지금까지 생각한 내용을 단계별로 나눠 보면 어디가 가장 막히는 것 같아?",
+    "그 활동에서 학습자가 스스로 점검할 수 있는 장치가 있으면 더 좋겠어.",
+    "잘하고 있어! 조금만 더 구체적으로 예시를 들어 볼 수 있을까?",
+]
+
+
+class FakeOpenAIState:
+    def __init__(self, args):
+        self.args = args
+        self.stats = Counter()
+        self._windows = {}  # api_key -> 최근 1분 요청 시각
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        return random.lognormvariate(math.log(self.args.latency_median), self.args.latency_sigma)
+
+    def check_rate_limit(self, api_key):
+        """키별 분당 요청 한도를 넘으면 Retry-After 초를 반환합니다."""
+        if random.random() < self.args.rate_limit_rate:
+            return 1
+        if not self.args.rpm_per_key:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault(api_key, deque())
+            while window and now - window[0] > 60:
+                window.popleft()
+            if len(window) >= self.args.rpm_per_key:
+                return max(int(60 - (now - window[0])) + 1, 1)
+            window.append(now)
+        return None
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def build_content(state, messages):
+    if random.random() < state.args.malformed_rate:
+        state.count('malformed')
+        return '{"scaffolding_type": "일반", "response_text": "잘린 응답'
+    sentences = random.sample(SAMPLE_SENTENCES, k=random.randint(1, 3))
+    body = {"scaffolding_type": random.choice(SCAFFOLDING_TYPES), "response_text": " ".join(sentences)}
+    return json.dumps(body, ensure_ascii=False)
+
+
+def estimate_prompt_tokens(messages):
+    return sum(len(m.get("content") or "") for m in messages) // 2 + 4 * len(messages)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None  # main()에서 설정
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 stderr 로그를 남기지 않음
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, dict(self.state.stats))
+        elif self.path.rstrip('/').endswith('/models'):
+            # python app.py --check 의 키 확인용
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'gpt-4o', 'object': 'model', 'created': 0, 'owned_by': 'fake'}]})
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        state = self.state
+        state.count('requests')
+        api_key = self.headers.get('Authorization', '').removeprefix('Bearer ')
+
+        retry_after = state.check_rate_limit(api_key)
+        if retry_after is not None:
+            state.count('rate_limited')
+            self._send_json(429, {'error': {'message': 'Rate limit reached (fake)', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                            headers={'Retry-After': str(retry_after)})
+            return
+        if random.random() < state.args.error_rate:
+            state.count('server_error')
+            time.sleep(min(state.sample_latency(), 1.0))
+            self._send_json(500, {'error': {'message': 'Internal server error (fake)', 'type': 'server_error'}})
+            return
+
+        messages = request.get('messages', [])
+        content = build_content(state, messages)
+        prompt_tokens = estimate_prompt_tokens(messages)
+        completion_tokens = max(len(content) // 2, 1)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens}
+        latency = state.sample_latency()
+        completion_id = f"chatcmpl-fake{random.getrandbits(48):x}"
+        created = int(time.time())
+        model = request.get('model', 'gpt-4o')
+
+        if not request.get('stream'):
+            time.sleep(latency)
+            state.count('completed')
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+            return
+
+        # 스트리밍: 첫 조각까지 ttft, 나머지 지연은 조각 사이에 고르게 분배
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        pieces = [content[i:i + state.args.chunk_chars] for i in range(0, len(content), state.args.chunk_chars)]
+        time.sleep(latency * state.args.ttft_fraction)
+        interval = latency * (1 - state.args.ttft_fraction) / max(len(pieces), 1)
+        try:
+            for index, piece in enumerate(pieces):
+                delta = {'content': piece} if index else {'role': 'assistant', 'content': piece}
+                self._write_event({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                                   'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+                time.sleep(interval)
+            self._write_event({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                               'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+            if (request.get('stream_options') or {}).get('include_usage'):
+                self._write_event({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                                   'choices': [], 'usage': usage})
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+            state.count('completed')
+        except (BrokenPipeError, ConnectionResetError):
+            state.count('client_disconnected')
+
+    def _write_event(self, payload):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='부하 테스트용 가짜 OpenAI chat.completions 서버')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency-median', type=float, default=1.5, help='응답 지연 중앙값(초, 로그정규분포)')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='로그정규분포 시그마 (클수록 꼬리 지연이 김)')
+    parser.add_argument('--ttft-fraction', type=float, default=0.3, help='스트리밍 시 전체 지연 중 첫 조각까지의 비율')
+    parser.add_argument('--chunk-chars', type=int, default=6, help='스트리밍 조각당 글자 수')
+    parser.add_argument('--rpm-per-key', type=int, default=0, help='키별 분당 요청 한도 (0이면 없음)')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='무작위 429 비율')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='무작위 500 비율')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='잘못된 JSON 본문 비율')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    Handler.state = FakeOpenAIState(args)
+    ThreadingHTTPServer.request_queue_size = 256  # 반 전체가 동시에 연결해도 거절되지 않도록
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"INFO: 가짜 OpenAI 서버 시작 - http://{args.host}:{args.port}/v1 (지연 중앙값 {args.latency_median}s, σ={args.latency_sigma})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+# gunicorn.conf.py
+#
+# 🚩 preload 기동: 마스터 프로세스가 app(→ config_utils)을 한 번만 임포트해 프롬프트·카탈로그 인덱스·사용자 명단을
+# 구성하고, 워커는 fork 시 이를 copy-on-write로 공유합니다. (워커마다 같은 파일을 다시 읽고 파싱하지 않음)
+# OpenAI 클라이언트, HTTP 연결 풀, 백그라운드 스레드, SQLite 커넥션은 각 워커에서 처음 사용할 때 생성됩니다.
+# GUNICORN_PRELOAD=0이면 기존처럼 워커마다 임포트합니다. (-w, --threads, -b 등은 Procfile에서 지정)
+
+import gc
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # preload로 만든 객체를 GC 추적 대상에서 제외 → 워커에서 GC가 돌 때 공유 메모리 페이지를 건드려 복사되는 것을 방지
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+        server.log.info("preload 완료 - 공유 객체 %d개 고정 (gc.freeze)", gc.get_freeze_count())
@@ -42,12 +42,37 @@ if (LOG_DOWNLOAD_BUTTON) {
 
 // --- 새로운 기능: 침묵 감지 로직 ---
 const INACTIVITY_TIME = 5 * 60 * 1000; // 5분 (밀리초)
+// 🚩 만료 약 1분 전에 서버가 재촉 메시지를 미리 만들도록 요청 (반 전체가 동시에 조용해져도 요청이 몰리지 않게 0~30초 지터)
+const PREFETCH_LEAD_TIME = 60 * 1000;
+const PREFETCH_JITTER = 30 * 1000;
 let inactivityTimeout;
+let prefetchTimeout;
+
+// 🚩 요청마다 멱등 키 생성 (같은 요청이 다시 전송돼도 서버가 LLM을 한 번만 호출하고 같은 결과를 돌려줌)
+function newRequestKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
 
 // 🚩 5분 타이머 초기화 및 재설정 함수
 function resetInactivityTimer() {
     clearTimeout(inactivityTimeout);
+    clearTimeout(prefetchTimeout);
     inactivityTimeout = setTimeout(promptInactivity, INACTIVITY_TIME);
+    prefetchTimeout = setTimeout(prefetchInactivityPrompt, INACTIVITY_TIME - PREFETCH_LEAD_TIME - Math.random() * PREFETCH_JITTER);
+}
+
+// 🚩 재촉 메시지 사전 생성 요청 (응답을 기다리지 않음, 실패해도 5분 시점에 평소처럼 생성됨)
+function prefetchInactivityPrompt() {
+    fetch('/prefetch_prompt_response', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({})
+    }).catch(error => console.error('Prefetch error:', error));
 }
 
 // 🚩 5분 경과 시 호출되는 함수 (AI 재촉 메시지 호출)
@@ -57,7 +82,8 @@ function promptInactivity() {
     fetch('/get_prompt_response', {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Idempotency-Key': newRequestKey()
         },
         body: JSON.stringify({})
     })
@@ -66,6 +92,9 @@ function promptInactivity() {
         hideLoading();
         if (data.response) {
             appendMessage('AI', data.response);
+            acknowledge(data.seq, 1);
+        } else if (data.cancelled) {
+            // 학생이 메시지를 보내는 중이라 서버가 재촉을 취소함
         } else if (data.error) {
             console.error("Inactivity Prompt Error:", data.error);
         }
@@ -198,7 +227,7 @@ function checkTimeAndShowPopup() {
 }
 
 // 5. 메시지 처리 함수들 (appendMessage, showLoading, hideLoading 유지)
-function appendMessage(speaker, message) {
+function createMessageRow(speaker, message) {
     const row = document.createElement('div');
     row.classList.add('message-row', speaker === 'AI' ? 'ai-message-row' : 'user-message-row');
 
@@ -215,11 +244,140 @@ function appendMessage(speaker, message) {
     content.classList.add('message-content');
     content.innerHTML = message.replace(/\n/g, '<br>'); 
     row.appendChild(content);
+    return row;
+}
 
+function appendMessage(speaker, message) {
+    const row = createMessageRow(speaker, message);
+    // 서버 seq를 받기 전까지는 임시 메시지 (동기화 시 서버 기록으로 교체)
+    if (speaker !== 'System') {
+        row.dataset.pending = '1';
+    }
     chatBox.appendChild(row);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return row.querySelector('.message-content');
+}
+
+// --- 🚩 seq 커서 기반 대화 이력 동기화 ---
+// 첫 화면에는 최근 한 페이지만 렌더링되고, 이전 대화는 맨 위로 스크롤할 때 가져옵니다.
+// lastSeq = 서버가 확인해 준 마지막 메시지. 네트워크가 끊겼다 돌아오면 그 이후만 다시 받습니다.
+function renderedSeqs() {
+    return Array.from(chatBox.querySelectorAll('.message-row[data-seq]')).map(row => parseInt(row.dataset.seq));
+}
+
+let lastSeq = Math.max(0, ...renderedSeqs());
+let firstSeq = Math.min(...renderedSeqs(), lastSeq + 1);
+let hasOlder = chatBox.dataset.hasOlder === '1';
+let loadingOlder = false;
+let syncing = false;
+
+function historyRow(message) {
+    const row = createMessageRow(message.role === 'user' ? 'User' : 'AI', message.content);
+    row.dataset.seq = message.seq;
+    return row;
+}
+
+function fetchHistory(params) {
+    return fetch('/chat_history?' + new URLSearchParams(params))
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('history ' + response.status);
+            }
+            return response.json();
+        });
+}
+
+// 응답에 담긴 seq로 방금 표시한 임시 메시지를 확정 (added: 이번 요청으로 추가된 메시지 수)
+function acknowledge(seq, added) {
+    if (typeof seq !== 'number') {
+        return;
+    }
+    if (seq - added !== lastSeq) {
+        // 그 사이 다른 탭/재촉 등으로 추가된 메시지가 있으면 서버 기록으로 다시 맞춤
+        syncHistory();
+        return;
+    }
+    const pending = Array.from(chatBox.querySelectorAll('.message-row[data-pending]')).slice(-added);
+    pending.forEach((row, i) => {
+        row.dataset.seq = seq - pending.length + 1 + i;
+        delete row.dataset.pending;
+    });
+    lastSeq = seq;
+}
+
+// lastSeq 이후 메시지를 받아 임시 메시지를 교체 (재연결, 통신 오류 후 복구)
+function syncHistory() {
+    if (syncing) {
+        return;
+    }
+    syncing = true;
+    const received = [];
+
+    function next(after) {
+        return fetchHistory({ after: after }).then(data => {
+            received.push(...data.messages);
+            if (data.has_more && data.messages.length) {
+                return next(data.messages[data.messages.length - 1].seq);
+            }
+        });
+    }
+
+    next(lastSeq)
+        .then(() => {
+            if (!received.length) {
+                return;
+            }
+            chatBox.querySelectorAll('.message-row[data-pending]').forEach(row => row.remove());
+            const loadingRow = document.getElementById('loading-row');
+            received.forEach(message => {
+                const row = historyRow(message);
+                if (loadingRow) {
+                    chatBox.insertBefore(row, loadingRow);
+                } else {
+                    chatBox.appendChild(row);
+                }
+            });
+            lastSeq = received[received.length - 1].seq;
+            chatBox.scrollTop = chatBox.scrollHeight;
+        })
+        .catch(error => console.error('History sync error:', error))
+        .finally(() => { syncing = false; });
 }
 
+// 맨 위로 스크롤하면 이전 페이지를 앞에 붙임 (보고 있던 위치 유지)
+function loadOlderHistory() {
+    if (!hasOlder || loadingOlder) {
+        return;
+    }
+    loadingOlder = true;
+    fetchHistory({ before: firstSeq })
+        .then(data => {
+            const previousHeight = chatBox.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            data.messages.forEach(message => fragment.appendChild(historyRow(message)));
+            chatBox.insertBefore(fragment, chatBox.firstChild);
+            chatBox.scrollTop += chatBox.scrollHeight - previousHeight;
+            if (data.messages.length) {
+                firstSeq = data.messages[0].seq;
+            }
+            hasOlder = data.has_more;
+        })
+        .catch(error => console.error('History load error:', error))
+        .finally(() => { loadingOlder = false; });
+}
+
+chatBox.addEventListener('scroll', () => {
+    if (chatBox.scrollTop < 80) {
+        loadOlderHistory();
+    }
+});
+window.addEventListener('online', syncHistory);
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'visible') {
+        syncHistory();
+    }
+});
+
 function showLoading() {
     const loadingRow = document.createElement('div');
     loadingRow.id = 'loading-row';
@@ -243,6 +401,20 @@ function showLoading() {
     userInput.disabled = true;
 }
 
+// 🚩 서버 대기열에서 기다리는 동안 스피너 대신 대기 순번 표시 (/get_response_stream의 'queued' 이벤트)
+function showQueuePosition(position) {
+    const loadingRow = document.getElementById('loading-row');
+    if (!loadingRow) return;
+    const content = loadingRow.querySelector('.message-content');
+    const waiting = position > 1 ? `앞에 ${position - 1}명이 기다리고 있어요.` : '곧 차례가 와요.';
+    content.innerHTML = `질문이 많아 순서를 기다리는 중입니다... ${waiting} <span class="loading-dot"></span><span class="loading-dot"></span><span class="loading-dot"></span>`;
+}
+
+// 서버가 바빠서 요청을 받지 못했을 때(429) 안내 문구 (retry_after: 다시 시도까지 권장 대기 초)
+function busyMessage(error, retryAfter) {
+    return retryAfter ? `${error} (약 ${retryAfter}초 후)` : error;
+}
+
 function hideLoading() {
     const loadingRow = document.getElementById('loading-row');
     if (loadingRow) {
@@ -277,42 +449,114 @@ function sendMessage() {
     userInput.value = '';
 
     showLoading();
-    
-    fetch('/get_response', {
+    streamResponse(message);
+}
+
+// 🚩 /get_response_stream SSE 응답을 읽어 AI 말풍선에 토큰 단위로 출력
+function streamResponse(message) {
+    let aiContent = null;
+    let aiText = '';
+
+    function handleEvent(event) {
+        if (event.type === 'delta') {
+            if (!aiContent) {
+                // 로딩 표시만 제거하고 입력창은 스트림 완료까지 비활성 유지
+                const loadingRow = document.getElementById('loading-row');
+                if (loadingRow) {
+                    loadingRow.remove();
+                }
+                aiContent = appendMessage('AI', '');
+            }
+            aiText += event.text;
+            aiContent.innerHTML = aiText.replace(/\n/g, '<br>');
+            chatBox.scrollTop = chatBox.scrollHeight;
+        } else if (event.type === 'queued') {
+            showQueuePosition(event.position);
+        } else if (event.type === 'done') {
+            hideLoading();
+            if (!aiContent) {
+                aiContent = appendMessage('AI', '');
+            }
+            // 최종 검증된 답변으로 교체 (JSON 파싱 실패 시 안내 문구 등)
+            aiContent.innerHTML = event.response.replace(/\n/g, '<br>');
+            acknowledge(event.seq, 2);
+        } else if (event.type === 'error') {
+            hideLoading();
+            if (aiContent) {
+                aiContent.closest('.message-row').remove();
+            }
+            appendMessage('System', `오류: ${busyMessage(event.error, event.retry_after)}`);
+        }
+    }
+
+    fetch('/get_response_stream', {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Idempotency-Key': newRequestKey()
         },
         body: JSON.stringify({ message: message })
     })
     .then(response => {
-        // hideLoading 내부에서 입력 활성화
-        hideLoading(); 
+        if (response.status === 429) {
+            // 대기열이 가득 참 - 통신 오류가 아니므로 안내만 하고 기록 동기화는 하지 않음
+            hideLoading();
+            return response.json().then(data => {
+                appendMessage('System', busyMessage(data.error, data.retry_after || response.headers.get('Retry-After')));
+            });
+        }
         if (!response.ok) {
+            hideLoading();
             return response.json().then(data => { 
                 console.error('API Error:', data.error || 'Unknown error during API call.');
                 throw new Error(data.error || 'AI 응답을 가져오는 데 실패했습니다.'); 
             });
         }
-        return response.json();
-    })
-    .then(data => {
-        if (data.error) {
-            appendMessage('System', `오류: ${data.error}`);
-        } else {
-            appendMessage('AI', data.response);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    hideLoading();
+                    return;
+                }
+                buffer += decoder.decode(value, { stream: true });
+
+                // SSE 이벤트는 빈 줄(\n\n)로 구분됨
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('data: ')) {
+                            handleEvent(JSON.parse(line.slice(6)));
+                        }
+                    });
+                }
+                return pump();
+            });
         }
+        return pump();
     })
     .catch(error => {
         hideLoading();
         console.error('Fetch error:', error);
         appendMessage('System', `통신 오류: ${error.message}`);
+        // 연결이 끊겨도 서버는 답변을 저장했을 수 있으므로 마지막으로 받은 메시지 이후를 다시 확인
+        syncHistory();
     });
 }
 
 // 7. 윈도우 로드 시 이벤트 (🚩 침묵 감지 타이머 시작 추가)
 window.onload = function() {
     chatBox.scrollTop = chatBox.scrollHeight;
+    // 첫 페이지가 화면을 다 채우지 못하면 스크롤할 수 없으므로 이전 페이지를 바로 가져옴
+    if (chatBox.scrollHeight <= chatBox.clientHeight) {
+        loadOlderHistory();
+    }
     userInput.focus();
     initializeTimer(); // 30분 타이머 시작
     
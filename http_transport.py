@@ -0,0 +1,65 @@
+# http_transport.py
+
+import os
+import threading
+
+import httpx
+from openai import DefaultHttpxClient, DefaultAsyncHttpxClient
+
+try:
+    import h2  # noqa: F401  (HTTP/2 지원 여부 확인용)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 🚩 모든 OpenAI 클라이언트가 공유하는 HTTP 연결 풀
+# 키마다 OpenAI(api_key=...)가 각자 연결 풀을 가지면 워커당 최대 27개의 풀이 생기고, 한동안 쓰지 않은 키는
+# 다시 TLS 핸드셰이크부터 해야 합니다. API 키는 요청마다 Authorization 헤더로 들어가므로 연결은 키와 무관하게
+# 재사용할 수 있습니다. → 워커당 동기/비동기 클라이언트 하나씩만 만들어 모든 키가 공유합니다.
+
+
+class SharedHTTPTransport:
+    """워커(프로세스)별 공유 HTTP 클라이언트 (fork 이후 처음 사용할 때 생성)"""
+
+    def __init__(self, max_connections=100, max_keepalive_connections=40, keepalive_expiry=60.0, http2=True):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._sync_client = None
+        self._async_client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _check_pid(self):
+        # 부모 프로세스에서 만든 클라이언트(소켓·락)는 fork 이후 재사용하지 않음
+        if self._pid != os.getpid():
+            self._sync_client = None
+            self._async_client = None
+            self._pid = os.getpid()
+
+    @property
+    def sync_client(self):
+        with self._lock:
+            self._check_pid()
+            if self._sync_client is None:
+                self._sync_client = DefaultHttpxClient(limits=self.limits, http2=self.http2)
+            return self._sync_client
+
+    @property
+    def async_client(self):
+        with self._lock:
+            self._check_pid()
+            if self._async_client is None:
+                self._async_client = DefaultAsyncHttpxClient(limits=self.limits, http2=self.http2)
+            return self._async_client
+
+    def status(self):
+        return {
+            'http2': self.http2,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'keepalive_expiry': self.limits.keepalive_expiry,
+        }
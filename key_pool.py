@@ -0,0 +1,303 @@
+# key_pool.py
+
+import os
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+from openai import OpenAI, AsyncOpenAI
+
+# 🚩 OpenAI API 키 풀 스케줄러
+# 학생을 키 하나에 고정하지 않고, 요청마다 여유가 있는 키 중 부하가 가장 적은 키로 보냅니다.
+# - 키별 토큰 버킷으로 분당 요청 수(RPM)/토큰 수(TPM)를 추적
+# - 학생별 직전 키(affinity)를 우선 사용해 같은 학생의 요청은 가능하면 같은 키로 보냄 (sticky)
+# - 429를 받은 키는 Retry-After(없으면 지수 백오프)만큼, 401(잘못된/폐기된 키)을 받은 키는 auth_cooldown만큼 제외
+# 상태는 워커(프로세스)별로 따로 관리되므로 rpm/tpm은 "워커 하나가 쓸 수 있는 몫"으로 설정합니다.
+
+
+class TokenBucket:
+    """분당 capacity만큼 연속적으로 채워지는 버킷 (예약은 음수까지 허용해 초과분을 다음 주기로 넘김)"""
+
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def available(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def take(self, amount):
+        self.available()
+        self.tokens -= amount
+
+    def refund(self, amount):
+        self.available()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def fraction(self, now=None):
+        return self.available(now) / self.capacity if self.capacity else 0.0
+
+
+class KeyState:
+    def __init__(self, number, api_key, rpm, tpm, transport=None):
+        self.number = number
+        self.api_key = api_key
+        self.transport = transport  # 공유 HTTP 연결 풀 (None이면 SDK 기본 - 키마다 별도 풀)
+        self._client = None
+        self._client_pid = None
+        self.async_client = None  # ASGI 모드에서 첫 요청 시 생성
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.cooldown_reason = None
+        self.consecutive_429 = 0
+        self.stats = {'requests': 0, 'success': 0, 'rate_limited': 0, 'auth_failed': 0, 'errors': 0}
+
+    @property
+    def client(self):
+        # 재시도는 call_policy에서 키를 바꿔 가며 처리하므로 SDK 자체 재시도는 끔
+        if self._client is None or self._client_pid != os.getpid():
+            http_client = self.transport.sync_client if self.transport else None
+            self._client = OpenAI(api_key=self.api_key, max_retries=0, http_client=http_client)
+            self._client_pid = os.getpid()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+        self._client_pid = os.getpid()
+
+    def get_async_client(self):
+        if self.async_client is None:
+            http_client = self.transport.async_client if self.transport else None
+            self.async_client = AsyncOpenAI(api_key=self.api_key, max_retries=0, http_client=http_client)
+        return self.async_client
+
+    def is_cooling(self, now):
+        return self.cooldown_until > now
+
+    def has_capacity(self, estimated_tokens, now):
+        return self.requests.available(now) >= 1 and self.tokens.available(now) >= estimated_tokens
+
+
+class KeyLease:
+    """키 하나를 빌려 쓰는 동안의 핸들. with 블록을 벗어날 때 결과(성공/429/401 등)를 풀에 보고합니다."""
+
+    def __init__(self, pool, key, reserved_tokens):
+        self.pool = pool
+        self.key = key
+        self.reserved_tokens = reserved_tokens
+        self.used_tokens = None
+        self.released = False
+
+    @property
+    def key_number(self):
+        return self.key.number
+
+    @property
+    def client(self):
+        return self.key.client
+
+    @property
+    def async_client(self):
+        return self.key.get_async_client()
+
+    def record_usage(self, usage):
+        """응답의 usage(total_tokens)로 예약해 둔 토큰 수를 실제 사용량으로 보정합니다."""
+        total = getattr(usage, 'total_tokens', None)
+        if total is not None:
+            self.used_tokens = total
+
+    def release(self, error=None):
+        if self.released:
+            return
+        self.released = True
+        self.pool._release(self, error)
+
+    def cancel(self):
+        """결과를 받지 않고 반납합니다. (헤징에서 진 요청 - 성공/실패로 세지 않고 예약한 토큰을 돌려줌)"""
+        if self.released:
+            return
+        self.released = True
+        self.pool._release(self, None, cancelled=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(exc, asyncio.CancelledError):
+            self.cancel()
+        else:
+            # GeneratorExit 등 Exception이 아닌 중단(클라이언트 연결 종료)은 키 오류로 보지 않음
+            self.release(exc if isinstance(exc, Exception) else None)
+        return False
+
+
+class KeyPool:
+    """API 키 풀. acquire()로 키를 빌리고 KeyLease로 반납합니다."""
+
+    def __init__(self, api_keys, rpm=500, tpm=30000, sticky=True, sticky_slack=1,
+                 cooldown=20.0, max_cooldown=300.0, auth_cooldown=600.0, completion_tokens=400, transport=None):
+        self.transport = transport
+        self.keys = {number: KeyState(number, api_key, rpm, tpm, transport) for number, api_key in sorted(api_keys.items())}
+        self.sticky = sticky
+        self.sticky_slack = sticky_slack
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.auth_cooldown = auth_cooldown
+        self.completion_tokens = completion_tokens
+        self.affinity = {}  # student_id -> 키 번호 (O(1) 조회)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def assign_home_keys(self, student_ids):
+        """학생 명단 순서대로 키를 골고루 나눠 초기 affinity로 설정합니다. (명단 순서 = 기존 키 배정 순서)"""
+        numbers = list(self.keys)
+        if not numbers:
+            return
+        with self._lock:
+            for index, student_id in enumerate(student_ids):
+                self.affinity.setdefault(student_id, numbers[index % len(numbers)])
+
+    def acquire(self, student_id=None, estimated_prompt_tokens=0, exclude=()):
+        """요청 하나에 쓸 키를 골라 KeyLease를 반환합니다. 쓸 수 있는 키가 없으면 None.
+
+        exclude: 가능하면 피할 키 번호 (재시도·헤징 시 방금 쓴 키). 다른 키가 없으면 무시됩니다.
+        """
+        reserve = estimated_prompt_tokens + self.completion_tokens
+        now = time.monotonic()
+        with self._lock:
+            key = self._choose(student_id, reserve, now, exclude)
+            if key is None:
+                return None
+            key.requests.take(1)
+            key.tokens.take(reserve)
+            key.in_flight += 1
+            key.stats['requests'] += 1
+            if student_id is not None and self.sticky:
+                self.affinity[student_id] = key.number
+        return KeyLease(self, key, reserve)
+
+    def _choose(self, student_id, reserve, now, exclude=()):
+        healthy = [key for key in self.keys.values() if not key.is_cooling(now)]
+        if exclude:
+            healthy = [key for key in healthy if key.number not in exclude] or healthy
+        if not healthy:
+            # 모두 쿨다운 중이면 인증 실패가 아닌 키 중 가장 먼저 풀리는 키를 사용
+            waiting = [key for key in self.keys.values() if key.cooldown_reason != 'auth']
+            return min(waiting, key=lambda k: k.cooldown_until) if waiting else None
+
+        ready = [key for key in healthy if key.has_capacity(reserve, now)]
+        if not ready:
+            # 모든 키가 한도를 넘었으면 버킷 여유가 가장 많은 키로 (초과분은 다음 주기로 이월)
+            return max(healthy, key=lambda k: (min(k.requests.fraction(now), k.tokens.fraction(now)), -k.in_flight))
+
+        least_loaded = min(ready, key=lambda k: (k.in_flight, -k.tokens.fraction(now), k.number))
+        if self.sticky and student_id is not None:
+            preferred = self.keys.get(self.affinity.get(student_id))
+            if preferred in ready and preferred.in_flight <= least_loaded.in_flight + self.sticky_slack:
+                return preferred
+        return least_loaded
+
+    def _release(self, lease, error, cancelled=False):
+        key = lease.key
+        now = time.monotonic()
+        status = getattr(error, 'status_code', None)
+        with self._lock:
+            key.in_flight = max(key.in_flight - 1, 0)
+            if cancelled:
+                key.tokens.refund(lease.reserved_tokens)
+                return
+            if error is not None:
+                key.tokens.refund(lease.reserved_tokens)  # 실패한 요청은 토큰을 쓰지 않은 것으로 처리
+            elif lease.used_tokens is not None:
+                difference = lease.reserved_tokens - lease.used_tokens
+                if difference > 0:
+                    key.tokens.refund(difference)
+                else:
+                    key.tokens.take(-difference)
+
+            if error is None:
+                key.stats['success'] += 1
+                key.consecutive_429 = 0
+            elif status == 429:
+                key.stats['rate_limited'] += 1
+                key.consecutive_429 += 1
+                backoff = min(self.cooldown * 2 ** (key.consecutive_429 - 1), self.max_cooldown)
+                retry_after = _retry_after_seconds(error)
+                self._cool_down(key, now, retry_after if retry_after is not None else backoff, 'rate_limit')
+            elif status == 401:
+                key.stats['auth_failed'] += 1
+                self._cool_down(key, now, self.auth_cooldown, 'auth')
+            else:
+                key.stats['errors'] += 1
+
+        if status == 429:
+            print(f"🚨 WARNING: API 키 {key.number}번 429 응답 - {key.cooldown_until - now:.0f}초 동안 제외합니다.")
+        elif status == 401:
+            print(f"🚨 WARNING: API 키 {key.number}번 인증 실패({status}) - {self.auth_cooldown:.0f}초 동안 제외합니다.")
+
+    def _cool_down(self, key, now, seconds, reason):
+        key.cooldown_until = max(key.cooldown_until, now + seconds)
+        key.cooldown_reason = reason
+
+    def status(self):
+        """키별 상태 (관리자용 상태 화면)"""
+        now = time.monotonic()
+        with self._lock:
+            students_per_key = {}
+            for number in self.affinity.values():
+                students_per_key[number] = students_per_key.get(number, 0) + 1
+            keys = []
+            for key in self.keys.values():
+                cooling = key.is_cooling(now)
+                keys.append({
+                    'key': key.number,
+                    'key_suffix': key.api_key[-4:],
+                    'state': key.cooldown_reason if cooling else 'ok',
+                    'cooldown_remaining': round(key.cooldown_until - now, 1) if cooling else 0,
+                    'in_flight': key.in_flight,
+                    'rpm_available': round(key.requests.available(now), 1),
+                    'tpm_available': round(key.tokens.available(now)),
+                    'students': students_per_key.get(key.number, 0),
+                    **key.stats,
+                })
+        return {
+            'keys': keys,
+            'healthy': sum(1 for k in keys if k['state'] == 'ok'),
+            'total': len(keys),
+            'transport': self.transport.status() if self.transport else None,
+        }
+
+
+def _retry_after_seconds(error):
+    """429 응답의 Retry-After 헤더(초 또는 HTTP 날짜)를 초 단위로 변환합니다."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
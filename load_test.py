@@ -0,0 +1,265 @@
+# load_test.py
+#
+# 🚩 수업 한 반 규모 부하 테스트 드라이버
+#   1) python fake_openai_server.py --port 8787
+#   2) OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_KEY_1=fake-1 ... gunicorn app:app -b 127.0.0.1:8000
+#   3) python load_test.py --base-url http://127.0.0.1:8000 --students 27 --turns 10 --out result.json
+#      (이후 변경마다 --baseline result.json 으로 이전 결과와 비교)
+#
+# 학생 N명(data/users.json의 실제 학번/이름)이 각자 쿠키 세션으로
+# 로그인 → 동의 → 개요 → 채팅 → /get_response(또는 스트리밍) 여러 턴 → 침묵 재촉 → 로그 다운로드 순서로 진행하고,
+# 라우트별 처리량, p50/p95/p99 지연, 오류율을 출력합니다.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+DEFAULT_USERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'users.json')
+SAMPLE_MESSAGES = [
+    "안녕하세요, 학습 활동을 어떻게 시작해야 할지 모르겠어요.",
+    "학습자 중심 모델에서 자기주도성을 어떻게 높일 수 있을까요?",
+    "패들렛이랑 멘티미터 중에 어떤 도구가 토론 활동에 더 좋아요?",
+    "활동 목표를 이렇게 정했는데 괜찮은지 봐 주세요: 학생들이 생태계의 상호작용을 설명할 수 있다.",
+    "평가 방법은 어떻게 설계하면 좋을까요?",
+    "모둠 활동에서 참여하지 않는 학생은 어떻게 도와야 하나요?",
+    "AI 도구를 쓰면 학생들이 생각을 안 하게 되지 않을까요?",
+    "지금까지 설계한 걸 정리해 보면 도입, 전개, 정리 세 단계예요.",
+]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """리다이렉트를 따라가지 않고 302 자체를 라우트 응답으로 측정"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # route -> [(latency, ok)]
+        self._lock = threading.Lock()
+
+    def add(self, route, latency, ok):
+        with self._lock:
+            self.samples.setdefault(route, []).append((latency, ok))
+
+
+class StudentSession:
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect())
+
+    def request(self, route, method='GET', form=None, json_body=None, expect=(200,), read=True):
+        """요청 하나를 보내고 (상태 코드, 본문)을 반환하며 지연/성공 여부를 기록합니다."""
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            data = json.dumps(json_body, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + route, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        status, body = None, b''
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                status = resp.status
+                body = resp.read() if read else b''
+        except urllib.error.HTTPError as e:
+            status = e.code
+            body = e.read()
+        except Exception as e:
+            body = str(e).encode('utf-8')
+        ok = status in expect and not _has_error_field(body)
+        self.recorder.add(route, time.perf_counter() - started, ok)
+        return status, body
+
+    def stream(self, message):
+        """/get_response_stream: 첫 delta까지(ttft)와 done까지의 시간을 따로 기록합니다."""
+        route = '/get_response_stream'
+        req = urllib.request.Request(
+            self.base_url + route,
+            data=json.dumps({'message': message}, ensure_ascii=False).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        started = time.perf_counter()
+        first_delta = None
+        ok = False
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                for raw in resp:
+                    line = raw.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    event = json.loads(line[5:])
+                    if event.get('type') == 'delta' and first_delta is None:
+                        first_delta = time.perf_counter() - started
+                    elif event.get('type') == 'done':
+                        ok = True
+                    elif event.get('type') == 'error':
+                        break
+        except Exception:
+            pass
+        self.recorder.add(route, time.perf_counter() - started, ok)
+        if first_delta is not None:
+            self.recorder.add(route + ' (ttft)', first_delta, True)
+
+
+def _has_error_field(body):
+    if not body.startswith(b'{'):
+        return False
+    try:
+        return 'error' in json.loads(body)
+    except ValueError:
+        return False
+
+
+def run_student(args, student_id, name, recorder, start_delay):
+    time.sleep(start_delay)
+    s = StudentSession(args.base_url, recorder, args.timeout)
+    s.request('/')
+    status, _ = s.request('/', method='POST', form={'student_id': student_id, 'name': name}, expect=(302,))
+    if status != 302:
+        return
+    s.request('/consent')
+    s.request('/consent', method='POST', form={'consent_check': 'agree'}, expect=(302,))
+    s.request('/summary')
+    s.request('/chat')
+
+    for turn in range(args.turns):
+        time.sleep(random.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+        message = random.choice(SAMPLE_MESSAGES)
+        if args.stream:
+            s.stream(message)
+        else:
+            s.request('/get_response', method='POST', json_body={'message': message})
+
+    if args.nudge:
+        if args.prefetch:
+            s.request('/prefetch_prompt_response', method='POST', json_body={}, expect=(202,))
+            time.sleep(args.prefetch_lead)
+        s.request('/get_prompt_response', method='POST', json_body={})
+    s.request('/submit_and_download_log')
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    total = errors = 0
+    for route, samples in sorted(recorder.samples.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        failed = sum(1 for _, ok in samples if not ok)
+        if not route.endswith('(ttft)'):
+            total += len(samples)
+            errors += failed
+        routes[route] = {
+            'count': len(samples),
+            'errors': failed,
+            'error_rate': round(failed / len(samples), 4),
+            'rps': round(len(samples) / elapsed, 3),
+            'mean': round(statistics.fmean(latencies), 4),
+            'p50': round(percentile(latencies, 0.50), 4),
+            'p95': round(percentile(latencies, 0.95), 4),
+            'p99': round(percentile(latencies, 0.99), 4),
+        }
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 3) if elapsed else 0,
+        'error_rate': round(errors / total, 4) if total else 0,
+        'routes': routes,
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"\n총 {result['requests']}건 / {result['elapsed_seconds']}초 → {result['throughput_rps']} req/s, 오류율 {result['error_rate'] * 100:.2f}%")
+    if baseline:
+        print(f"  (기준: {baseline['throughput_rps']} req/s, 오류율 {baseline['error_rate'] * 100:.2f}%)")
+    header = f"{'route':<34}{'count':>7}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+    if baseline:
+        header += f"{'Δp95':>9}"
+    print(header)
+    print('-' * len(header))
+    for route, stats in result['routes'].items():
+        line = f"{route:<34}{stats['count']:>7}{stats['error_rate'] * 100:>7.1f}%{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}"
+        base = (baseline or {}).get('routes', {}).get(route)
+        if base:
+            line += f"{stats['p95'] - base['p95']:>+9.3f}"
+        print(line)
+
+
+def load_users(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return list(json.load(f).items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='학생 세션 시뮬레이션 부하 테스트')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', default=DEFAULT_USERS_PATH, help='학번/이름 목록 (기본값: data/users.json)')
+    parser.add_argument('--students', type=int, default=27, help='동시 학생 수 (명단보다 많으면 명단을 반복 사용)')
+    parser.add_argument('--turns', type=int, default=10, help='학생당 /get_response 턴 수')
+    parser.add_argument('--think-time', type=float, default=3.0, help='턴 사이 평균 대기(초, 지수분포)')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='학생 시작 시각을 이 시간(초) 안에 분산')
+    parser.add_argument('--stream', action='store_true', help='/get_response 대신 /get_response_stream 사용')
+    parser.add_argument('--no-nudge', dest='nudge', action='store_false', help='침묵 재촉 단계 생략')
+    parser.add_argument('--prefetch', action='store_true', help='재촉 전에 /prefetch_prompt_response 호출')
+    parser.add_argument('--prefetch-lead', type=float, default=2.0, help='사전 생성 요청 후 재촉 요청까지 대기(초)')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', help='결과 JSON 저장 경로')
+    parser.add_argument('--baseline', help='비교할 이전 결과 JSON')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    users = load_users(args.users)
+    if not users:
+        print("🚨 ERROR: 사용자 명단이 비어 있습니다.")
+        sys.exit(1)
+
+    recorder = Recorder()
+    threads = []
+    started = time.perf_counter()
+    for i in range(args.students):
+        student_id, name = users[i % len(users)]
+        delay = args.ramp_up * i / max(args.students, 1)
+        thread = threading.Thread(target=run_student, args=(args, student_id, name, recorder, delay), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    result = summarize(recorder, time.perf_counter() - started)
+    result['config'] = {k: v for k, v in vars(args).items() if k not in ('out', 'baseline')}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"INFO: 결과 저장 → {args.out}")
+
+
+if __name__ == '__main__':
+    main()
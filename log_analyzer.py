@@ -0,0 +1,289 @@
+# log_analyzer.py
+#
+# 🚩 대화 로그 오프라인 분석 CLI
+#   python log_analyzer.py --logs-dir /tmp/logs --out-dir ./analysis --workers 4
+#
+# LOGS_DIR/<이름>/<시간_학번>.txt (log_conversation_entry 형식)와 <학번_이름>.json 카운트 파일을
+# 프로세스 풀에서 병렬로 파싱하고, 결과를 한 번의 스트리밍 패스로 집계합니다.
+#   - sessions.jsonl : 세션(대화 로그 파일)별 요약 (처리되는 대로 기록)
+#   - students.csv / students.jsonl : 학생별 집계
+#   - class.json : 반 전체 집계
+# 이전 실행 이후 크기/mtime이 바뀌지 않은 파일은 상태 파일(.analyzer_state.json)의 결과를 재사용합니다.
+
+import os
+import re
+import csv
+import json
+import argparse
+import datetime
+import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_LOGS_DIR = '/tmp/logs' # config_utils.LOGS_DIR과 동일
+STATE_FILENAME = '.analyzer_state.json'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# [시간] 사용자: 내용  /  [시간] AI (스캐폴딩 유형) [prompt:버전]: 내용
+ENTRY_PATTERN = re.compile(
+    r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] (사용자|AI)(?: \(([^)\n]*)\))?(?: \[prompt:(\w+)\])?: ',
+    re.MULTILINE
+)
+AI_SEPARATOR = '----------------------------------------'
+SESSION_FILE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2}_\d{6})_(.+)\.txt$')
+
+
+def parse_log_text(text):
+    """로그 파일 내용을 항목 리스트로 변환합니다.
+
+    speaker: 'user' | 'ai' | 'system'
+    (System/System_Error 항목은 로그상 'AI'로 기록되지만 스캐폴딩 라벨이 없으므로 'system'으로 분류)
+    """
+    entries = []
+    matches = list(ENTRY_PATTERN.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end].rstrip()
+        if body.endswith(AI_SEPARATOR):
+            body = body[:-len(AI_SEPARATOR)].rstrip()
+        timestamp, speaker, label, prompt_version = match.groups()
+        if speaker == '사용자':
+            kind = 'user'
+        elif label:
+            kind = 'ai'
+        else:
+            kind = 'system'
+        entries.append({
+            'time': datetime.datetime.strptime(timestamp, TIME_FORMAT),
+            'speaker': kind,
+            'scaffolding_type': label,
+            'prompt_version': prompt_version,
+            'text': body,
+        })
+    return entries
+
+
+def summarize_session(path):
+    """대화 로그 파일 하나를 요약합니다. (프로세스 풀 워커에서 실행)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = parse_log_text(f.read())
+
+    folder = os.path.basename(os.path.dirname(path))
+    match = SESSION_FILE_PATTERN.match(os.path.basename(path))
+    student_id = match.group(2) if match else ''
+
+    scaffolding = Counter()
+    prompt_versions = Counter()
+    gaps = []
+    user_turns = ai_replies = nudges = greetings = errors = 0
+    last_non_system = None
+    last_ai_time = None
+
+    for entry in entries:
+        kind = entry['speaker']
+        if kind == 'system':
+            if '오류 발생' in entry['text']:
+                errors += 1
+            continue
+        if kind == 'user':
+            user_turns += 1
+            if last_ai_time is not None:
+                gaps.append((entry['time'] - last_ai_time).total_seconds())
+        else:
+            scaffolding[entry['scaffolding_type']] += 1
+            if entry['prompt_version']:
+                prompt_versions[entry['prompt_version']] += 1
+            # 직전 항목이 사용자 메시지면 일반 답변, 첫 AI 항목은 인사말, 그 외(AI 연속)는 침묵 재촉
+            if last_non_system is None:
+                greetings += 1
+            elif last_non_system == 'user':
+                ai_replies += 1
+            else:
+                nudges += 1
+            last_ai_time = entry['time']
+        last_non_system = kind
+
+    started = entries[0]['time'] if entries else None
+    ended = entries[-1]['time'] if entries else None
+    return {
+        'path': path,
+        'student_name': folder,
+        'student_id': student_id,
+        'started_at': started.strftime(TIME_FORMAT) if started else None,
+        'ended_at': ended.strftime(TIME_FORMAT) if ended else None,
+        'duration_seconds': (ended - started).total_seconds() if entries else 0,
+        'user_turns': user_turns,
+        'ai_replies': ai_replies,
+        'greetings': greetings,
+        'nudges': nudges,
+        'errors': errors,
+        'response_gaps': gaps,
+        'scaffolding': dict(scaffolding),
+        'prompt_versions': dict(prompt_versions),
+    }
+
+
+def iter_log_files(logs_dir):
+    """(세션 로그 경로 목록, 카운트 JSON 경로 목록)"""
+    session_files, count_files = [], []
+    for entry in sorted(os.scandir(logs_dir), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        for child in sorted(os.scandir(entry.path), key=lambda e: e.name):
+            if not child.is_file():
+                continue
+            if child.name.endswith('.txt'):
+                session_files.append(child.path)
+            elif child.name.endswith('.json') and not child.name.startswith('.'):
+                count_files.append(child.path)
+    return session_files, count_files
+
+
+def load_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(out_dir, state):
+    tmp_path = os.path.join(out_dir, STATE_FILENAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(out_dir, STATE_FILENAME))
+
+
+def gap_stats(gaps):
+    if not gaps:
+        return {'response_gap_mean': None, 'response_gap_median': None, 'response_gap_max': None}
+    return {
+        'response_gap_mean': round(statistics.fmean(gaps), 1),
+        'response_gap_median': round(statistics.median(gaps), 1),
+        'response_gap_max': round(max(gaps), 1),
+    }
+
+
+def analyze(logs_dir, out_dir, workers=None, chunksize=16):
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+    session_files, count_files = iter_log_files(logs_dir)
+
+    # 변경되지 않은 파일은 이전 결과 재사용
+    new_state = {}
+    cached, to_parse = [], []
+    for path in session_files:
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        previous = state.get(path)
+        if previous and previous['signature'] == signature:
+            cached.append(previous['summary'])
+            new_state[path] = previous
+        else:
+            to_parse.append((path, signature))
+
+    students = {}
+    class_scaffolding = Counter()
+    class_gaps = []
+    class_totals = Counter()
+
+    def consume(summary, sessions_out):
+        sessions_out.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        key = (summary['student_id'], summary['student_name'])
+        student = students.setdefault(key, {
+            'student_id': summary['student_id'], 'student_name': summary['student_name'],
+            'sessions': 0, 'user_turns': 0, 'ai_replies': 0, 'nudges': 0, 'errors': 0,
+            'duration_seconds': 0, 'gaps': [], 'scaffolding': Counter(), 'count_file': {},
+        })
+        student['sessions'] += 1
+        for field in ('user_turns', 'ai_replies', 'nudges', 'errors', 'duration_seconds'):
+            student[field] += summary[field]
+            class_totals[field] += summary[field]
+        class_totals['sessions'] += 1
+        student['gaps'].extend(summary['response_gaps'])
+        class_gaps.extend(summary['response_gaps'])
+        student['scaffolding'].update(summary['scaffolding'])
+        class_scaffolding.update(summary['scaffolding'])
+
+    with open(os.path.join(out_dir, 'sessions.jsonl'), 'w', encoding='utf-8') as sessions_out:
+        for summary in cached:
+            consume(summary, sessions_out)
+        if to_parse:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                paths = [path for path, _ in to_parse]
+                for (path, signature), summary in zip(to_parse, executor.map(summarize_session, paths, chunksize=chunksize)):
+                    new_state[path] = {'signature': signature, 'summary': summary}
+                    consume(summary, sessions_out)
+
+    # <학번_이름>.json 카운트 파일 (서버 카운터 기준 최종 카운트)
+    for path in count_files:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        student_id, _, name = stem.partition('_')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                counts = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        student = students.get((student_id, name))
+        if student is not None:
+            student['count_file'] = counts
+
+    scaffolding_types = sorted(class_scaffolding, key=lambda t: (-class_scaffolding[t], t))
+    rows = []
+    for student in sorted(students.values(), key=lambda s: (s['student_name'], s['student_id'])):
+        row = {
+            'student_id': student['student_id'],
+            'student_name': student['student_name'],
+            'sessions': student['sessions'],
+            'user_turns': student['user_turns'],
+            'ai_replies': student['ai_replies'],
+            'nudges': student['nudges'],
+            'nudge_rate': round(student['nudges'] / max(student['ai_replies'] + student['nudges'], 1), 3),
+            'errors': student['errors'],
+            'duration_seconds': student['duration_seconds'],
+        }
+        row.update(gap_stats(student['gaps']))
+        for s_type in scaffolding_types:
+            row[f'scaffolding:{s_type}'] = student['scaffolding'].get(s_type, 0)
+        for s_type, count in student['count_file'].items():
+            row[f'count_file:{s_type}'] = count
+        rows.append(row)
+
+    fieldnames = []
+    for row in rows:
+        fieldnames.extend(k for k in row if k not in fieldnames)
+    with open(os.path.join(out_dir, 'students.csv'), 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval=0)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(out_dir, 'students.jsonl'), 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    class_summary = {
+        'students': len(students),
+        **{field: class_totals[field] for field in ('sessions', 'user_turns', 'ai_replies', 'nudges', 'errors')},
+        'nudge_rate': round(class_totals['nudges'] / max(class_totals['ai_replies'] + class_totals['nudges'], 1), 3),
+        **gap_stats(class_gaps),
+        'scaffolding': {t: class_scaffolding[t] for t in scaffolding_types},
+    }
+    with open(os.path.join(out_dir, 'class.json'), 'w', encoding='utf-8') as f:
+        json.dump(class_summary, f, ensure_ascii=False, indent=4)
+
+    save_state(out_dir, new_state)
+    return {'parsed': len(to_parse), 'reused': len(cached), 'students': len(students)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='대화 로그(LOGS_DIR) 오프라인 분석')
+    parser.add_argument('--logs-dir', default=DEFAULT_LOGS_DIR, help='로그 루트 폴더 (기본값: /tmp/logs)')
+    parser.add_argument('--out-dir', default='analysis', help='결과 저장 폴더 (기본값: ./analysis)')
+    parser.add_argument('--workers', type=int, default=None, help='프로세스 수 (기본값: CPU 수)')
+    args = parser.parse_args()
+
+    result = analyze(args.logs_dir, args.out_dir, workers=args.workers)
+    print(f"INFO: 분석 완료 - 새로 파싱 {result['parsed']}개, 재사용 {result['reused']}개, 학생 {result['students']}명 → {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# log_download.py
+
+import os
+import hashlib
+import zipfile
+import zlib
+from urllib.parse import quote
+from email.utils import formatdate, parsedate_to_datetime
+
+# 🚩 대화 로그 다운로드 스트리밍
+# 로그 파일을 임시 파일로 복사하지 않고 조각 단위로 읽어 그대로 전송하고, 끝에 카운트 요약을 붙입니다.
+# ETag/Last-Modified로 같은 내용의 반복 요청에는 304를 반환하고, 필요하면 gzip으로 압축해 보냅니다.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LogDownload:
+    """한 학생의 대화 로그 + 카운트 요약 다운로드"""
+
+    def __init__(self, log_path, count_summary):
+        self.log_path = log_path
+        self.count_summary = count_summary.encode('utf-8')
+        stat = os.stat(log_path)
+        self.mtime = stat.st_mtime
+        self.content_length = stat.st_size + len(self.count_summary)
+        digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}:".encode('utf-8') + self.count_summary)
+        self.etag = f'"{digest.hexdigest()[:20]}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+
+    def is_not_modified(self, if_none_match, if_modified_since):
+        """조건부 요청 헤더가 현재 내용과 일치하면 True (304 응답 대상)"""
+        if if_none_match:
+            return self.etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if if_modified_since:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def iter_chunks(self):
+        with open(self.log_path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.count_summary
+
+    def iter_gzip_chunks(self):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip 헤더 포함
+        for chunk in self.iter_chunks():
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+
+class TranscriptDownload(LogDownload):
+    """이벤트 저장소에서 렌더링한 대화 로그 + 카운트 요약 다운로드 (파일 없이 같은 헤더/304/gzip 처리)
+
+    info: event_store.transcript_info()의 (마지막 id, 마지막 기록 시각, 바이트 수, 내용 sha1)
+    길이와 ETag는 그 결과로 정하고, 전송할 때 같은 범위(마지막 id까지)를 다시 렌더링하며 조각 단위로 보냅니다.
+    """
+
+    def __init__(self, event_store, log_name, count_summary, info):
+        self.event_store = event_store
+        self.log_name = log_name
+        self.last_id, self.mtime, transcript_length, transcript_digest = info
+        self.count_summary = count_summary.encode('utf-8')
+        self.content_length = transcript_length + len(self.count_summary)
+        digest = hashlib.sha1(transcript_digest.encode('ascii') + b"\0" + self.count_summary)
+        self.etag = f'"{digest.hexdigest()[:20]}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+
+    def iter_chunks(self):
+        pending, size = [], 0
+        for entry in self.event_store.iter_transcript(self.log_name, self.last_id):
+            data = entry.encode('utf-8')
+            pending.append(data)
+            size += len(data)
+            if size >= CHUNK_SIZE:
+                yield b"".join(pending)
+                pending, size = [], 0
+        if pending:
+            yield b"".join(pending)
+        yield self.count_summary
+
+
+def attachment_header(filename):
+    """한글 파일명을 위한 Content-Disposition 헤더 (ASCII 대체 이름 + RFC 5987 UTF-8 이름)"""
+    fallback = filename.encode('ascii', 'ignore').decode('ascii').strip('_') or 'download'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def accepts_gzip(accept_encoding):
+    return 'gzip' in (accept_encoding or '').lower()
+
+
+class _ZipStreamBuffer:
+    """zipfile이 쓰는 바이트를 모아 두었다가 생성기에서 꺼내 보내기 위한 쓰기 전용 버퍼 (seek 불가 모드)"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_class_zip(logs_dir, transcripts=(), exclude_dirs=()):
+    """LOGS_DIR 아래 학생 폴더의 대화 로그(.txt)와 카운트 파일(.json)을 하나의 zip으로 스트리밍합니다.
+
+    transcripts: 이벤트 저장소에서 렌더링한 (상대 경로, 대화 로그) - 같은 경로의 .txt 파일보다 우선합니다.
+    exclude_dirs: 학생 폴더가 아닌 LOGS_DIR 하위 폴더 (예: 메트릭 스냅샷 폴더) - zip에 넣지 않습니다.
+    """
+    excluded = {os.path.realpath(path) for path in exclude_dirs if path}
+    buffer = _ZipStreamBuffer()
+    written = set()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for arcname, text in transcripts:
+            arcname = arcname.replace(os.sep, '/')
+            archive.writestr(arcname, text.encode('utf-8'))
+            written.add(arcname)
+            data = buffer.drain()
+            if data:
+                yield data
+        for entry in sorted(os.scandir(logs_dir), key=lambda e: e.name):
+            if not entry.is_dir() or os.path.realpath(entry.path) in excluded:
+                continue
+            for child in sorted(os.scandir(entry.path), key=lambda e: e.name):
+                if not child.is_file() or not child.name.endswith(('.txt', '.json')):
+                    continue
+                arcname = f"{entry.name}/{child.name}"
+                if arcname in written:
+                    continue
+                with open(child.path, 'rb') as src, archive.open(arcname, 'w') as dest:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                data = buffer.drain()
+                if data:
+                    yield data
+    yield buffer.drain()
@@ -0,0 +1,144 @@
+# log_writer.py
+
+import os
+import json
+import atexit
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# 🚩 버퍼링 백그라운드 로그 기록기
+# 요청 스레드는 로그 항목을 큐에 넣기만 하고, 별도 기록 스레드가 flush_interval마다 파일별로 모아서 씁니다.
+# 파일 핸들은 열어 둔 채 재사용하되(LRU로 최대 max_open_files개), 종료 시 남은 항목을 모두 기록합니다.
+
+
+class BufferedLogWriter:
+    """TXT 로그(및 선택적 JSONL 레코드)를 비동기로 기록합니다.
+
+    fsync_policy: 'off'   - OS 버퍼에 맡김 (기본값)
+                  'batch' - 배치를 기록할 때마다 fsync
+    """
+
+    def __init__(self, flush_interval=0.5, fsync_policy='off', max_open_files=64, write_jsonl=False):
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.max_open_files = max_open_files
+        self.write_jsonl = write_jsonl
+        self._queue = queue.Queue()
+        self._handles = OrderedDict()  # path -> file object
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    # --- 요청 스레드 쪽 API ---
+    def write(self, path, text, record=None):
+        """path에 text를 추가하도록 예약합니다. record가 있고 JSONL 기록이 켜져 있으면 .jsonl에도 한 줄 추가합니다."""
+        self._ensure_thread()
+        self._queue.put((path, text))
+        if record is not None and self.write_jsonl:
+            jsonl_path = os.path.splitext(path)[0] + '.jsonl'
+            self._queue.put((jsonl_path, json.dumps(record, ensure_ascii=False) + "\n"))
+
+    def flush(self, timeout=5.0):
+        """지금까지 예약된 항목이 모두 파일에 기록될 때까지 기다립니다. (다운로드 직전 등)"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+
+    # --- 기록 스레드 ---
+    def _ensure_thread(self):
+        # fork 이후(gunicorn 워커)에는 부모의 스레드가 없으므로 워커마다 새로 시작
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._handles = OrderedDict()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # flush_interval 동안 추가로 들어오는 항목을 모아 한 번에 기록
+            if item is not None and not isinstance(item, threading.Event):
+                deadline = time.monotonic() + self.flush_interval
+                try:
+                    while True:
+                        batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                        if batch[-1] is None or isinstance(batch[-1], threading.Event):
+                            break
+                except queue.Empty:
+                    pass
+
+            pending = OrderedDict()
+            waiters = []
+            stop = False
+            for entry in batch:
+                if entry is None:
+                    stop = True
+                elif isinstance(entry, threading.Event):
+                    waiters.append(entry)
+                else:
+                    path, text = entry
+                    pending.setdefault(path, []).append(text)
+
+            self._write_batch(pending)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                self._close_handles()
+                return
+
+    def _get_handle(self, path):
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+            return handle
+        log_dir = os.path.dirname(path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        handle = open(path, 'a', encoding='utf-8')
+        self._handles[path] = handle
+        while len(self._handles) > self.max_open_files:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        return handle
+
+    def _write_batch(self, pending):
+        for path, texts in pending.items():
+            try:
+                handle = self._get_handle(path)
+                handle.write("".join(texts))
+                handle.flush()
+                if self.fsync_policy == 'batch':
+                    os.fsync(handle.fileno())
+            except Exception as e:
+                print(f"🚨🚨 CRITICAL LOG WRITE FAIL: 로그 파일 저장 실패: {path} ({e})")
+                stale = self._handles.pop(path, None)
+                if stale is not None:
+                    stale.close()
+
+    def _close_handles(self):
+        for handle in self._handles.values():
+            try:
+                handle.close()
+            except Exception:
+                pass
+        self._handles.clear()
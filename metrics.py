@@ -0,0 +1,223 @@
+# metrics.py
+
+import os
+import json
+import time
+import atexit
+import threading
+from bisect import bisect_left
+
+# 🚩 Prometheus 형식 메트릭 (외부 라이브러리 없이 텍스트 노출 형식만 구현)
+# 요청 경로에서는 스레드별 dict(shard)에 더하기만 하고(락·I/O 없음), 수집(/metrics) 시에 모든 shard를 합칩니다.
+# gunicorn 워커마다 프로세스가 다르므로 백그라운드 스레드가 flush_interval마다 워커별 스냅샷 파일을 쓰고,
+# /metrics는 자기 워커의 실시간 값 + 다른 워커의 스냅샷을 합쳐서 반환합니다.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+_KEY_SEP = '\x1f'
+
+
+class MetricsRegistry:
+    """counter / histogram / gauge(수집 시 콜백) 레지스트리"""
+
+    def __init__(self, snapshot_dir=None, flush_interval=5.0):
+        self.snapshot_dir = snapshot_dir
+        self.flush_interval = flush_interval
+        self._metrics = {}  # name -> {'type', 'help', 'labels', 'buckets'}
+        self._gauge_fns = {}  # name -> fn() -> {label_tuple: value}
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            atexit.register(self._write_snapshot)
+
+    # --- 선언 ---
+    def counter(self, name, help_text, labels=()):
+        self._metrics[name] = {'type': 'counter', 'help': help_text, 'labels': tuple(labels)}
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self._metrics[name] = {'type': 'histogram', 'help': help_text, 'labels': tuple(labels), 'buckets': tuple(buckets)}
+
+    def gauge(self, name, help_text, labels, fn):
+        """수집 시점에 fn()을 호출해 값을 읽는 gauge (예: 진행 중인 LLM 호출 수)"""
+        self._metrics[name] = {'type': 'gauge', 'help': help_text, 'labels': tuple(labels)}
+        self._gauge_fns[name] = fn
+
+    # --- 요청 경로 API (락 없음) ---
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None or self._local.pid != os.getpid():
+            shard = {}
+            with self._lock:
+                if self._pid != os.getpid():
+                    # fork 이후(gunicorn 워커)에는 부모의 값을 버리고 스냅샷 스레드를 새로 시작
+                    self._shards = []
+                    self._pid = os.getpid()
+                    self._start_snapshot_thread()
+                self._shards.append(shard)
+            self._local.shard = shard
+            self._local.pid = os.getpid()
+        return shard
+
+    def inc(self, name, *labels, value=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, *labels):
+        shard = self._shard()
+        key = (name, labels)
+        buckets = self._metrics[name]['buckets']
+        data = shard.get(key)
+        if data is None:
+            data = shard[key] = [0] * (len(buckets) + 2)  # 구간별 개수(+Inf 포함) + 합계
+        data[bisect_left(buckets, value)] += 1
+        data[-1] += value
+
+    # --- 수집 ---
+    def _collect_local(self):
+        with self._lock:
+            shards = list(self._shards) if self._pid == os.getpid() else []
+        counters, histograms = {}, {}
+        for shard in shards:
+            for (name, labels), value in shard.copy().items():
+                if isinstance(value, list):
+                    merged = histograms.setdefault(_encode(name, labels), [0] * len(value))
+                    for i, v in enumerate(value):
+                        merged[i] += v
+                else:
+                    key = _encode(name, labels)
+                    counters[key] = counters.get(key, 0) + value
+        gauges = {}
+        for name, fn in self._gauge_fns.items():
+            try:
+                for labels, value in fn().items():
+                    gauges[_encode(name, labels)] = value
+            except Exception as e:
+                print(f"🚨 WARNING: 메트릭 gauge 수집 실패 ({name}): {e}")
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.snapshot_dir, f"metrics_{pid}.json")
+
+    def _start_snapshot_thread(self):
+        if not self.snapshot_dir:
+            return
+        self._thread = threading.Thread(target=self._run_snapshots, name='metrics-snapshot', daemon=True)
+        self._thread.start()
+
+    def _run_snapshots(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        if not self.snapshot_dir or self._pid != os.getpid():
+            return
+        try:
+            path = self._snapshot_path(os.getpid())
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self._collect_local(), f)
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            print(f"🚨 WARNING: 메트릭 스냅샷 저장 실패: {e}")
+
+    def collect(self):
+        """이 워커의 실시간 값 + 다른 워커 스냅샷을 합친 값"""
+        total = self._collect_local()
+        if not self.snapshot_dir:
+            return total
+        own = os.path.basename(self._snapshot_path(os.getpid()))
+        stale_after = self.flush_interval * 3
+        for entry in os.scandir(self.snapshot_dir):
+            if entry.name == own or not entry.name.startswith('metrics_') or not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                fresh = time.time() - entry.stat().st_mtime < stale_after
+            except (OSError, json.JSONDecodeError):
+                continue
+            # 종료된 워커의 counter/histogram은 누적값이므로 계속 합산하고, gauge는 살아 있는 워커 것만 합산
+            for key, value in snapshot['counters'].items():
+                total['counters'][key] = total['counters'].get(key, 0) + value
+            for key, value in snapshot['histograms'].items():
+                merged = total['histograms'].setdefault(key, [0] * len(value))
+                for i, v in enumerate(value):
+                    merged[i] += v
+            if fresh:
+                for key, value in snapshot['gauges'].items():
+                    total['gauges'][key] = total['gauges'].get(key, 0) + value
+        return total
+
+    def render(self):
+        """Prometheus 텍스트 노출 형식 (text/plain; version=0.0.4)"""
+        data = self.collect()
+        by_name = {}
+        for kind in ('counters', 'histograms', 'gauges'):
+            for key, value in data[kind].items():
+                name, labels = _decode(key)
+                by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, meta in self._metrics.items():
+            lines.append(f"# HELP {name} {meta['help']}")
+            lines.append(f"# TYPE {name} {meta['type']}")
+            for labels, value in sorted(by_name.get(name, [])):
+                pairs = list(zip(meta['labels'], labels))
+                if meta['type'] != 'histogram':
+                    lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(meta['buckets'] + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _encode(name, labels):
+    return _KEY_SEP.join((name,) + tuple(str(label) for label in labels))
+
+
+def _decode(key):
+    name, *labels = key.split(_KEY_SEP)
+    return name, tuple(labels)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def create_app_metrics(snapshot_dir=None, flush_interval=5.0):
+    """이 앱에서 사용하는 메트릭을 선언한 레지스트리를 만듭니다. (gauge는 config_utils에서 연결)"""
+    registry = MetricsRegistry(snapshot_dir, flush_interval)
+    registry.histogram('http_request_duration_seconds', 'HTTP 요청 처리 시간 (스트리밍은 응답 시작까지)', ('route', 'method', 'status'))
+    registry.histogram('llm_call_duration_seconds', 'OpenAI 호출 시간 (스트리밍은 스트림 종료까지)', ('route', 'key'))
+    registry.counter('llm_call_errors_total', 'OpenAI 호출 오류 수', ('route', 'key', 'status'))
+    registry.counter('llm_tokens_total', 'OpenAI 사용 토큰 수 (response.usage 기준)', ('route', 'student_id', 'kind'))
+    registry.counter('llm_json_parse_failures_total', 'AI 응답 JSON 파싱 실패 수', ('route',))
+    registry.counter('llm_context_truncations_total', '토큰 예산 초과로 오래된 메시지를 잘라낸 호출 수', ('kind',))
+    registry.counter('llm_context_tokens_saved_total', '오래된 메시지 잘라내기로 줄인 추정 입력 토큰 수', ('kind',))
+    registry.counter('llm_routing_decisions_total', '모델 라우팅 결정 수', ('kind', 'tier', 'reason'))
+    registry.histogram('llm_tier_duration_seconds', '모델 티어별 응답 시간 (재시도·헤징 포함)', ('tier', 'model'))
+    registry.counter('llm_tier_tokens_total', '모델 티어별 사용 토큰 수', ('tier', 'model', 'kind'))
+    registry.counter('llm_admission_total', 'LLM 작업 입장 결과 수 (admitted/queued/shed_full/shed_timeout)', ('kind', 'outcome'))
+    registry.histogram('llm_admission_wait_seconds', 'LLM 작업 입장 대기 시간', ('kind',))
+    return registry
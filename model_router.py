@@ -0,0 +1,86 @@
+# model_router.py
+
+import re
+from collections import namedtuple
+
+# 🚩 턴별 모델 라우팅 (로컬 휴리스틱, 추가 API 호출 없음)
+# "네", "ok", "고마워"처럼 스캐폴딩이 필요 없는 짧은 맞장구·인사와 템플릿화된 침묵 재촉은 가볍고 빠른 모델로,
+# 그 외의 실질적인 질문/설계 대화는 기본 모델(gpt-4o)로 보냅니다.
+# 결정(tier, reason)은 메트릭과 이벤트 저장소(model, model_tier 열)에 남겨 티어별 지연·토큰·스캐폴딩 유형 분포를 비교합니다.
+
+TIER_PRIMARY = 'primary'
+TIER_LIGHT = 'light'
+
+RoutingDecision = namedtuple('RoutingDecision', ['tier', 'model', 'reason'])
+
+# 맞장구/인사/감사 어휘 (문장 전체가 이 단어들로만 이루어진 경우에만 light)
+TRIVIAL_WORDS = {
+    '네', '넵', '넹', '예', '응', '웅', 'ㅇㅇ', 'ㅇㅋ', 'ok', 'okay', '오케이', '오키',
+    '알겠어', '알겠어요', '알겠습니다', '알았어', '알았어요', '좋아', '좋아요', '좋습니다', '그래', '그래요',
+    '맞아', '맞아요', '고마워', '고마워요', '감사', '감사해요', '감사합니다', '땡큐', 'thanks', 'thx',
+    '안녕', '안녕하세요', '하이', 'hi', 'hello', '굿', 'good', '오', '아하', '음',
+}
+_PUNCTUATION = re.compile(r'[\s!.,~^…]+')
+_LAUGH = re.compile(r'^[ㅋㅎ]+$')
+_REPEATED = re.compile(r'(.)\1+$')
+
+
+def is_trivial_message(text, max_chars=15, max_words=3):
+    """스캐폴딩 없이 짧게 받아 주면 되는 맞장구/인사인지 판단합니다. 질문(?)이나 숫자가 있으면 실질적인 턴으로 봅니다."""
+    text = (text or '').strip()
+    if not text or len(text) > max_chars or '?' in text or any(ch.isdigit() for ch in text):
+        return False
+    words = [w for w in _PUNCTUATION.split(text.lower()) if w]
+    if not words or len(words) > max_words:
+        return False
+    # "네네네", "응응" 같은 반복은 한 글자로 줄여서 비교
+    return all(w in TRIVIAL_WORDS or _LAUGH.match(w) or _REPEATED.sub(r'\1', w) in TRIVIAL_WORDS for w in words)
+
+
+class ModelRouter:
+    """요청 종류('response' / 'nudge')와 대화 내용으로 호출할 모델을 고릅니다."""
+
+    def __init__(self, primary_model, light_model, enabled=True, light_nudges=True, max_trivial_chars=15, metrics=None):
+        self.primary_model = primary_model
+        self.light_model = light_model
+        self.enabled = enabled and bool(light_model)
+        self.light_nudges = light_nudges
+        self.max_trivial_chars = max_trivial_chars
+        self.metrics = metrics
+
+    def decide(self, kind, conversation):
+        """RoutingDecision만 계산합니다. (메트릭 미반영 - 사전 생성처럼 학생에게 바로 보내지 않는 호출용)"""
+        if not self.enabled:
+            return RoutingDecision(TIER_PRIMARY, self.primary_model, 'disabled')
+        if kind == 'nudge':
+            if self.light_nudges:
+                return RoutingDecision(TIER_LIGHT, self.light_model, 'nudge')
+            return RoutingDecision(TIER_PRIMARY, self.primary_model, 'nudge')
+        last = conversation[-1] if conversation else None
+        if last and last.get('role') == 'user' and is_trivial_message(last.get('content'), self.max_trivial_chars):
+            return RoutingDecision(TIER_LIGHT, self.light_model, 'trivial')
+        return RoutingDecision(TIER_PRIMARY, self.primary_model, 'substantive')
+
+    def route(self, kind, conversation):
+        decision = self.decide(kind, conversation)
+        if self.metrics:
+            self.metrics.inc('llm_routing_decisions_total', kind, decision.tier, decision.reason)
+        return decision
+
+    def observe(self, decision, latency=None, usage=None):
+        """티어별 지연/토큰 메트릭 (호출이 끝난 뒤 로그 기록 시점에 반영)"""
+        if not self.metrics:
+            return
+        if latency is not None:
+            self.metrics.observe('llm_tier_duration_seconds', latency, decision.tier, decision.model)
+        if usage is not None:
+            self.metrics.inc('llm_tier_tokens_total', decision.tier, decision.model, 'prompt', value=getattr(usage, 'prompt_tokens', 0) or 0)
+            self.metrics.inc('llm_tier_tokens_total', decision.tier, decision.model, 'completion', value=getattr(usage, 'completion_tokens', 0) or 0)
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'primary_model': self.primary_model,
+            'light_model': self.light_model,
+            'light_nudges': self.light_nudges,
+        }
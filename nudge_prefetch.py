@@ -0,0 +1,209 @@
+# nudge_prefetch.py
+
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# 🚩 침묵 재촉 메시지 사전 생성 (speculative pre-generation)
+# 브라우저는 침묵 5분 타이머가 끝나기 조금 전(약 4분, 학생마다 지터)에 /prefetch_prompt_response를 호출하고,
+# 서버는 그 시점의 대화 버전(메시지 수)에 대한 재촉 메시지를 백그라운드에서 미리 만들어 둡니다.
+# 5분 타이머가 끝나 /get_prompt_response가 오면 같은 버전의 결과를 바로 꺼내 쓰고,
+# 그 사이 학생이 메시지를 보내 버전이 바뀌었다면 버리고 평소처럼 생성합니다.
+# 워커가 달라도 결과를 찾을 수 있도록 캐시는 SQLite 파일에 두고, 생성 동시성은 워커당 max_workers로 제한합니다.
+# 아직 생성 중이면 라우트는 대화 잠금을 잡기 전에 wait_ready()로 잠시 기다리고, 잠금 안의 take()는 기다리지 않습니다.
+# 그래도 끝나지 않았으면 take()가 그 항목을 지워(late) 늦게 끝난 결과가 주인 없는 'ready' 행으로 남지 않게 합니다.
+
+# 재촉 메시지 생성 결과 (사전 생성 캐시에는 필드마다 열 하나로 저장)
+# model/model_tier/토큰 수는 실제로 생성한 호출의 값 (꺼내 쓸 때 로그에 그대로 기록)
+NudgeResult = namedtuple('NudgeResult', ['scaffolding_type', 'response_text', 'prompt_version', 'context_tokens_saved',
+                                         'model', 'model_tier', 'prompt_tokens', 'completion_tokens'])
+_RESULT_COLUMNS = ', '.join(NudgeResult._fields)
+_CLEAR_RESULT = ', '.join(f'{field} = NULL' for field in NudgeResult._fields)
+_SET_RESULT = ', '.join(f'{field} = ?' for field in NudgeResult._fields)
+
+
+class NudgePrefetcher:
+    """대화 ID별 사전 생성 재촉 메시지 캐시 (행 하나 = 대화 하나)"""
+
+    def __init__(self, db_path, generate_fn, max_workers=4, ttl=600.0, pending_timeout=60.0):
+        self.db_path = db_path
+        self.generate_fn = generate_fn  # (student_id, conversation_id, conversation) -> NudgeResult
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self.stats = {'scheduled': 0, 'hits': 0, 'misses': 0, 'stale': 0, 'late': 0, 'discarded': 0, 'failed': 0}
+        self._local = threading.local()
+        self._done = threading.Condition()  # 이 워커에서 생성이 끝나면 wait_ready()를 바로 깨움
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS nudge_cache (
+                conversation_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                scaffolding_type TEXT,
+                response_text TEXT,
+                prompt_version TEXT,
+                context_tokens_saved INTEGER,
+                model TEXT,
+                model_tier TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get_executor(self):
+        # fork 이후 워커마다 생성 스레드 풀을 새로 만듦
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='nudge-prefetch')
+                self._pid = os.getpid()
+        return self._executor
+
+    def schedule(self, student_id, conversation_id, conversation):
+        """현재 대화 버전의 재촉 메시지 생성을 예약합니다. 이미 같은 버전이 준비(중)이면 False."""
+        version = len(conversation)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, status, updated_at FROM nudge_cache WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+            if row and row[0] == version and (row[1] == 'ready' or now - row[2] < self.pending_timeout):
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                f"""INSERT INTO nudge_cache (conversation_id, version, status, updated_at) VALUES (?, ?, 'pending', ?)
+                   ON CONFLICT (conversation_id) DO UPDATE SET version = excluded.version, status = 'pending',
+                   {_CLEAR_RESULT}, updated_at = excluded.updated_at""",
+                (conversation_id, version, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.stats['scheduled'] += 1
+        self._get_executor().submit(self._generate, student_id, conversation_id, list(conversation), version)
+        return True
+
+    def _generate(self, student_id, conversation_id, conversation, version):
+        try:
+            result = NudgeResult(*self.generate_fn(student_id, conversation_id, conversation))
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"🚨 WARNING: 재촉 메시지 사전 생성 실패 ({conversation_id[:8]}): {e}")
+            self._connect().execute(
+                "DELETE FROM nudge_cache WHERE conversation_id = ? AND version = ? AND status = 'pending'",
+                (conversation_id, version)
+            )
+            self._notify()
+            return
+        # 그 사이 더 새로운 버전이 예약됐거나 take()가 늦었다고 지웠다면 저장하지 않음
+        updated = self._connect().execute(
+            f"""UPDATE nudge_cache SET status = 'ready', {_SET_RESULT}, updated_at = ?
+               WHERE conversation_id = ? AND version = ? AND status = 'pending'""",
+            tuple(result) + (time.time(), conversation_id, version)
+        ).rowcount
+        if not updated:
+            self.stats['discarded'] += 1
+        self._notify()
+
+    def _notify(self):
+        with self._done:
+            self._done.notify_all()
+
+    def _is_pending(self, conversation_id):
+        row = self._connect().execute(
+            "SELECT status, updated_at FROM nudge_cache WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row is not None and row[0] == 'pending' and time.time() - row[1] < self.pending_timeout
+
+    def wait_ready(self, conversation_id, timeout):
+        """생성 중인 항목이 끝날 때까지 최대 timeout초 기다립니다. (잠금 없이 조회만, 끝났거나 없으면 True)
+
+        같은 워커의 생성은 완료 즉시 깨어나고, 다른 워커의 생성은 0.05초부터 0.5초까지 늘려 가며 확인합니다.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while self._is_pending(conversation_id):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._done:
+                self._done.wait(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+        return True
+
+    async def await_ready(self, conversation_id, timeout):
+        """wait_ready()의 비동기 버전 (이벤트 루프를 막지 않고 조회 사이에 asyncio.sleep)"""
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while await asyncio.to_thread(self._is_pending, conversation_id):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+        return True
+
+    def take(self, conversation_id, version):
+        """현재 버전용으로 준비된 재촉 메시지를 꺼냅니다. NudgeResult 또는 None. (기다리지 않음)
+
+        버전이 다르거나 만료된 항목은 버리고, 아직 생성 중인 항목은 지워서(late) 호출한 쪽이 직접 생성합니다.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"""SELECT version, status, updated_at, {_RESULT_COLUMNS}
+                   FROM nudge_cache WHERE conversation_id = ?""",
+                (conversation_id,)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                conn.execute("COMMIT")
+                return None
+            row_version, status, updated_at = row[:3]
+            expired = time.time() - updated_at > (self.ttl if status == 'ready' else self.pending_timeout)
+            if row_version != version or expired:
+                self.stats['stale'] += 1
+            elif status == 'ready':
+                self.stats['hits'] += 1
+            else:
+                self.stats['late'] += 1
+            conn.execute("DELETE FROM nudge_cache WHERE conversation_id = ?", (conversation_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row_version == version and not expired and status == 'ready':
+            return NudgeResult(*row[3:])
+        return None
+
+    def discard(self, conversation_id):
+        self._connect().execute("DELETE FROM nudge_cache WHERE conversation_id = ?", (conversation_id,))
@@ -0,0 +1,126 @@
+# preflight.py
+#
+# 🚩 배포 전 점검 (서버를 띄우지 않고 설정·파일·API 키만 확인)
+#   python app.py --check            # 키마다 models.list 호출(토큰 비용 없음)로 인증 확인
+#   python app.py --check --offline  # 네트워크 호출 없이 파일/환경 변수만 확인
+# 실패 항목이 하나라도 있으면 종료 코드 1 (Railway 배포 전 단계나 CI에서 사용)
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+import config_utils
+
+KEY_CHECK_TIMEOUT = 10.0
+
+
+class PreflightReport:
+    def __init__(self):
+        self.failures = 0
+        self.warnings = 0
+
+    def ok(self, message):
+        print(f"✅ {message}")
+
+    def warn(self, message):
+        self.warnings += 1
+        print(f"🚨 WARNING: {message}")
+
+    def fail(self, message):
+        self.failures += 1
+        print(f"🚨 ERROR: {message}")
+
+
+def check_files(report):
+    for filename in config_utils.PROMPT_FILES:
+        path = os.path.join(config_utils.PROMPT_DIR, filename)
+        if not os.path.exists(path):
+            report.fail(f"프롬프트 파일 없음: {path}")
+        elif not config_utils.load_prompt_file(filename).strip():
+            report.fail(f"프롬프트 파일이 비어 있음: {path}")
+        else:
+            report.ok(f"프롬프트 파일 {filename} ({os.path.getsize(path):,} bytes)")
+
+    tools_index, sites_index = config_utils.get_catalog_indexes()
+    if len(tools_index) and len(sites_index):
+        report.ok(f"에듀테크 카탈로그 인덱스 (도구 {len(tools_index)}개, 사이트 {len(sites_index)}개)")
+    else:
+        report.fail(f"에듀테크 카탈로그 표를 읽지 못함 (도구 {len(tools_index)}개, 사이트 {len(sites_index)}개)")
+
+    if config_utils.AUTHORIZED_USERS:
+        report.ok(f"users.json ({len(config_utils.AUTHORIZED_USERS)}명)")
+    else:
+        report.fail("users.json이 없거나 비어 있음 (로그인 불가)")
+
+    try:
+        with tempfile.NamedTemporaryFile(dir=config_utils.LOGS_DIR):
+            pass
+        report.ok(f"로그 디렉토리 쓰기 가능: {config_utils.LOGS_DIR}")
+    except OSError as e:
+        report.fail(f"로그 디렉토리에 쓸 수 없음: {config_utils.LOGS_DIR} ({e})")
+
+
+def check_environment(report):
+    if not os.getenv('FLASK_SECRET_KEY'):
+        report.warn("FLASK_SECRET_KEY 미설정 - 기본 키로 세션 쿠키가 서명됩니다.")
+    if not config_utils.ADMIN_TOKEN:
+        report.warn("ADMIN_TOKEN 미설정 - 관리자/연구자 라우트가 비활성화됩니다.")
+
+    key_count = len(config_utils.KEY_POOL)
+    expected = len(config_utils.STUDENT_KEY_NAMES)
+    if key_count == 0:
+        report.fail("OPENAI_KEY_1~27이 모두 누락됨")
+    elif key_count < expected:
+        report.warn(f"API 키 {key_count}/{expected}개만 설정됨")
+    else:
+        report.ok(f"API 키 {key_count}개 설정됨")
+
+
+def _check_key(key):
+    """키 하나로 models.list를 호출해 (상태, 설명)을 반환합니다."""
+    try:
+        key.client.with_options(timeout=KEY_CHECK_TIMEOUT).models.list()
+        return 'ok', None
+    except (openai.AuthenticationError, openai.PermissionDeniedError) as e:
+        return 'fail', f"인증 실패 ({e.status_code})"
+    except openai.RateLimitError as e:
+        if getattr(e, 'code', None) == 'insufficient_quota':
+            return 'fail', "사용 한도(quota) 초과"
+        return 'warn', "429 - 키는 유효하지만 현재 호출 한도 초과"
+    except openai.APIConnectionError as e:
+        return 'fail', f"API 서버에 연결할 수 없음 ({e})"
+    except openai.APIStatusError as e:
+        return 'warn', f"예상치 못한 응답 ({e.status_code})"
+
+
+def check_keys(report):
+    keys = list(config_utils.KEY_POOL.keys.values())
+    if not keys:
+        return
+    with ThreadPoolExecutor(max_workers=min(len(keys), 8)) as executor:
+        results = list(executor.map(_check_key, keys))
+    for key, (status, detail) in zip(keys, results):
+        label = f"OPENAI_KEY_{key.number} (...{key.api_key[-4:]})"
+        if status == 'ok':
+            report.ok(f"{label} 인증 확인")
+        elif status == 'warn':
+            report.warn(f"{label}: {detail}")
+        else:
+            report.fail(f"{label}: {detail}")
+
+
+def run_preflight(offline=False):
+    """점검을 실행하고 종료 코드(실패가 있으면 1)를 반환합니다."""
+    report = PreflightReport()
+    print("==================== Preflight Check ====================")
+    check_files(report)
+    check_environment(report)
+    if offline:
+        print("INFO: --offline - API 키 인증 확인을 건너뜁니다.")
+    else:
+        check_keys(report)
+    print("=========================================================")
+    print(f"INFO: 실패 {report.failures}건, 경고 {report.warnings}건")
+    return 1 if report.failures else 0
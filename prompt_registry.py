@@ -0,0 +1,109 @@
+# prompt_registry.py
+
+import os
+import hashlib
+import threading
+import time
+
+# 🚩 프롬프트 파일 메모리 캐시 + mtime 기반 핫 리로드
+# 요청마다 파일을 읽지 않고, check_interval 초에 한 번만 os.stat으로 변경 여부를 확인합니다.
+# 파일이 바뀌면 해당 파일만 다시 읽고 generation을 올려, 통합 프롬프트 등 파생 결과도 다시 만들게 합니다.
+# version은 tracked_files 전체(아직 요청되지 않은 파일도 읽어서 포함)의 해시이므로,
+# 같은 프롬프트 트리라면 워커·시점·CONFIG_PRELOAD 여부와 관계없이 같은 값입니다.
+
+
+class PromptRegistry:
+    """data/prompts 파일 캐시. version은 전체 파일 내용의 해시(앞 12자리)입니다."""
+
+    def __init__(self, prompt_dir, check_interval=2.0, tracked_files=()):
+        self.prompt_dir = prompt_dir
+        self.check_interval = check_interval
+        self.tracked_files = tuple(tracked_files)  # version에 항상 포함할 파일 목록
+        self._files = {}      # filename -> (mtime_ns, size, content)
+        self._compiled = {}   # key -> (generation, value)
+        self._generation = 0
+        self._version = None
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+    def _read(self, filename):
+        file_path = os.path.join(self.prompt_dir, filename)
+        try:
+            stat = os.stat(file_path)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return (stat.st_mtime_ns, stat.st_size, content)
+        except FileNotFoundError:
+            # 🚩 파일 로드 실패 시 빈 문자열 반환 (시스템 프롬프트 안정화)
+            print(f"🚨 오류: '{file_path}' 파일을 찾을 수 없습니다.")
+            return (None, None, "")
+
+    def _refresh_if_due(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            changed = False
+            for filename, (mtime_ns, size, _) in list(self._files.items()):
+                try:
+                    stat = os.stat(os.path.join(self.prompt_dir, filename))
+                    current = (stat.st_mtime_ns, stat.st_size)
+                except FileNotFoundError:
+                    current = (None, None)
+                if current != (mtime_ns, size):
+                    self._files[filename] = self._read(filename)
+                    changed = True
+            if changed:
+                self._generation += 1
+                self._version = None
+                print(f"INFO: 프롬프트 파일 변경 감지 - 다시 로드했습니다. (version {self.version})")
+
+    def get(self, filename):
+        """캐시된 파일 내용을 반환합니다. 처음 요청된 파일만 디스크에서 읽습니다."""
+        self._refresh_if_due()
+        return self._entry(filename)[2]
+
+    def _entry(self, filename):
+        entry = self._files.get(filename)
+        if entry is None:
+            with self._lock:
+                entry = self._files.get(filename)
+                if entry is None:
+                    entry = self._read(filename)
+                    self._files[filename] = entry
+                    self._generation += 1
+                    self._version = None
+        return entry
+
+    def compiled(self, key, builder):
+        """builder()로 만든 파생 결과를 캐시하고, 입력 파일이 바뀐 경우에만 다시 만듭니다."""
+        self._refresh_if_due()
+        cached = self._compiled.get(key)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        with self._lock:
+            value = builder()
+            # builder 안에서 새 파일이 처음 로드되면 generation이 바뀌므로 빌드 이후 값을 기록
+            self._compiled[key] = (self._generation, value)
+            return value
+
+    @property
+    def version(self):
+        """프롬프트 묶음(tracked_files + 그 밖에 읽은 파일)의 내용 해시 (로그에 기록해 어떤 프롬프트 리비전인지 식별)"""
+        self._refresh_if_due()
+        version = self._version
+        if version is None:
+            with self._lock:
+                for filename in self.tracked_files:
+                    self._entry(filename)
+                digest = hashlib.sha256()
+                for filename in sorted(self._files):
+                    digest.update(filename.encode('utf-8'))
+                    digest.update(b'\0')
+                    digest.update(self._files[filename][2].encode('utf-8'))
+                    digest.update(b'\0')
+                version = self._version = digest.hexdigest()[:12]
+        return version
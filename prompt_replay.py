@@ -0,0 +1,291 @@
+# prompt_replay.py
+#
+# 🚩 프롬프트 수정 전후 비교용 오프라인 리플레이 벤치마크
+#   python prompt_replay.py /tmp/logs --a git:HEAD --b data/prompts --workers 8 --out replay.json
+#   python prompt_replay.py /tmp/logs --a git:HEAD~3 --b git:HEAD --limit 200 --dry-run   # API 호출 없이 입력 토큰 추정만
+#   (로컬 스텁: python fake_openai_server.py --port 8787 후 OPENAI_BASE_URL=http://127.0.0.1:8787/v1 로 실행)
+#
+# 기록된 대화 로그(log_conversation_entry 형식 TXT, 또는 --from-events로 이벤트 저장소)의 사용자 턴마다
+# 그 시점까지의 대화 이력으로 get_response와 똑같이 messages_for_api를 다시 만들고,
+# 두 프롬프트 리비전(A/B)으로 각각 호출해 입력/출력 토큰, 지연 분위수, JSON 파싱 실패율, 스캐폴딩 유형 분포를 나란히 출력합니다.
+# 프롬프트 리비전: 프롬프트 디렉토리 경로 또는 git:<리비전> (해당 커밋의 data/prompts)
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('CONFIG_PRELOAD', '0')
+
+import config_utils
+from prompt_registry import PromptRegistry
+from context_manager import estimate_message_tokens
+from log_analyzer import parse_log_text, iter_log_files, SESSION_FILE_PATTERN
+from load_test import percentile
+
+REPLAY_ROUTE = 'replay'
+LEASE_WAIT_TIMEOUT = 60.0
+
+
+# --- 기록된 대화 → 리플레이 케이스 ---
+def load_transcripts(paths, from_events=False):
+    """(이름, 학번, 항목 리스트) 목록. paths는 TXT 파일 또는 LOGS_DIR 형식의 디렉토리"""
+    transcripts = []
+    for path in paths:
+        files = iter_log_files(path)[0] if os.path.isdir(path) else [path]
+        for file_path in files:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                entries = parse_log_text(f.read())
+            match = SESSION_FILE_PATTERN.match(os.path.basename(file_path))
+            transcripts.append((file_path, match.group(2) if match else None, entries))
+    if from_events:
+        config_utils.EVENT_STORE.flush()
+        for log_name, text in config_utils.EVENT_STORE.iter_transcripts():
+            match = SESSION_FILE_PATTERN.match(os.path.basename(log_name))
+            transcripts.append((log_name, match.group(2) if match else None, parse_log_text(text)))
+    return transcripts
+
+
+def build_cases(transcripts, limit=None):
+    """사용자 턴 하나 = 케이스 하나: (이름, 학번, 그 시점까지의 대화 + 사용자 메시지, 기록된 스캐폴딩 유형)
+
+    대화 저장소와 같게 사용자/AI(재촉 포함) 항목만 이력에 넣고 System 항목은 제외합니다.
+    """
+    cases = []
+    for name, student_id, entries in transcripts:
+        conversation = []
+        for i, entry in enumerate(entries):
+            if entry['speaker'] == 'system':
+                continue
+            if entry['speaker'] == 'user':
+                recorded = next((e['scaffolding_type'] for e in entries[i + 1:] if e['speaker'] != 'system'), None)
+                cases.append({
+                    'name': f"{name}#{len(cases)}",
+                    'student_id': student_id,
+                    'conversation': conversation + [{"role": "user", "content": entry['text']}],
+                    'recorded_type': recorded,
+                })
+                conversation = conversation + [{"role": "user", "content": entry['text']}]
+            else:
+                conversation = conversation + [{"role": "assistant", "content": entry['text']}]
+            if limit and len(cases) >= limit:
+                return cases
+    return cases
+
+
+# --- 프롬프트 리비전 ---
+@contextmanager
+def prompt_revision(spec, repo_dir=config_utils.BASE_DIR):
+    """spec(디렉토리 또는 git:<리비전>)의 프롬프트 파일 디렉토리를 제공합니다."""
+    if not spec.startswith('git:'):
+        yield spec
+        return
+    revision = spec[len('git:'):]
+    prompt_rel = os.path.relpath(config_utils.PROMPT_DIR, repo_dir).replace(os.sep, '/')
+    tmp_dir = tempfile.mkdtemp(prefix='prompt_replay_')
+    try:
+        for filename in config_utils.PROMPT_FILES:
+            result = subprocess.run(
+                ['git', '-C', repo_dir, 'show', f"{revision}:{prompt_rel}/{filename}"],
+                capture_output=True
+            )
+            if result.returncode != 0:
+                print(f"🚨 WARNING: {spec}에 {filename}이 없습니다. ({result.stderr.decode('utf-8', 'replace').strip()})")
+                continue
+            with open(os.path.join(tmp_dir, filename), 'wb') as f:
+                f.write(result.stdout)
+        yield tmp_dir
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@contextmanager
+def use_prompt_dir(prompt_dir):
+    """config_utils의 프롬프트 캐시를 잠시 prompt_dir 기준으로 바꿉니다. (메시지 구성은 한 스레드에서만)"""
+    original = config_utils.PROMPT_REGISTRY
+    config_utils.PROMPT_REGISTRY = PromptRegistry(prompt_dir, check_interval=float('inf'), tracked_files=config_utils.PROMPT_FILES)
+    try:
+        yield config_utils.PROMPT_REGISTRY
+    finally:
+        config_utils.PROMPT_REGISTRY = original
+
+
+def build_requests(cases, prompt_dir):
+    """get_response와 같은 방식으로 케이스별 messages_for_api를 만듭니다. → (프롬프트 버전, 메시지 리스트 목록)"""
+    with use_prompt_dir(prompt_dir) as registry:
+        messages = [config_utils.build_response_messages(case['conversation'])[0] for case in cases]
+        return registry.version, messages
+
+
+# --- 호출 ---
+def run_case(model, student_id, messages):
+    """재시도·헤징 없이 한 번만 호출해 순수 지연을 측정합니다. (키 풀의 RPM/TPM 한도는 그대로 적용)"""
+    estimated = estimate_message_tokens(messages)
+    deadline = time.monotonic() + LEASE_WAIT_TIMEOUT
+    lease = config_utils.KEY_POOL.acquire(student_id, estimated)
+    while lease is None:
+        if time.monotonic() >= deadline:
+            return {'error': '사용 가능한 API 키가 없습니다.'}
+        time.sleep(0.2)
+        lease = config_utils.KEY_POOL.acquire(student_id, estimated)
+
+    try:
+        with lease:
+            started = time.perf_counter()
+            response = lease.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format={"type": "json_object"}
+            )
+            latency = time.perf_counter() - started
+            lease.record_usage(response.usage)
+    except Exception as e:
+        # 429/401 등은 with 블록이 키 풀에 보고 (쿨다운 반영)
+        return {'error': str(e)}
+
+    scaffolding_type, _ = config_utils.parse_ai_response(response.choices[0].message.content, REPLAY_ROUTE)
+    return {
+        'latency': latency,
+        'scaffolding_type': scaffolding_type,
+        'prompt_tokens': getattr(response.usage, 'prompt_tokens', None),
+        'completion_tokens': getattr(response.usage, 'completion_tokens', None),
+    }
+
+
+def summarize(version, messages, results, cases):
+    estimated = [estimate_message_tokens(m) for m in messages]
+    ok = [r for r in results if r and 'error' not in r]
+    latencies = sorted(r['latency'] for r in ok)
+    prompt_tokens = [r['prompt_tokens'] for r in ok if r['prompt_tokens'] is not None]
+    completion_tokens = [r['completion_tokens'] for r in ok if r['completion_tokens'] is not None]
+    labels = Counter(r['scaffolding_type'] for r in ok)
+    return {
+        'prompt_version': version,
+        'cases': len(cases),
+        'estimated_prompt_tokens_mean': round(statistics.fmean(estimated), 1) if estimated else None,
+        'calls': len(ok),
+        'errors': sum(1 for r in results if r and 'error' in r),
+        'prompt_tokens_mean': round(statistics.fmean(prompt_tokens), 1) if prompt_tokens else None,
+        'completion_tokens_mean': round(statistics.fmean(completion_tokens), 1) if completion_tokens else None,
+        'prompt_tokens_total': sum(prompt_tokens),
+        'completion_tokens_total': sum(completion_tokens),
+        'latency_p50': round(percentile(latencies, 0.50), 4) if latencies else None,
+        'latency_p95': round(percentile(latencies, 0.95), 4) if latencies else None,
+        'latency_p99': round(percentile(latencies, 0.99), 4) if latencies else None,
+        'json_parse_failure_rate': round(labels['JSON 파싱 실패'] / len(ok), 4) if ok else None,
+        'scaffolding': dict(labels),
+    }
+
+
+def replay(cases, revisions, model, workers, dry_run=False):
+    """revisions: [(라벨, 프롬프트 디렉토리)] → 라벨별 요약. 두 리비전의 호출을 섞어 같은 시간대에 실행합니다."""
+    built = {label: build_requests(cases, prompt_dir) for label, prompt_dir in revisions}
+    results = {label: [None] * len(cases) for label, _ in revisions}
+
+    if not dry_run:
+        def task(label, index):
+            results[label][index] = run_case(model, cases[index]['student_id'], built[label][1][index])
+            return label
+
+        jobs = [(label, i) for i in range(len(cases)) for label, _ in revisions]
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(lambda job: task(*job), jobs):
+                done += 1
+                if done % 50 == 0 or done == len(jobs):
+                    print(f"INFO: {done}/{len(jobs)} 호출 완료")
+
+    summary = {label: summarize(built[label][0], built[label][1], results[label], cases) for label, _ in revisions}
+    summary['recorded'] = {'scaffolding': dict(Counter(c['recorded_type'] for c in cases if c['recorded_type']))}
+    return summary
+
+
+# --- 출력 ---
+def print_report(summary, labels):
+    rows = [
+        ('prompt_version', 'prompt version'),
+        ('cases', 'cases'),
+        ('calls', 'calls'),
+        ('errors', 'errors'),
+        ('estimated_prompt_tokens_mean', 'est. input tokens (mean)'),
+        ('prompt_tokens_mean', 'input tokens (mean)'),
+        ('completion_tokens_mean', 'output tokens (mean)'),
+        ('prompt_tokens_total', 'input tokens (total)'),
+        ('completion_tokens_total', 'output tokens (total)'),
+        ('latency_p50', 'latency p50 (s)'),
+        ('latency_p95', 'latency p95 (s)'),
+        ('latency_p99', 'latency p99 (s)'),
+        ('json_parse_failure_rate', 'JSON parse failure rate'),
+    ]
+    header = f"{'':<28}" + "".join(f"{label:>18}" for label in labels)
+    print(header)
+    print('-' * len(header))
+    for field, title in rows:
+        print(f"{title:<28}" + "".join(f"{_cell(summary[label].get(field)):>18}" for label in labels))
+
+    columns = labels + ['recorded']
+    scaffolding_types = sorted({t for label in columns for t in summary[label]['scaffolding']})
+    print(f"\n{'scaffolding_type':<28}" + "".join(f"{label:>18}" for label in columns))
+    print('-' * (28 + 18 * len(columns)))
+    for s_type in scaffolding_types:
+        line = f"{s_type:<28}"
+        for label in columns:
+            counts = summary[label]['scaffolding']
+            total = sum(counts.values())
+            count = counts.get(s_type, 0)
+            line += f"{f'{count} ({count / total * 100:.1f}%)' if total else '-':>18}"
+        print(line)
+
+
+def _cell(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='기록된 대화로 두 프롬프트 리비전을 비교하는 리플레이 벤치마크')
+    parser.add_argument('paths', nargs='*', help='대화 로그 TXT 파일 또는 LOGS_DIR 형식 디렉토리')
+    parser.add_argument('--from-events', action='store_true', help='이벤트 저장소(EVENT_DB_PATH)의 대화도 사용')
+    parser.add_argument('--a', default='git:HEAD', help='기준 프롬프트 리비전 (디렉토리 또는 git:<리비전>, 기본값: git:HEAD)')
+    parser.add_argument('--b', default=config_utils.PROMPT_DIR, help='비교 프롬프트 리비전 (기본값: 현재 data/prompts)')
+    parser.add_argument('--model', default=config_utils.MODEL_NAME)
+    parser.add_argument('--workers', type=int, default=8, help='동시 호출 수')
+    parser.add_argument('--limit', type=int, default=None, help='리플레이할 최대 사용자 턴 수')
+    parser.add_argument('--dry-run', action='store_true', help='API를 호출하지 않고 입력 토큰 추정치만 비교')
+    parser.add_argument('--out', help='결과 JSON 저장 경로')
+    args = parser.parse_args()
+
+    cases = build_cases(load_transcripts(args.paths, args.from_events), args.limit)
+    if not cases:
+        print("🚨 ERROR: 리플레이할 사용자 턴이 없습니다.")
+        sys.exit(1)
+    if not args.dry_run and len(config_utils.KEY_POOL) == 0:
+        print("🚨 ERROR: API 키가 없습니다. (--dry-run으로 토큰 추정만 하거나 OPENAI_KEY_n을 설정하세요)")
+        sys.exit(1)
+    print(f"INFO: 사용자 턴 {len(cases)}개 × 프롬프트 리비전 2개 리플레이 (A={args.a}, B={args.b})")
+
+    with prompt_revision(args.a) as dir_a, prompt_revision(args.b) as dir_b:
+        summary = replay(cases, [('A', dir_a), ('B', dir_b)], args.model, args.workers, args.dry_run)
+
+    print()
+    print_report(summary, ['A', 'B'])
+    if args.out:
+        summary['config'] = {k: v for k, v in vars(args).items() if k != 'out'}
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"INFO: 결과 저장 → {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# scaffolding_counter.py
+
+import os
+import json
+import atexit
+import sqlite3
+import threading
+from collections import Counter
+
+# 🚩 워커 간 공유 스캐폴딩 카운터
+# 요청 스레드는 메모리의 증분(delta)만 올리고, 백그라운드 스레드가 flush_interval마다
+# SQLite에 원자적 upsert(count = count + delta)로 반영합니다. 여러 gunicorn 워커가 같은 DB 파일을
+# 공유하므로 JSON 읽기-수정-쓰기 경합으로 증가분이 사라지는 문제가 없습니다.
+# 기존 분석 흐름을 위해 반영 시점에 학생별 JSON 카운트 파일도 스냅샷으로 갱신합니다.
+# 도입 전부터 있던 JSON 카운트 파일은 그 학생을 처음 볼 때 DB에 시드하므로 기존 누적값이 0으로 덮어써지지 않습니다.
+# 시드는 학생마다 (모든 워커를 통틀어) 한 번만: 첫 증분과 같은 BEGIN IMMEDIATE 트랜잭션 안에서
+# scaffolding_seeded 표시 행을 INSERT OR IGNORE로 넣고, 새로 넣었을 때만 JSON을 읽습니다.
+# (이후 JSON은 DB 값의 스냅샷이므로 다시 시드하면 이중으로 세어짐)
+
+
+class ScaffoldingCounter:
+    """학생(카운트 파일 경로)별 스캐폴딩 유형 카운터"""
+
+    def __init__(self, db_path, count_types, flush_interval=2.0, export_json=True):
+        self.db_path = db_path
+        self.count_types = list(count_types)
+        self.flush_interval = flush_interval
+        self.export_json = export_json
+        self._pending = Counter()  # (count_path, s_type) -> delta
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._seeded = set()  # 이 프로세스에서 시드 여부를 이미 확인한 count_path (표시 행 조회 생략용)
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS scaffolding_counts (
+                count_path TEXT NOT NULL,
+                student TEXT NOT NULL,
+                scaffolding_type TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (count_path, scaffolding_type)
+            );
+            CREATE INDEX IF NOT EXISTS idx_scaffolding_counts_type ON scaffolding_counts (scaffolding_type);
+            CREATE TABLE IF NOT EXISTS scaffolding_seeded (
+                count_path TEXT PRIMARY KEY
+            );
+        """)
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_thread(self):
+        # fork 이후 워커마다 반영 스레드를 새로 시작
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pending = Counter()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='scaffolding-counter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"🚨🚨 CRITICAL COUNT WRITE FAIL: 카운트 반영 실패 ({e})")
+
+    def _seed(self, conn, count_paths):
+        """기존 [학번_이름].json 카운트를 DB에 넣습니다. (BEGIN IMMEDIATE 안에서 호출, 학생마다 처음 한 번만)"""
+        rows = []
+        for count_path in count_paths:
+            if count_path in self._seeded:
+                continue
+            if not conn.execute("INSERT OR IGNORE INTO scaffolding_seeded (count_path) VALUES (?)", (count_path,)).rowcount:
+                continue  # 다른 워커(또는 이전 실행)가 이미 시드함
+            for s_type, count in _load_legacy_counts(count_path).items():
+                rows.append((count_path, _student_label(count_path), s_type, count))
+        if rows:
+            conn.executemany(
+                """INSERT INTO scaffolding_counts (count_path, student, scaffolding_type, count)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (count_path, scaffolding_type) DO NOTHING""",
+                rows
+            )
+
+    def _ensure_seeded(self, count_path):
+        if count_path in self._seeded:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._seed(conn, [count_path])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._seeded.add(count_path)
+
+    # --- 요청 스레드 쪽 API ---
+    def increment(self, count_path, s_type):
+        """메모리 증분만 올립니다. (파일/DB I/O 없음)"""
+        self._ensure_thread()
+        with self._lock:
+            self._pending[(count_path, s_type)] += 1
+
+    def flush(self):
+        """메모리 증분을 DB에 원자적으로 더하고, 바뀐 학생의 JSON 스냅샷을 갱신합니다."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+            if not pending:
+                return
+
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                paths = {path for path, _ in pending}
+                self._seed(conn, paths)
+                conn.executemany(
+                    """INSERT INTO scaffolding_counts (count_path, student, scaffolding_type, count)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT (count_path, scaffolding_type) DO UPDATE SET count = count + excluded.count""",
+                    [(path, _student_label(path), s_type, delta) for (path, s_type), delta in pending.items()]
+                )
+                conn.execute("COMMIT")
+                self._seeded.update(paths)
+            except Exception:
+                conn.execute("ROLLBACK")
+                # 반영 실패 시 증분을 되돌려 다음 주기에 재시도
+                with self._lock:
+                    self._pending.update(pending)
+                raise
+
+            if self.export_json:
+                for count_path in paths:
+                    self._export_json(count_path)
+
+    def get_counts(self, count_path):
+        """학생 한 명의 유형별 카운트 (이 워커의 미반영 증분 포함). 기록이 없으면 None."""
+        self._ensure_seeded(count_path)
+        rows = self._connect().execute(
+            "SELECT scaffolding_type, count FROM scaffolding_counts WHERE count_path = ?",
+            (count_path,)
+        ).fetchall()
+        with self._lock:
+            local = {s_type: delta for (path, s_type), delta in self._pending.items() if path == count_path}
+        if not rows and not local:
+            return None
+
+        counts = {t: 0 for t in self.count_types}
+        for s_type, count in rows:
+            counts[s_type] = counts.get(s_type, 0) + count
+        for s_type, delta in local.items():
+            counts[s_type] = counts.get(s_type, 0) + delta
+        return counts
+
+    def get_class_totals(self):
+        """반 전체 유형별 합계와 학생별 카운트 (연구자용 실시간 현황)"""
+        conn = self._connect()
+        totals = {t: 0 for t in self.count_types}
+        for s_type, count in conn.execute(
+            "SELECT scaffolding_type, SUM(count) FROM scaffolding_counts GROUP BY scaffolding_type"
+        ):
+            totals[s_type] = count
+        students = {}
+        for student, s_type, count in conn.execute(
+            "SELECT student, scaffolding_type, count FROM scaffolding_counts ORDER BY student"
+        ):
+            students.setdefault(student, {t: 0 for t in self.count_types})[s_type] = count
+        return {"totals": totals, "students": students}
+
+    def _export_json(self, count_path):
+        counts = self.get_counts(count_path)
+        if counts is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(count_path), exist_ok=True)
+            tmp_path = f"{count_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(counts, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, count_path)
+        except Exception as e:
+            print(f"🚨🚨 CRITICAL COUNT WRITE FAIL: 카운트 파일 저장 실패: {count_path} ({e})")
+
+
+def _load_legacy_counts(count_path):
+    """기존 JSON 카운트 파일 → {유형: 횟수} (파일이 없거나 읽을 수 없으면 빈 dict)"""
+    if not os.path.exists(count_path):
+        return {}
+    try:
+        with open(count_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"🚨 WARNING: 기존 카운트 파일을 읽지 못해 0부터 셉니다: {count_path} ({e})")
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {s_type: count for s_type, count in data.items() if isinstance(count, int) and not isinstance(count, bool)}
+
+
+def _student_label(count_path):
+    """[학번_이름].json → '학번_이름'"""
+    return os.path.splitext(os.path.basename(count_path))[0]
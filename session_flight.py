@@ -0,0 +1,269 @@
+# session_flight.py
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+
+# 🚩 세션(대화)별 LLM 작업 직렬화 + 멱등 키
+# 같은 대화에 대해 동시에 들어온 요청(더블 클릭, 브라우저 재시도, 5분 재촉 타이머)이 각각 유료 호출을 하고
+# 서로의 대화 추가를 엇갈리게 만들지 않도록, 대화마다 한 번에 하나의 LLM 작업만 실행합니다.
+#   - 같은 Idempotency-Key로 다시 온 요청은 새로 호출하지 않고, 진행 중이면 기다렸다가 같은 결과를 받습니다.
+#   - 사용자 메시지는 앞선 사용자 메시지가 끝날 때까지 기다렸다가(대화 순서 보장) 실행합니다.
+#   - 재촉(nudge)은 다른 작업이 진행 중이면 바로 취소되고, 재촉 생성 중에 사용자 메시지가 오면 자리를 넘겨주고
+#     결과를 버립니다. (학생이 이미 말하고 있으면 재촉할 필요가 없음)
+# 여러 gunicorn 워커가 공유하도록 상태는 SQLite 파일에 두고, 워커가 죽어도 lease 시간이 지나면 잠금이 풀립니다.
+
+KIND_USER = 'user'
+KIND_NUDGE = 'nudge'
+
+
+class SessionBusyError(Exception):
+    """같은 대화의 앞선 요청이 wait_timeout 안에 끝나지 않음"""
+
+
+class SessionFlightControl:
+    """대화별 잠금(session_locks)과 멱등 키 결과(session_requests) 저장소"""
+
+    def __init__(self, db_path, lease=120.0, wait_timeout=60.0, result_ttl=600.0, poll_interval=0.1):
+        self.db_path = db_path
+        self.lease = lease                  # 잠금 최대 보유 시간 (워커 비정상 종료 대비, 호출 마감 시간보다 길게)
+        self.wait_timeout = wait_timeout    # 앞선 요청을 기다리는 최대 시간
+        self.result_ttl = result_ttl        # 멱등 키 결과 보관 시간
+        self.poll_interval = poll_interval
+        self.stats = {'replayed': 0, 'waited': 0, 'busy': 0, 'nudge_cancelled': 0, 'nudge_preempted': 0}
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS session_locks (
+                conversation_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS session_requests (
+                conversation_id TEXT NOT NULL,
+                request_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, request_key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_session_requests_updated ON session_requests (updated_at);
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flight(self, conversation_id, kind, request_key=None):
+        """with/async with 블록 하나 = 대화 하나에 대한 LLM 작업 하나"""
+        return SessionFlight(self, conversation_id, kind, request_key)
+
+    # --- 멱등 키 (한 번의 시도, DB 트랜잭션 하나) ---
+    def _try_begin(self, conversation_id, request_key):
+        """('leader', None) - 이 요청이 실행 / ('done', (status, payload)) - 저장된 결과 / ('pending', None) - 실행 중"""
+        now = time.time()
+
+        def begin(conn):
+            row = conn.execute(
+                "SELECT status, result, updated_at FROM session_requests WHERE conversation_id = ? AND request_key = ?",
+                (conversation_id, request_key)
+            ).fetchone()
+            if row is not None and row[0] == 'done' and now - row[2] < self.result_ttl:
+                return 'done', tuple(json.loads(row[1]))
+            if row is not None and row[0] == 'pending' and now - row[2] < self.lease:
+                return 'pending', None
+            conn.execute(
+                """INSERT OR REPLACE INTO session_requests (conversation_id, request_key, status, result, updated_at)
+                   VALUES (?, ?, 'pending', NULL, ?)""",
+                (conversation_id, request_key, now)
+            )
+            return 'leader', None
+
+        return self._transaction(begin)
+
+    def _complete(self, conversation_id, request_key, status_code, payload):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "UPDATE session_requests SET status = 'done', result = ?, updated_at = ? WHERE conversation_id = ? AND request_key = ?",
+            (json.dumps([status_code, payload], ensure_ascii=False), now, conversation_id, request_key)
+        )
+        conn.execute("DELETE FROM session_requests WHERE updated_at < ?", (now - self.result_ttl,))
+
+    def _abandon(self, conversation_id, request_key):
+        # 실패한 요청은 결과를 남기지 않음 → 같은 키로 재시도하면 다시 실행
+        self._connect().execute(
+            "DELETE FROM session_requests WHERE conversation_id = ? AND request_key = ? AND status = 'pending'",
+            (conversation_id, request_key)
+        )
+
+    # --- 대화별 잠금 (한 번의 시도) ---
+    def _try_acquire(self, conversation_id, kind, owner):
+        """'acquired' / 'busy'(사용자 메시지가 진행 중) / 'cancelled'(재촉인데 다른 작업이 진행 중)"""
+        now = time.time()
+
+        def acquire(conn):
+            row = conn.execute(
+                "SELECT kind, expires_at FROM session_locks WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+            free = row is None or row[1] < now
+            if not free and kind == KIND_NUDGE:
+                return 'cancelled'
+            if not free and not (kind == KIND_USER and row[0] == KIND_NUDGE):
+                return 'busy'
+            if not free:
+                self.stats['nudge_preempted'] += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO session_locks (conversation_id, owner, kind, expires_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, owner, kind, now + self.lease)
+            )
+            return 'acquired'
+
+        return self._transaction(acquire)
+
+    def _is_owner(self, conversation_id, owner):
+        row = self._connect().execute(
+            "SELECT owner FROM session_locks WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row is not None and row[0] == owner
+
+    def _release(self, conversation_id, owner):
+        self._connect().execute(
+            "DELETE FROM session_locks WHERE conversation_id = ? AND owner = ?", (conversation_id, owner)
+        )
+
+    def status(self):
+        now = time.time()
+        conn = self._connect()
+        (active,) = conn.execute("SELECT COUNT(*) FROM session_locks WHERE expires_at >= ?", (now,)).fetchone()
+        (stored,) = conn.execute("SELECT COUNT(*) FROM session_requests WHERE status = 'done'").fetchone()
+        return {'active_sessions': active, 'stored_results': stored, **self.stats}
+
+
+class SessionFlight:
+    """대화 하나에 대한 LLM 작업 하나 (잠금 + 멱등 키)
+
+    진입 후 replay가 있으면 같은 키의 이전(또는 동시에 진행된) 결과이므로 그대로 반환하고,
+    cancelled가 True이면 재촉을 보내지 않습니다. 정상 처리 후에는 complete(status_code, payload)로 결과를 저장합니다.
+    """
+
+    def __init__(self, control, conversation_id, kind, request_key=None):
+        self.control = control
+        self.conversation_id = conversation_id
+        self.kind = kind
+        self.request_key = request_key or None
+        self.owner = uuid.uuid4().hex
+        self.replay = None
+        self.cancelled = False
+        self._leader = False
+        self._locked = False
+        self._completed = False
+
+    # --- 진입 단계 (동기/비동기 공용, 한 번의 시도) ---
+    def _step(self):
+        """진입을 한 단계 진행합니다. 더 기다려야 하면 False."""
+        control = self.control
+        if self.request_key and not self._leader:
+            state, result = control._try_begin(self.conversation_id, self.request_key)
+            if state == 'done':
+                control.stats['replayed'] += 1
+                self.replay = result
+                return True
+            if state == 'pending':
+                return False
+            self._leader = True
+        outcome = control._try_acquire(self.conversation_id, self.kind, self.owner)
+        if outcome == 'cancelled':
+            control.stats['nudge_cancelled'] += 1
+            self.cancelled = True
+            self._abandon()
+            return True
+        if outcome == 'busy':
+            return False
+        self._locked = True
+        return True
+
+    def _timeout(self):
+        self.control.stats['busy'] += 1
+        self._abandon()
+        raise SessionBusyError(f"대화 {self.conversation_id[:8]}의 이전 요청이 {self.control.wait_timeout:.0f}초 안에 끝나지 않았습니다.")
+
+    def _abandon(self):
+        if self._leader and not self._completed:
+            self.control._abandon(self.conversation_id, self.request_key)
+            self._leader = False
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.control.wait_timeout
+        waited = False
+        while not self._step():
+            if time.monotonic() >= deadline:
+                self._timeout()
+            waited = True
+            time.sleep(self.control.poll_interval)
+        if waited:
+            self.control.stats['waited'] += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish()
+        return False
+
+    async def __aenter__(self):
+        deadline = time.monotonic() + self.control.wait_timeout
+        waited = False
+        while not await asyncio.to_thread(self._step):
+            if time.monotonic() >= deadline:
+                self._timeout()
+            waited = True
+            await asyncio.sleep(self.control.poll_interval)
+        if waited:
+            self.control.stats['waited'] += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.to_thread(self._finish)
+        return False
+
+    def _finish(self):
+        self._abandon()
+        if self._locked:
+            self.control._release(self.conversation_id, self.owner)
+            self._locked = False
+
+    # --- 블록 안에서 사용 ---
+    def still_owner(self):
+        """재촉 생성 중 사용자 메시지가 잠금을 가져갔으면 False (결과를 버려야 함)"""
+        return self.control._is_owner(self.conversation_id, self.owner)
+
+    def complete(self, status_code, payload):
+        """응답을 멱등 키 결과로 저장합니다. (같은 키로 다시 온 요청은 이 결과를 받음)"""
+        if self._leader and not self._completed:
+            self.control._complete(self.conversation_id, self.request_key, status_code, payload)
+        self._completed = True
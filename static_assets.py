@@ -0,0 +1,209 @@
+# static_assets.py
+#
+# 🚩 정적 파일(homepage/static) 지문(content hash) 빌드 + 사전 압축
+#   python static_assets.py            # 빌드 (앱 시작 시에도 원본이 바뀌었으면 자동으로 다시 빌드)
+#
+# css/chat_ui.css → css/chat_ui.<해시>.css 로 복사하고, CSS/JS 등 텍스트 파일은 .gz(와 brotli 설치 시 .br)를 미리 만들어 둡니다.
+# manifest.json에 원본 이름 → 지문 이름/ETag/압축본 목록을 기록하므로, 요청 처리 시에는 파일을 읽지 않고
+# url_for('static', ...) 이름 변환과 304 판단을 할 수 있습니다.
+# 지문 이름은 내용이 바뀌면 URL도 바뀌므로 1년 immutable 캐시로 보내고, 원본 이름 요청은 ETag 재검증(no-cache)으로 보냅니다.
+
+import os
+import sys
+import json
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+MANIFEST_FILENAME = 'manifest.json'
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.json', '.txt', '.map')
+COMPRESS_MIN_SIZE = 512
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+def _write_atomic(path, data):
+    # 워커 여러 개가 동시에 빌드해도 반쯤 쓴 파일을 내보내지 않도록 임시 파일 → rename
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def fingerprint_name(relpath, digest):
+    stem, ext = os.path.splitext(relpath)
+    return f"{stem}.{digest}{ext}"
+
+
+def choose_encoding(accept_encoding, available):
+    """Accept-Encoding과 미리 만든 압축본 중 보낼 인코딩 ('br' / 'gzip' / None)"""
+    accepted = set()
+    for part in (accept_encoding or '').lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip())
+    for coding in ('br', 'gzip'):
+        if coding in available and coding in accepted:
+            return coding
+    return None
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 헤더가 현재 ETag(또는 *)와 일치하면 True (304 응답 대상)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in tags or f"W/{etag}" in tags or '*' in tags
+
+
+class StaticAssets:
+    """정적 파일 빌드 결과(manifest) 조회. 처음 사용할 때 원본 목록의 크기/mtime을 비교해 필요하면 다시 빌드합니다."""
+
+    def __init__(self, static_dir, build_dir, enabled=True):
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.enabled = enabled
+        self._files = None    # 원본 상대 경로 → 항목
+        self._hashed = None   # 지문 상대 경로 → 항목
+        self._lock = threading.Lock()
+
+    def _iter_sources(self):
+        for root, dirs, files in os.walk(self.static_dir):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, self.static_dir).replace(os.sep, '/'), path
+
+    def _source_signature(self):
+        digest = hashlib.sha1()
+        for relpath, path in self._iter_sources():
+            stat = os.stat(path)
+            digest.update(f"{relpath}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+        digest.update(b"br" if BROTLI_AVAILABLE else b"")
+        return digest.hexdigest()
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.build_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def build(self):
+        """모든 정적 파일의 지문 사본과 압축본을 만들고 manifest를 기록합니다."""
+        signature = self._source_signature()
+        files = {}
+        for relpath, path in self._iter_sources():
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = fingerprint_name(relpath, digest)
+            target = os.path.join(self.build_dir, hashed)
+            if not os.path.exists(target):
+                _write_atomic(target, data)
+
+            encodings = {}
+            if relpath.lower().endswith(COMPRESSIBLE_EXTENSIONS) and len(data) >= COMPRESS_MIN_SIZE:
+                # mtime=0: 같은 내용이면 같은 .gz (빌드를 반복해도 바이트가 바뀌지 않음)
+                compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+                if BROTLI_AVAILABLE:
+                    compressed['br'] = brotli.compress(data, quality=11)
+                for coding, body in compressed.items():
+                    if len(body) < len(data):
+                        suffix = '.br' if coding == 'br' else '.gz'
+                        if not os.path.exists(target + suffix):
+                            _write_atomic(target + suffix, body)
+                        encodings[coding] = len(body)
+
+            files[relpath] = {'hashed': hashed, 'digest': digest, 'size': len(data), 'encodings': encodings}
+
+        self._prune({entry['hashed'] for entry in files.values()})
+        manifest = {'signature': signature, 'files': files}
+        _write_atomic(os.path.join(self.build_dir, MANIFEST_FILENAME),
+                      json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+        print(f"INFO: 정적 파일 빌드 완료 ({len(files)}개, brotli {'사용' if BROTLI_AVAILABLE else '미설치'}) → {self.build_dir}")
+        return manifest
+
+    def _prune(self, keep):
+        # 이전 빌드의 지문 사본/압축본 정리 (다른 워커가 쓰는 중인 .tmp 파일은 건드리지 않음)
+        for root, _, files in os.walk(self.build_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                relpath = os.path.relpath(path, self.build_dir).replace(os.sep, '/')
+                base = relpath[:-3] if relpath.endswith(('.gz', '.br')) else relpath
+                if relpath == MANIFEST_FILENAME or filename.endswith('.tmp') or base in keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _ensure_loaded(self):
+        if self._files is not None:
+            return
+        with self._lock:
+            if self._files is not None:
+                return
+            files = {}
+            if self.enabled:
+                try:
+                    manifest = self._load_manifest()
+                    if manifest is None or manifest.get('signature') != self._source_signature():
+                        manifest = self.build()
+                    files = manifest['files']
+                except OSError as e:
+                    # 빌드 디렉토리에 쓸 수 없으면 지문 없이 원본 이름으로 서비스
+                    print(f"🚨 WARNING: 정적 파일 빌드 실패 - 원본 파일을 그대로 제공합니다. ({e})")
+            self._hashed = {entry['hashed']: dict(entry, source=relpath) for relpath, entry in files.items()}
+            self._files = {relpath: dict(entry, source=relpath) for relpath, entry in files.items()}
+
+    def preload(self):
+        self._ensure_loaded()
+
+    def url_name(self, filename):
+        """url_for('static', filename=...)에 쓸 이름 (빌드된 파일이면 지문 이름)"""
+        self._ensure_loaded()
+        entry = self._files.get(filename)
+        return entry['hashed'] if entry else filename
+
+    def lookup(self, filename):
+        """요청 경로 → (항목, immutable 여부). 빌드에 없는 파일이면 (None, False)"""
+        self._ensure_loaded()
+        entry = self._hashed.get(filename)
+        if entry is not None:
+            return entry, True
+        entry = self._files.get(filename)
+        return entry, False
+
+    def file_path(self, entry, encoding=None):
+        path = os.path.join(self.build_dir, entry['hashed'])
+        if encoding == 'br':
+            return path + '.br'
+        if encoding == 'gzip':
+            return path + '.gz'
+        return path
+
+    @staticmethod
+    def etag(entry, encoding=None):
+        return f'"{entry["digest"]}-{encoding}"' if encoding else f'"{entry["digest"]}"'
+
+
+if __name__ == '__main__':
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    static_dir = os.path.join(base_dir, 'homepage', 'static')
+    build_dir = os.getenv('STATIC_BUILD_DIR', os.path.join(base_dir, 'homepage', 'static_build'))
+    if not os.path.isdir(static_dir):
+        print(f"🚨 ERROR: 정적 파일 디렉토리가 없습니다: {static_dir}")
+        sys.exit(1)
+    StaticAssets(static_dir, build_dir).build()
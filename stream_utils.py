@@ -0,0 +1,109 @@
+# stream_utils.py
+
+import json
+import re
+
+# 🚩 스트리밍 응답(JSON 조각)에서 "response_text" 값만 점진적으로 추출하기 위한 유틸리티
+RESPONSE_TEXT_KEY_PATTERN = re.compile(r'"response_text"\s*:\s*"')
+
+_SIMPLE_ESCAPES = {
+    '"': '"', '\\': '\\', '/': '/',
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t',
+}
+
+
+def _parse_hex4(digits):
+    """\\uXXXX의 16진수 4자리 → 코드 값 (형식이 틀리면 None)"""
+    if len(digits) != 4 or not all(c in '0123456789abcdefABCDEF' for c in digits):
+        return None
+    return int(digits, 16)
+
+
+class ResponseTextExtractor:
+    """모델이 스트리밍으로 보내는 JSON 조각을 누적하며 response_text 문자열 값을 순차적으로 디코딩합니다.
+
+    feed()는 이번 조각으로 새로 확정된 텍스트만 반환하므로, 그대로 클라이언트에 전송하면 됩니다.
+    이스케이프 시퀀스가 조각 경계에서 잘린 경우에는 다음 조각이 올 때까지 기다립니다.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.value_start = None  # response_text 값이 시작되는 buffer 인덱스
+        self.pos = 0             # 다음에 디코딩할 buffer 인덱스
+        self.done = False        # 닫는 따옴표를 만났는지 여부
+        self.text = ""           # 지금까지 디코딩된 response_text
+
+    def feed(self, chunk):
+        if not chunk:
+            return ""
+        self.buffer += chunk
+        if self.done:
+            return ""
+
+        if self.value_start is None:
+            match = RESPONSE_TEXT_KEY_PATTERN.search(self.buffer)
+            if not match:
+                return ""
+            self.value_start = self.pos = match.end()
+
+        decoded = []
+        buf = self.buffer
+        while self.pos < len(buf):
+            ch = buf[self.pos]
+            if ch == '"':
+                self.done = True
+                self.pos += 1
+                break
+            if ch != '\\':
+                decoded.append(ch)
+                self.pos += 1
+                continue
+
+            # 이스케이프 시퀀스 처리 (불완전하면 다음 조각을 기다림)
+            if self.pos + 1 >= len(buf):
+                break
+            esc = buf[self.pos + 1]
+            if esc in _SIMPLE_ESCAPES:
+                decoded.append(_SIMPLE_ESCAPES[esc])
+                self.pos += 2
+                continue
+            if esc != 'u':
+                # 잘못된 이스케이프는 원문(백슬래시 포함) 그대로 보존
+                decoded.append('\\' + esc)
+                self.pos += 2
+                continue
+            if self.pos + 6 > len(buf):
+                break
+            code = _parse_hex4(buf[self.pos + 2:self.pos + 6])
+            if code is None:
+                decoded.append('\\' + esc)
+                self.pos += 2
+                continue
+            if 0xD800 <= code <= 0xDBFF:
+                # 서로게이트 쌍은 하위 서로게이트까지 도착해야 디코딩 가능
+                following = buf[self.pos + 6:self.pos + 8]
+                if len(following) < 2 and '\\u'.startswith(following):
+                    break
+                if following == '\\u':
+                    if self.pos + 12 > len(buf):
+                        break
+                    low = _parse_hex4(buf[self.pos + 8:self.pos + 12])
+                    if low is not None and 0xDC00 <= low <= 0xDFFF:
+                        decoded.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        self.pos += 12
+                        continue
+            if 0xD800 <= code <= 0xDFFF:
+                # 짝이 없는 서로게이트는 UTF-8로 인코딩할 수 없으므로 대체 문자로 보냄
+                decoded.append('\ufffd')
+            else:
+                decoded.append(chr(code))
+            self.pos += 6
+
+        new_text = "".join(decoded)
+        self.text += new_text
+        return new_text
+
+
+def format_sse(event_data):
+    """딕셔너리를 Server-Sent Events 한 건(data: ...\\n\\n)으로 직렬화합니다."""
+    return f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
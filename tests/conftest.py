@@ -0,0 +1,9 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# 루트의 평면 모듈(stream_utils.py 등)을 어느 디렉토리에서 pytest를 실행해도 임포트할 수 있도록
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
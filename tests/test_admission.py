@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+
+from admission import KIND_PRIORITY, AdmissionController, AdmissionRejected, _fair_order
+
+USER, NUDGE, PREFETCH = KIND_PRIORITY['user'], KIND_PRIORITY['nudge'], KIND_PRIORITY['prefetch']
+
+
+def waiting(ticket, student_id, priority, enqueued_at):
+    return (ticket, student_id, priority, 'waiting', enqueued_at)
+
+
+def running(ticket, student_id, priority=USER):
+    return (ticket, student_id, priority, 'running', 0.0)
+
+
+def order(rows, last_admitted=None):
+    return [row[0] for row in _fair_order(rows, last_admitted or {})]
+
+
+def test_fair_order_user_messages_before_nudges_and_prefetch():
+    rows = [waiting('p', 'A', PREFETCH, 1), waiting('n', 'B', NUDGE, 2), waiting('u', 'C', USER, 3)]
+    assert order(rows) == ['u', 'n', 'p']
+
+
+def test_fair_order_alternates_students_with_several_waiting():
+    rows = [waiting('a1', 'A', USER, 1), waiting('a2', 'A', USER, 2), waiting('a3', 'A', USER, 3),
+            waiting('b1', 'B', USER, 4), waiting('c1', 'C', USER, 5)]
+    assert order(rows) == ['a1', 'b1', 'c1', 'a2', 'a3']
+
+
+def test_fair_order_student_with_running_request_waits_behind_others():
+    rows = [running('r', 'A'), waiting('a1', 'A', USER, 1), waiting('b1', 'B', USER, 2)]
+    assert order(rows) == ['b1', 'a1']
+
+
+def test_fair_order_least_recently_admitted_student_first_then_arrival():
+    rows = [waiting('a1', 'A', USER, 1), waiting('b1', 'B', USER, 2), waiting('c1', 'C', USER, 3)]
+    assert order(rows, {'A': 200.0, 'B': 100.0}) == ['c1', 'b1', 'a1']
+
+
+def make_controller(tmp_path, **kwargs):
+    options = dict(max_concurrent=1, max_queue=5, queue_timeout=5.0, nudge_queue_timeout=5.0,
+                   poll_interval=0.01, max_poll_interval=0.05)
+    options.update(kwargs)
+    return AdmissionController(str(tmp_path / 'admission.db'), **options)
+
+
+def test_step_admits_until_full_then_reports_position(tmp_path):
+    controller = make_controller(tmp_path)
+    first = controller.ticket('A', 'user')
+    second = controller.ticket('B', 'user')
+    third = controller.ticket('C', 'user')
+    assert first._step() is None
+    assert second._step() == 1
+    assert third._step() == 2
+    first.release()
+    assert second._step() is None
+    assert third._step() == 1
+    assert controller.stats['admitted'] + controller.stats['queued'] == 2
+
+
+def test_step_prefers_user_message_over_earlier_nudge(tmp_path):
+    controller = make_controller(tmp_path)
+    holder = controller.ticket('A', 'user')
+    holder._step()
+    nudge = controller.ticket('B', 'nudge')
+    user = controller.ticket('C', 'user')
+    assert nudge._step() == 1
+    assert user._step() == 1  # 나중에 왔지만 재촉보다 앞
+    assert nudge._step() == 2
+    holder.release()
+    assert user._step() is None
+    assert nudge._step() == 1
+
+
+def test_step_sheds_when_queue_is_full(tmp_path):
+    controller = make_controller(tmp_path, max_queue=1)
+    controller.ticket('A', 'user')._step()
+    controller.ticket('B', 'user')._step()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.ticket('C', 'user')._step()
+    assert rejected.value.retry_after >= 1
+    assert controller.stats['shed_full'] == 1
+
+
+def test_step_sheds_after_queue_timeout_and_frees_the_queue_slot(tmp_path):
+    controller = make_controller(tmp_path, nudge_queue_timeout=0.05)
+    controller.ticket('A', 'user')._step()
+    nudge = controller.ticket('B', 'nudge')
+    with pytest.raises(AdmissionRejected):
+        for _ in nudge.wait_positions():
+            pass
+    assert controller.stats['shed_timeout'] == 1
+    assert not controller.has_waiting()
+
+
+def test_step_without_changes_does_not_rerank_and_backs_off(tmp_path, monkeypatch):
+    controller = make_controller(tmp_path, max_poll_interval=10.0)
+    controller.ticket('A', 'user')._step()
+    waiter = controller.ticket('B', 'user')
+    assert waiter._step() == 1
+    calls = []
+    original = controller._try_admit
+    monkeypatch.setattr(controller, '_try_admit', lambda *args: calls.append(args) or original(*args))
+    delays = []
+    for _ in range(4):
+        assert waiter._step() == 1
+        delays.append(waiter.delay)
+    assert calls == []
+    assert delays == sorted(delays) and delays[-1] > delays[0]
+
+
+def test_release_wakes_local_waiter_before_backoff_ends(tmp_path):
+    controller = make_controller(tmp_path, poll_interval=0.5, max_poll_interval=2.0)
+    holder = controller.ticket('A', 'user')
+    holder._step()
+    admitted = threading.Event()
+
+    def wait_for_turn():
+        with controller.ticket('B', 'user'):
+            admitted.set()
+
+    thread = threading.Thread(target=wait_for_turn)
+    thread.start()
+    time.sleep(1.0)  # 대기 간격이 늘어난 상태
+    released_at = time.monotonic()
+    holder.release()
+    assert admitted.wait(5)
+    assert time.monotonic() - released_at < 0.4
+    thread.join()
+
+
+def test_waiting_longer_than_heartbeat_timeout_keeps_place_in_queue(tmp_path):
+    controller = make_controller(tmp_path, heartbeat_timeout=0.3, poll_interval=0.02, max_poll_interval=0.05)
+    controller.ticket('A', 'user')._step()
+    waiter = controller.ticket('B', 'user')
+    assert waiter._step() == 1
+    conn = controller._connect()
+    query = "SELECT enqueued_at FROM admission_tickets WHERE ticket = ?"
+    (enqueued_at,) = conn.execute(query, (waiter.ticket,)).fetchone()
+    deadline = time.monotonic() + 1.0  # heartbeat_timeout의 세 배 이상
+    while time.monotonic() < deadline:
+        assert waiter._step() == 1
+        assert controller.has_waiting()
+        time.sleep(waiter.delay)
+    assert conn.execute(query, (waiter.ticket,)).fetchone() == (enqueued_at,)
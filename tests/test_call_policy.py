@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import fake_openai_server
+from call_policy import CallPolicy, is_retryable
+from key_pool import KeyPool
+
+MESSAGES = [{'role': 'user', 'content': '안녕'}]
+
+
+class ScriptedState(fake_openai_server.FakeOpenAIState):
+    """요청 순서대로 정해 둔 지연 시간을 쓰는 가짜 서버 상태 (이후로는 마지막 값 반복)"""
+
+    def __init__(self, args, latencies):
+        super().__init__(args)
+        self.latencies = list(latencies)
+
+    def sample_latency(self):
+        with self._lock:
+            return self.latencies.pop(0) if len(self.latencies) > 1 else self.latencies[0]
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    servers = []
+
+    def start(latencies=(0.01,), rpm_per_key=0):
+        args = argparse.Namespace(latency_median=0.01, latency_sigma=0.0, ttft_fraction=0.3, chunk_chars=6,
+                                  rpm_per_key=rpm_per_key, rate_limit_rate=0.0, error_rate=0.0, malformed_rate=0.0)
+        handler = type('Handler', (fake_openai_server.Handler,), {'state': ScriptedState(args, latencies)})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv('OPENAI_BASE_URL', f"http://127.0.0.1:{server.server_address[1]}/v1")
+        return handler.state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_policy(**kwargs):
+    pool = KeyPool({1: 'fake-1', 2: 'fake-2'})
+    options = dict(deadlines={'response': 10.0}, backoff_base=0.01, hedge=False)
+    options.update(kwargs)
+    return CallPolicy(pool, **options)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize('status, expected', [
+    (401, True), (408, True), (429, True), (500, True), (503, True),
+    (400, False), (403, False), (404, False), (409, False), (422, False),
+])
+def test_is_retryable(status, expected):
+    assert is_retryable(StatusError(status)) is expected
+
+
+def test_rate_limited_call_retries_on_other_key(fake_server):
+    state = fake_server(rpm_per_key=1)
+    policy = make_policy()
+    assert policy.call('response', 's1', model='gpt-4o', messages=MESSAGES).choices[0].message.content
+    # 같은 학생은 같은 키로 가서 429 → 그 키를 쉬게 하고 다른 키로 재시도
+    assert policy.call('response', 's1', model='gpt-4o', messages=MESSAGES).choices[0].message.content
+    assert policy.stats['retries'] == 1
+    assert state.stats['rate_limited'] == 1
+    assert policy.pool.keys[1].cooldown_reason == 'rate_limit'
+    assert policy.pool.affinity['s1'] == 2
+
+
+def test_slow_call_is_hedged_on_other_key(fake_server):
+    state = fake_server(latencies=(2.0, 0.01))
+    policy = make_policy(hedge=True, hedge_default_delay=0.2, hedge_min_delay=0.2)
+    result = policy.call('response', 's1', model='gpt-4o', messages=MESSAGES)
+    assert result.choices[0].message.content
+    assert policy.stats['hedges'] == 1
+    assert policy.stats['hedge_wins'] == 1
+    assert state.stats['requests'] == 2
+
+
+def test_hedge_is_skipped_when_admission_queue_is_waiting(fake_server):
+    state = fake_server(latencies=(0.5, 0.01))
+    policy = make_policy(hedge=True, hedge_default_delay=0.1, hedge_min_delay=0.1, hedge_allowed=lambda: False)
+    policy.call('response', 's1', model='gpt-4o', messages=MESSAGES)
+    assert policy.stats['hedges'] == 0
+    assert policy.stats['hedges_skipped'] == 1
+    assert state.stats['requests'] == 1
+
+
+def test_async_hedge_cancels_slow_call(fake_server):
+    fake_server(latencies=(2.0, 0.01))
+    policy = make_policy(hedge=True, hedge_default_delay=0.2, hedge_min_delay=0.2)
+    result = asyncio.run(policy.acall('response', 's1', model='gpt-4o', messages=MESSAGES))
+    assert result.choices[0].message.content
+    assert policy.stats['hedge_wins'] == 1
+    assert all(key.in_flight == 0 for key in policy.pool.keys.values())
+
+
+def test_hedge_cancelled_before_start_returns_its_key():
+    policy = make_policy()
+    blocker = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.submit(blocker.wait)  # 스레드 풀이 다른 작업으로 꽉 참
+    lease = policy.pool.acquire('s1')
+    try:
+        future = policy._submit(executor, 'response', 's1', lease, {'messages': MESSAGES}, deadline=time.monotonic() + 5)
+        assert future.cancel()
+    finally:
+        blocker.set()
+        executor.shutdown()
+    assert policy.pool.keys[lease.key_number].in_flight == 0
+    assert policy.pool.keys[lease.key_number].stats['success'] == 0
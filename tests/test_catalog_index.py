@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from catalog_index import BM25Index, CatalogIndex, query_tokens, tokenize
+
+TOOLS_MD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'prompts', 'ai_edutech_tools.md')
+
+
+@pytest.fixture(scope='module')
+def tools():
+    with open(TOOLS_MD, encoding='utf-8') as f:
+        return CatalogIndex(f.read(), name_column=1, group_column=0)
+
+
+def names(index, query, k=8):
+    cells = dict(index.rows)
+    return [cells[line][1].replace('\\', '') for line in index.search(query, k)]
+
+
+def test_bm25_ranks_rarer_and_repeated_terms_higher():
+    index = BM25Index([tokenize('quiz game'), tokenize('quiz quiz poll'), tokenize('drawing board')])
+    hits = index.search(tokenize('quiz poll'), 3)
+    assert [doc_id for doc_id, _ in hits] == [1, 0]
+
+
+def test_korean_alias_finds_english_tool_name(tools):
+    assert 'Padlet' in names(tools, '패들렛 띵커벨 퀴즈 도구 추천')
+    assert 'Kahoot!' in names(tools, '카훗 같은 실시간 퀴즈 도구')
+    assert 'Scratch' in names(tools, '코딩 교육용 스크래치')
+
+
+def test_generic_words_do_not_match_anything(tools):
+    assert query_tokens('도구 추천 사이트') == []
+    assert tools.search('도구 추천해 주세요', 8) == []
+
+
+def test_weak_matches_are_not_padded_to_k(tools):
+    assert len(tools.search('패들렛 띵커벨 퀴즈 도구 추천', 8)) < 8
+
+
+def test_group_summary_counts_every_row(tools):
+    summary = tools.group_summary()
+    assert sum(int(line.rsplit('(', 1)[1].rstrip('개)')) for line in summary.splitlines()) == len(tools.rows)
+
+
+def test_short_alias_inside_another_word_is_not_expanded(tools):
+    assert 'zoom' not in query_tokens('네 알려줌')
+    assert 'kami' not in query_tokens('우리카미')
+    assert 'Zoom' not in names(tools, '네 알려줌')
+    assert 'zoom' in query_tokens('줌으로 수업하기')
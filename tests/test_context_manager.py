@@ -0,0 +1,151 @@
+# tests/test_context_manager.py
+
+from context_manager import ContextWindowManager, estimate_tokens, estimate_message_tokens
+
+SYSTEM = {"role": "system", "content": "시스템 프롬프트"}
+NUDGE = {"role": "user", "content": "재촉 지시"}
+
+
+def conversation(count, length=200):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i}번 메시지 " + "가" * length}
+        for i in range(count)
+    ]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("한글") == 2
+    assert estimate_message_tokens([{"content": "abcd"}, {"content": ""}]) == 1 + 4 + 4
+
+
+def test_under_budget_is_unchanged():
+    manager = ContextWindowManager(token_budget=10000, keep_last_messages=4)
+    history = conversation(6, length=10)
+    messages, stats = manager.fit([SYSTEM], history)
+    assert messages == [SYSTEM] + history
+    assert stats["tokens_saved"] == 0
+    assert stats["truncated_messages"] == 0
+
+
+def test_over_budget_truncates_older_messages_within_budget():
+    manager = ContextWindowManager(token_budget=1500, keep_last_messages=4, excerpt_line_chars=20)
+    history = conversation(20)
+    messages, stats = manager.fit([SYSTEM], history)
+
+    assert messages[0] == SYSTEM
+    assert messages[-4:] == history[-4:]
+    excerpt = messages[1]["content"]
+    assert messages[1]["role"] == "system" and excerpt.startswith("# 이전 대화 발췌")
+    assert "- 사용자: 0번 메시지 " + "가" * 13 + "…" in excerpt
+    assert stats["truncated_messages"] == 16
+    assert stats["sent_tokens"] == estimate_message_tokens(messages) <= 1500
+    assert stats["tokens_saved"] == stats["original_tokens"] - stats["sent_tokens"] > 0
+
+
+def test_oldest_lines_are_dropped_when_excerpt_still_exceeds_budget():
+    manager = ContextWindowManager(token_budget=1500, keep_last_messages=4, excerpt_line_chars=200)
+    history = conversation(20)
+    messages, stats = manager.fit([SYSTEM], history)
+    excerpt = messages[1]["content"]
+    assert "더 이전의 대화" in excerpt
+    assert "15번 메시지" in excerpt and "- 사용자: 0번 메시지" not in excerpt
+    assert stats["sent_tokens"] <= 1500
+
+
+def test_instruction_messages_stay_next_to_history():
+    manager = ContextWindowManager(token_budget=1000, keep_last_messages=4)
+    history = conversation(20)
+    messages, _ = manager.fit([SYSTEM, NUDGE], history)
+    assert messages[0] == SYSTEM
+    assert messages[1]["content"].startswith("# 이전 대화 발췌")
+    assert messages[2] == NUDGE
+    assert messages[3:] == history[-4:]
+
+
+def test_cached_lines_extend_incrementally():
+    manager = ContextWindowManager(token_budget=1000, keep_last_messages=4)
+    history = conversation(20)
+    first, _ = manager.fit([SYSTEM], history[:18], cache_key="c")
+    second, _ = manager.fit([SYSTEM], history, cache_key="c")
+    uncached, _ = manager.fit([SYSTEM], history)
+    assert second == uncached
+    assert len(manager._line_cache["c"]) == 16
+    assert first != second
+
+
+class RecordingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, previous, messages):
+        self.calls.append((previous, len(messages)))
+        return f"요약({len(self.calls)})"
+
+
+def wait_for_summary(manager, cache_key):
+    future = manager._pending.get(cache_key)
+    if future is not None:
+        future.result(timeout=5)
+
+
+def test_rolling_summary_replaces_folded_messages_once_ready():
+    summarizer = RecordingSummarizer()
+    manager = ContextWindowManager(token_budget=1500, keep_last_messages=4, summarizer=summarizer)
+    history = conversation(20)
+    first, stats = manager.fit([SYSTEM], history, cache_key="c")
+    assert first[1]["content"].startswith("# 이전 대화 발췌")  # 요약은 백그라운드에서 생성 중
+    assert stats["summarized_messages"] == 0
+    wait_for_summary(manager, "c")
+
+    messages, stats = manager.fit([SYSTEM], history, cache_key="c")
+    assert messages[1]["content"] == "# 이전 대화 요약\n요약(1)"
+    assert messages[2:] == history[-4:]
+    assert stats["summarized_messages"] == 16
+    assert summarizer.calls == [(None, 16)]
+
+
+def test_rolling_summary_extends_incrementally_with_new_folded_messages():
+    summarizer = RecordingSummarizer()
+    manager = ContextWindowManager(token_budget=1500, keep_last_messages=4, summarizer=summarizer, summary_min_messages=4)
+    history = conversation(26)
+    manager.fit([SYSTEM], history[:20], cache_key="c")
+    wait_for_summary(manager, "c")
+
+    messages, stats = manager.fit([SYSTEM], history[:22], cache_key="c")
+    assert "# 이전 대화 요약\n요약(1)" in messages[1]["content"]
+    assert "- 사용자: 16번 메시지" in messages[1]["content"]  # 요약 이후에 접힌 메시지는 발췌
+    assert "c" not in manager._pending  # 새로 접힌 메시지가 2개뿐이면 요약을 다시 만들지 않음
+
+    manager.fit([SYSTEM], history, cache_key="c")
+    wait_for_summary(manager, "c")
+    assert summarizer.calls == [(None, 16), ("요약(1)", 6)]
+    messages, stats = manager.fit([SYSTEM], history, cache_key="c")
+    assert messages[1]["content"] == "# 이전 대화 요약\n요약(2)"
+    assert stats["summarized_messages"] == 22
+
+
+def test_summary_is_not_reused_when_the_summarized_prefix_changed():
+    manager = ContextWindowManager(token_budget=1500, keep_last_messages=4, summarizer=RecordingSummarizer())
+    history = conversation(20)
+    manager.fit([SYSTEM], history, cache_key="c")
+    wait_for_summary(manager, "c")
+    edited = [{"role": "user", "content": "다른 대화"}] + history[1:]
+    messages, stats = manager.fit([SYSTEM], edited, cache_key="c")
+    assert stats["summarized_messages"] == 0
+    assert messages[1]["content"].startswith("# 이전 대화 발췌")
+
+
+def test_failed_summary_falls_back_to_excerpt():
+    def failing(previous, messages):
+        raise RuntimeError("boom")
+
+    manager = ContextWindowManager(token_budget=1500, keep_last_messages=4, summarizer=failing)
+    history = conversation(20)
+    manager.fit([SYSTEM], history, cache_key="c")
+    wait_for_summary(manager, "c")
+    messages, _ = manager.fit([SYSTEM], history, cache_key="c")
+    assert messages[1]["content"].startswith("# 이전 대화 발췌")
+    assert manager.stats["summary_failures"] >= 1
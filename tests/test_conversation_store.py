@@ -0,0 +1,70 @@
+# tests/test_conversation_store.py
+
+import pytest
+
+from conversation_store import MemoryConversationStore, SQLiteConversationStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryConversationStore()
+    return SQLiteConversationStore(str(tmp_path / 'conversations.db'))
+
+
+def fill(store, session_id, count):
+    last = 0
+    for i in range(count):
+        last = store.append(session_id, {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'm{i + 1}'})
+    return last
+
+
+def seqs(page):
+    messages, _ = page
+    return [m['seq'] for m in messages]
+
+
+def test_append_returns_last_seq_and_get_keeps_order(store):
+    assert store.append('s', {'role': 'user', 'content': 'a'}, {'role': 'assistant', 'content': 'b'}) == 2
+    assert store.append('s', {'role': 'assistant', 'content': 'c'}) == 3
+    assert [m['content'] for m in store.get('s')] == ['a', 'b', 'c']
+    assert store.get('other') == []
+
+
+def test_latest_page_and_before_cursor(store):
+    fill(store, 's', 7)
+    messages, has_older = store.page('s', limit=3)
+    assert [m['seq'] for m in messages] == [5, 6, 7]
+    assert [m['content'] for m in messages] == ['m5', 'm6', 'm7']
+    assert has_older
+
+    assert seqs(store.page('s', before=5, limit=3)) == [2, 3, 4]
+    messages, has_older = store.page('s', before=2, limit=3)
+    assert [m['seq'] for m in messages] == [1]
+    assert not has_older
+    assert seqs(store.page('s', before=1, limit=3)) == []
+
+
+def test_after_cursor_reports_newer_messages(store):
+    fill(store, 's', 5)
+    messages, has_newer = store.page('s', after=1, limit=3)
+    assert [m['seq'] for m in messages] == [2, 3, 4]
+    assert has_newer
+    messages, has_newer = store.page('s', after=4, limit=3)
+    assert [m['seq'] for m in messages] == [5]
+    assert not has_newer
+    assert store.page('s', after=5, limit=3) == ([], False)
+
+
+def test_exact_limit_has_no_more(store):
+    fill(store, 's', 3)
+    assert store.page('s', limit=3)[1] is False
+    assert store.page('s', after=0, limit=3)[1] is False
+
+
+def test_delete_and_sessions_are_isolated(store):
+    fill(store, 'a', 2)
+    fill(store, 'b', 3)
+    store.delete('a')
+    assert store.get('a') == []
+    assert seqs(store.page('b', limit=10)) == [1, 2, 3]
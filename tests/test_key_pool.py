@@ -0,0 +1,82 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from key_pool import KeyPool
+
+
+class FakeError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def make_pool(**kwargs):
+    return KeyPool({1: 'sk-test-0001', 2: 'sk-test-0002', 3: 'sk-test-0003'}, **kwargs)
+
+
+def test_student_sticks_to_previous_key():
+    pool = make_pool()
+    first = pool.acquire('s1')
+    first.release()
+    second = pool.acquire('s1')
+    assert second.key_number == first.key_number
+
+
+def test_affinity_yields_to_less_loaded_key_beyond_slack():
+    pool = make_pool(sticky_slack=1)
+    pool.assign_home_keys(['s1'])
+    held = [pool.acquire('other', exclude=(2, 3)) for _ in range(2)]  # 1번 키에 2개 진행 중
+    assert all(lease.key_number == 1 for lease in held)
+    lease = pool.acquire('s1')
+    assert lease.key_number != 1
+    assert pool.affinity['s1'] == lease.key_number
+
+
+def test_rate_limited_key_cools_down_for_retry_after():
+    pool = make_pool()
+    lease = pool.acquire('s1')
+    lease.release(FakeError(429, {'retry-after': '30'}))
+    state = pool.keys[lease.key_number]
+    assert state.cooldown_reason == 'rate_limit'
+    assert 29 <= state.cooldown_until - time.monotonic() <= 30
+    assert pool.acquire('s1').key_number != lease.key_number
+
+
+def test_consecutive_429_backs_off_exponentially():
+    pool = make_pool(cooldown=10.0, max_cooldown=25.0)
+    key = pool.keys[1]
+    for expected in (10.0, 20.0, 25.0):
+        key.cooldown_until = 0.0
+        lease = pool.acquire(exclude=(2, 3))
+        lease.release(FakeError(429))
+        remaining = key.cooldown_until - time.monotonic()
+        assert expected - 1 <= remaining <= expected
+
+
+def test_auth_failed_key_is_never_used_as_fallback():
+    pool = KeyPool({1: 'sk-test-0001'})
+    pool.acquire().release(FakeError(401))
+    assert pool.keys[1].cooldown_reason == 'auth'
+    assert pool.acquire() is None
+
+
+def test_all_rate_limited_falls_back_to_earliest_release():
+    pool = KeyPool({1: 'sk-test-0001', 2: 'sk-test-0002'})
+    pool.acquire(exclude=(2,)).release(FakeError(429, {'retry-after': '50'}))
+    pool.acquire(exclude=(1,)).release(FakeError(429, {'retry-after': '5'}))
+    assert pool.acquire().key_number == 2
+
+
+def test_cancelled_lease_is_neutral_and_refunds_tokens():
+    pool = KeyPool({1: 'sk-test-0001'}, tpm=1000, completion_tokens=400)
+    key = pool.keys[1]
+    with pytest.raises(asyncio.CancelledError):
+        with pool.acquire('s1'):
+            raise asyncio.CancelledError()
+    assert key.in_flight == 0
+    assert key.stats['success'] == 0 and key.stats['errors'] == 0
+    assert key.tokens.available() > 999
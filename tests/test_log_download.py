@@ -0,0 +1,46 @@
+import io
+import zipfile
+import datetime
+
+from event_store import ConversationEventStore, format_transcript_entry
+from log_download import TranscriptDownload, iter_class_zip
+
+
+def test_class_zip_skips_excluded_dirs(tmp_path):
+    (tmp_path / '조현서').mkdir()
+    (tmp_path / '조현서' / '[2024110028_조현서].json').write_text('{"질문": 1}', encoding='utf-8')
+    (tmp_path / 'metrics').mkdir()
+    (tmp_path / 'metrics' / 'metrics_123.json').write_text('{}', encoding='utf-8')
+
+    data = b"".join(iter_class_zip(str(tmp_path), exclude_dirs=[str(tmp_path / 'metrics')]))
+    names = zipfile.ZipFile(io.BytesIO(data)).namelist()
+    assert names == ['조현서/[2024110028_조현서].json']
+
+
+def record(store, text, minute, speaker='User'):
+    store.record(speaker, text, 'log.txt', datetime.datetime(2025, 3, 1, 10, minute), scaffolding_type=None)
+
+
+def test_transcript_download_streams_a_fixed_snapshot_in_pages(tmp_path):
+    store = ConversationEventStore(str(tmp_path / 'events.db'))
+    for minute in range(7):
+        record(store, f'{minute}번 질문 ' + '가' * 50, minute)
+    store.flush()
+    download = TranscriptDownload(store, 'log.txt', '\n요약\n', store.transcript_info('log.txt'))
+    expected = "".join(format_transcript_entry('User', f'{minute}번 질문 ' + '가' * 50, datetime.datetime(2025, 3, 1, 10, minute))
+                       for minute in range(7)) + '\n요약\n'
+
+    record(store, '다운로드 이후 항목', 8)  # 길이/ETag를 정한 뒤 기록된 항목은 보내지 않음
+    store.flush()
+    rows = list(store._iter_transcript_rows('log.txt', download.last_id, batch_size=3))
+    assert len(rows) == 7
+    body = b"".join(download.iter_chunks())
+    assert body.decode('utf-8') == expected
+    assert len(body) == download.content_length
+
+    reopened = TranscriptDownload(store, 'log.txt', '\n요약\n', store.transcript_info('log.txt'))
+    assert reopened.etag != download.etag
+
+
+def test_transcript_info_is_none_without_events(tmp_path):
+    assert ConversationEventStore(str(tmp_path / 'events.db')).transcript_info('log.txt') is None
@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+
+from metrics import MetricsRegistry
+
+
+def make_registry(snapshot_dir=None):
+    registry = MetricsRegistry(snapshot_dir, flush_interval=3600)
+    registry.counter('llm_calls_total', 'LLM 호출 수', ('route', 'status'))
+    registry.histogram('llm_call_duration_seconds', 'LLM 호출 지연', ('route',), buckets=(0.1, 1.0))
+    registry.gauge('llm_in_flight', '진행 중인 호출', ('key',), lambda: {(1,): 2})
+    return registry
+
+
+def test_render_counter_with_escaped_labels():
+    registry = make_registry()
+    registry.inc('llm_calls_total', 'response', 'ok')
+    registry.inc('llm_calls_total', 'response', 'ok', value=2)
+    registry.inc('llm_calls_total', 'say "hi"\n', 'error')
+    lines = registry.render().splitlines()
+    assert '# HELP llm_calls_total LLM 호출 수' in lines
+    assert '# TYPE llm_calls_total counter' in lines
+    assert 'llm_calls_total{route="response",status="ok"} 3' in lines
+    assert 'llm_calls_total{route="say \\"hi\\"\\n",status="error"} 1' in lines
+
+
+def test_render_histogram_buckets_are_cumulative():
+    registry = make_registry()
+    for value in (0.05, 0.5, 0.5, 3.0):
+        registry.observe('llm_call_duration_seconds', value, 'nudge')
+    lines = registry.render().splitlines()
+    assert 'llm_call_duration_seconds_bucket{route="nudge",le="0.1"} 1' in lines
+    assert 'llm_call_duration_seconds_bucket{route="nudge",le="1"} 3' in lines
+    assert 'llm_call_duration_seconds_bucket{route="nudge",le="+Inf"} 4' in lines
+    assert 'llm_call_duration_seconds_count{route="nudge"} 4' in lines
+    assert 'llm_call_duration_seconds_sum{route="nudge"} 4.05' in lines
+
+
+def test_render_gauge_and_merges_values_from_all_threads():
+    registry = make_registry()
+    threads = [threading.Thread(target=registry.inc, args=('llm_calls_total', 'stream', 'ok')) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = registry.render().splitlines()
+    assert 'llm_calls_total{route="stream",status="ok"} 4' in lines
+    assert 'llm_in_flight{key="1"} 2' in lines
+
+
+def test_render_adds_other_worker_snapshots_but_not_stale_gauges(tmp_path):
+    registry = make_registry(str(tmp_path))
+    registry.inc('llm_calls_total', 'response', 'ok')
+    snapshot = {
+        'counters': {'llm_calls_total\x1fresponse\x1fok': 5},
+        'histograms': {},
+        'gauges': {'llm_in_flight\x1f1': 7},
+    }
+    path = tmp_path / 'metrics_999999.json'
+    path.write_text(json.dumps(snapshot), encoding='utf-8')
+    os.utime(path, (0, 0))  # 종료된 워커의 오래된 스냅샷
+    lines = registry.render().splitlines()
+    assert 'llm_calls_total{route="response",status="ok"} 6' in lines
+    assert 'llm_in_flight{key="1"} 2' in lines
@@ -0,0 +1,47 @@
+import pytest
+
+from metrics import create_app_metrics
+from model_router import TIER_LIGHT, TIER_PRIMARY, ModelRouter, RoutingDecision, is_trivial_message
+
+
+def user(text):
+    return [{'role': 'assistant', 'content': '무엇을 도와줄까?'}, {'role': 'user', 'content': text}]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('네', True), ('넵!', True), ('ㅋㅋㅋ', True), ('네네네', True), ('고마워요~', True), ('ok thanks', True),
+    ('네?', False), ('3번', False), ('평가 설계 도와줘', False), ('', False),
+    ('고마워 고마워 고마워 고마워', False),  # 단어 수 초과
+])
+def test_is_trivial_message(text, expected):
+    assert is_trivial_message(text) is expected
+
+
+def test_decide_routes_trivial_turns_to_light_model():
+    router = ModelRouter('gpt-4o', 'gpt-4o-mini')
+    assert router.decide('response', user('고마워!')) == RoutingDecision(TIER_LIGHT, 'gpt-4o-mini', 'trivial')
+    assert router.decide('response', user('형성평가 도구를 추천해 줘')) == RoutingDecision(TIER_PRIMARY, 'gpt-4o', 'substantive')
+    assert router.decide('response', []) == RoutingDecision(TIER_PRIMARY, 'gpt-4o', 'substantive')
+
+
+def test_decide_nudges():
+    assert ModelRouter('gpt-4o', 'gpt-4o-mini').decide('nudge', user('네')).tier == TIER_LIGHT
+    assert ModelRouter('gpt-4o', 'gpt-4o-mini', light_nudges=False).decide('nudge', []) == \
+        RoutingDecision(TIER_PRIMARY, 'gpt-4o', 'nudge')
+
+
+@pytest.mark.parametrize('router', [
+    ModelRouter('gpt-4o', 'gpt-4o-mini', enabled=False),
+    ModelRouter('gpt-4o', ''),  # 가벼운 모델이 설정되지 않음
+])
+def test_decide_disabled_always_uses_primary(router):
+    assert router.decide('response', user('네')) == RoutingDecision(TIER_PRIMARY, 'gpt-4o', 'disabled')
+    assert router.decide('nudge', []).tier == TIER_PRIMARY
+
+
+def test_route_counts_decision_but_decide_does_not():
+    metrics = create_app_metrics()
+    router = ModelRouter('gpt-4o', 'gpt-4o-mini', metrics=metrics)
+    router.decide('nudge', [])
+    router.route('nudge', [])
+    assert 'llm_routing_decisions_total{kind="nudge",tier="light",reason="nudge"} 1' in metrics.render().splitlines()
@@ -0,0 +1,62 @@
+import threading
+
+from nudge_prefetch import NudgePrefetcher, NudgeResult
+
+CONVERSATION = [{'role': 'user', 'content': '안녕'}, {'role': 'assistant', 'content': '안녕!'}]
+
+
+def make_prefetcher(tmp_path, generate_fn, **kwargs):
+    return NudgePrefetcher(str(tmp_path / 'nudge_cache.db'), generate_fn, max_workers=1, **kwargs)
+
+
+def fixed_result(student_id, conversation_id, conversation):
+    return NudgeResult('일반', f"재촉 {len(conversation)}", 'v1', 0, 'gpt-4o-mini', 'light', 120, 30)
+
+
+def test_take_returns_result_for_same_version_once(tmp_path):
+    prefetcher = make_prefetcher(tmp_path, fixed_result)
+    assert prefetcher.schedule('s1', 'c1', CONVERSATION)
+    assert prefetcher.wait_ready('c1', timeout=5)
+    assert prefetcher.take('c1', len(CONVERSATION)) == NudgeResult('일반', '재촉 2', 'v1', 0, 'gpt-4o-mini', 'light', 120, 30)
+    assert prefetcher.take('c1', len(CONVERSATION)) is None
+    assert prefetcher.stats['hits'] == 1
+    assert prefetcher.stats['misses'] == 1
+
+
+def test_take_discards_result_for_older_version(tmp_path):
+    prefetcher = make_prefetcher(tmp_path, fixed_result)
+    prefetcher.schedule('s1', 'c1', CONVERSATION)
+    prefetcher.wait_ready('c1', timeout=5)
+    assert prefetcher.take('c1', len(CONVERSATION) + 1) is None
+    assert prefetcher.stats['stale'] == 1
+    assert prefetcher.take('c1', len(CONVERSATION)) is None
+
+
+def test_take_does_not_wait_and_late_result_is_not_orphaned(tmp_path):
+    release = threading.Event()
+
+    def slow_result(student_id, conversation_id, conversation):
+        release.wait(5)
+        return fixed_result(student_id, conversation_id, conversation)
+
+    prefetcher = make_prefetcher(tmp_path, slow_result)
+    prefetcher.schedule('s1', 'c1', CONVERSATION)
+    assert not prefetcher.wait_ready('c1', timeout=0.1)
+    assert prefetcher.take('c1', len(CONVERSATION)) is None
+    assert prefetcher.stats['late'] == 1
+
+    release.set()
+    prefetcher._get_executor().shutdown(wait=True)
+    assert prefetcher.stats['discarded'] == 1
+    assert prefetcher._connect().execute("SELECT COUNT(*) FROM nudge_cache").fetchone() == (0,)
+
+
+def test_failed_generation_wakes_waiter(tmp_path):
+    def broken(student_id, conversation_id, conversation):
+        raise RuntimeError("boom")
+
+    prefetcher = make_prefetcher(tmp_path, broken)
+    prefetcher.schedule('s1', 'c1', CONVERSATION)
+    assert prefetcher.wait_ready('c1', timeout=5)
+    assert prefetcher.stats['failed'] == 1
+    assert prefetcher.take('c1', len(CONVERSATION)) is None
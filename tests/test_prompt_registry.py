@@ -0,0 +1,66 @@
+# tests/test_prompt_registry.py
+
+import os
+
+from prompt_registry import PromptRegistry
+
+FILES = ('a.md', 'b.md')
+
+
+def write(directory, filename, content):
+    path = directory / filename
+    path.write_text(content, encoding='utf-8')
+    return path
+
+
+def make_tree(tmp_path):
+    write(tmp_path, 'a.md', '첫 번째')
+    write(tmp_path, 'b.md', '두 번째')
+    return str(tmp_path)
+
+
+def test_version_does_not_depend_on_which_files_were_loaded(tmp_path):
+    prompt_dir = make_tree(tmp_path)
+    cold = PromptRegistry(prompt_dir, check_interval=0, tracked_files=FILES)
+    warm = PromptRegistry(prompt_dir, check_interval=0, tracked_files=FILES)
+    warm.get('a.md')
+    assert cold.version == warm.version
+    warm.get('b.md')
+    assert cold.version == warm.version
+
+
+def test_version_tracks_files_that_were_never_requested(tmp_path):
+    prompt_dir = make_tree(tmp_path)
+    registry = PromptRegistry(prompt_dir, check_interval=0, tracked_files=FILES)
+    assert registry.get('a.md') == '첫 번째'
+    before = registry.version
+
+    path = write(tmp_path, 'b.md', '두 번째 (수정)')
+    os.utime(path, ns=(1, 1))
+    assert registry.version != before
+    assert PromptRegistry(prompt_dir, tracked_files=FILES).version == registry.version
+
+
+def test_hot_reload_rebuilds_compiled_values(tmp_path):
+    prompt_dir = make_tree(tmp_path)
+    registry = PromptRegistry(prompt_dir, check_interval=0, tracked_files=FILES)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return registry.get('a.md') + registry.get('b.md')
+
+    assert registry.compiled('joined', build) == '첫 번째두 번째'
+    assert registry.compiled('joined', build) == '첫 번째두 번째'
+    assert len(builds) == 1
+
+    path = write(tmp_path, 'a.md', '바뀜')
+    os.utime(path, ns=(2, 2))
+    assert registry.compiled('joined', build) == '바뀜두 번째'
+    assert len(builds) == 2
+
+
+def test_missing_file_reads_as_empty(tmp_path):
+    registry = PromptRegistry(str(tmp_path), tracked_files=('none.md',))
+    assert registry.get('none.md') == ''
+    assert len(registry.version) == 12
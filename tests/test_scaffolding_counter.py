@@ -0,0 +1,63 @@
+import json
+
+from scaffolding_counter import ScaffoldingCounter
+
+TYPES = ['질문', '설명', '격려']
+
+
+def make_counter(tmp_path):
+    return ScaffoldingCounter(str(tmp_path / 'counts.db'), TYPES, export_json=True)
+
+
+def test_legacy_json_counts_are_kept_on_first_flush(tmp_path):
+    count_path = str(tmp_path / 'student' / '[2024110028_조현서].json')
+    (tmp_path / 'student').mkdir()
+    with open(count_path, 'w', encoding='utf-8') as f:
+        json.dump({'질문': 5, '설명': 2, '격려': 0}, f, ensure_ascii=False)
+
+    counter = make_counter(tmp_path)
+    counter.increment(count_path, '질문')
+    counter.flush()
+
+    assert counter.get_counts(count_path) == {'질문': 6, '설명': 2, '격려': 0}
+    with open(count_path, encoding='utf-8') as f:
+        assert json.load(f) == {'질문': 6, '설명': 2, '격려': 0}
+
+
+def test_legacy_json_is_seeded_only_once(tmp_path):
+    count_path = str(tmp_path / '[2024110029_김민수].json')
+    with open(count_path, 'w', encoding='utf-8') as f:
+        json.dump({'설명': 3}, f)
+
+    counter = make_counter(tmp_path)
+    assert counter.get_counts(count_path)['설명'] == 3
+    counter.increment(count_path, '설명')
+    counter.flush()
+
+    # 다른 워커(새 프로세스 상태)가 갱신된 JSON을 다시 보더라도 DB 값을 덮지 않음
+    other = make_counter(tmp_path)
+    other.increment(count_path, '설명')
+    other.flush()
+    assert other.get_counts(count_path)['설명'] == 5
+
+
+def test_missing_legacy_file_returns_none(tmp_path):
+    counter = make_counter(tmp_path)
+    assert counter.get_counts(str(tmp_path / '[없음].json')) is None
+
+
+def test_snapshot_json_is_not_seeded_again_by_another_worker(tmp_path):
+    count_path = str(tmp_path / '[2024110030_이서연].json')
+    with open(count_path, 'w', encoding='utf-8') as f:
+        json.dump({'질문': 2}, f, ensure_ascii=False)
+    first = make_counter(tmp_path)
+    first.increment(count_path, '질문')
+    first.flush()
+
+    # 첫 워커의 미반영 증분까지 담긴 스냅샷 (DB에 아직 없는 유형 포함)
+    with open(count_path, 'w', encoding='utf-8') as f:
+        json.dump({'질문': 3, '격려': 4}, f, ensure_ascii=False)
+    second = make_counter(tmp_path)
+    second.increment(count_path, '설명')
+    second.flush()
+    assert second.get_counts(count_path) == {'질문': 3, '설명': 1, '격려': 0}
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from session_flight import KIND_NUDGE, KIND_USER, SessionBusyError, SessionFlightControl
+
+
+def make_control(tmp_path, **kwargs):
+    options = dict(wait_timeout=0.5, poll_interval=0.02)
+    options.update(kwargs)
+    return SessionFlightControl(str(tmp_path / 'session_flight.db'), **options)
+
+
+def run_concurrently(control, kind, hold):
+    """같은 멱등 키로 두 요청을 동시에 보내고 각 요청의 결과('ran' / ('replay', ...) / 'busy')를 반환합니다."""
+    results = []
+    leader_in = threading.Event()
+
+    def leader():
+        with control.flight('c1', kind, 'K1') as flight:
+            leader_in.set()
+            time.sleep(hold)
+            flight.complete(200, {'response': '재촉'})
+            results.append('ran')
+
+    def follower():
+        leader_in.wait(5)
+        try:
+            with control.flight('c1', kind, 'K1') as flight:
+                results.append(('replay', flight.replay) if flight.replay else 'ran')
+        except SessionBusyError:
+            results.append('busy')
+
+    threads = [threading.Thread(target=leader), threading.Thread(target=follower)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize('kind', [KIND_USER, KIND_NUDGE])
+def test_same_key_follower_replays_leader_result(tmp_path, kind):
+    control = make_control(tmp_path)
+    results = run_concurrently(control, kind, hold=0.1)
+    assert sorted(map(str, results)) == sorted(map(str, ['ran', ('replay', (200, {'response': '재촉'}))]))
+    assert control.stats['replayed'] == 1
+
+
+@pytest.mark.parametrize('kind', [KIND_USER, KIND_NUDGE])
+def test_same_key_follower_gives_up_with_busy_error(tmp_path, kind):
+    control = make_control(tmp_path, wait_timeout=0.1)
+    results = run_concurrently(control, kind, hold=0.5)
+    assert sorted(results, key=str) == ['busy', 'ran']
+    assert control.stats['busy'] == 1
+
+
+def test_nudge_is_cancelled_while_user_message_runs(tmp_path):
+    control = make_control(tmp_path)
+    with control.flight('c1', KIND_USER, 'U1'):
+        with control.flight('c1', KIND_NUDGE, 'N1') as nudge:
+            assert nudge.cancelled
@@ -0,0 +1,49 @@
+import pytest
+
+from static_assets import StaticAssets, choose_encoding, etag_matches
+
+
+@pytest.mark.parametrize('accept_encoding, available, expected', [
+    ('gzip, deflate, br', {'gzip': 100, 'br': 80}, 'br'),
+    ('gzip, deflate', {'gzip': 100, 'br': 80}, 'gzip'),
+    ('br;q=0, gzip', {'gzip': 100, 'br': 80}, 'gzip'),
+    ('br; q=0.0', {'br': 80}, None),
+    ('BR', {'br': 80}, 'br'),
+    ('gzip', {}, None),
+    (None, {'gzip': 100}, None),
+    ('identity', {'gzip': 100}, None),
+])
+def test_choose_encoding(accept_encoding, available, expected):
+    assert choose_encoding(accept_encoding, available) == expected
+
+
+@pytest.mark.parametrize('if_none_match, expected', [
+    ('"abc123-gzip"', True),
+    ('"other", "abc123-gzip"', True),
+    ('W/"abc123-gzip"', True),
+    ('*', True),
+    ('"abc123"', False),  # 압축본마다 ETag가 다름
+    ('', False),
+    (None, False),
+])
+def test_etag_matches_for_304(if_none_match, expected):
+    assert etag_matches(if_none_match, '"abc123-gzip"') is expected
+
+
+def test_build_fingerprints_and_precompresses(tmp_path):
+    static_dir = tmp_path / 'static'
+    (static_dir / 'css').mkdir(parents=True)
+    (static_dir / 'css' / 'chat_ui.css').write_text('body { color: black; }\n' * 100, encoding='utf-8')
+    (static_dir / 'logo.png').write_bytes(b'\x89PNG' + b'\0' * 10)
+
+    assets = StaticAssets(str(static_dir), str(tmp_path / 'build'))
+    css_name = assets.url_name('css/chat_ui.css')
+    assert css_name.startswith('css/chat_ui.') and css_name.endswith('.css') and css_name != 'css/chat_ui.css'
+
+    entry, immutable = assets.lookup(css_name)
+    assert immutable and 'gzip' in entry['encodings']
+    assert (tmp_path / 'build' / (css_name + '.gz')).exists()
+    source_entry, source_immutable = assets.lookup('css/chat_ui.css')
+    assert source_entry['hashed'] == css_name and not source_immutable
+    assert StaticAssets.etag(entry, 'gzip') != StaticAssets.etag(entry)
+    assert assets.lookup('logo.png')[0]['encodings'] == {}
@@ -0,0 +1,55 @@
+# tests/test_stream_utils.py
+
+import json
+
+from stream_utils import ResponseTextExtractor, format_sse
+
+
+def feed_chunks(body, size):
+    extractor = ResponseTextExtractor()
+    pieces = [extractor.feed(body[i:i + size]) for i in range(0, len(body), size)]
+    return extractor, "".join(pieces)
+
+
+def test_extracts_response_text_across_every_chunk_boundary():
+    text = '안녕 "친구"\n반가워 \\ / 탭\t끝 😀'
+    body = json.dumps({'scaffolding_type': '인지적 스캐폴딩', 'response_text': text, 'extra': 1}, ensure_ascii=True)
+    for size in range(1, 13):
+        extractor, streamed = feed_chunks(body, size)
+        assert streamed == text, size
+        assert extractor.text == text
+        assert extractor.done
+        assert extractor.buffer == body
+
+
+def test_waits_for_key_before_emitting():
+    extractor = ResponseTextExtractor()
+    assert extractor.feed('{"scaffolding_type": "동기적", "resp') == ""
+    assert extractor.feed('onse_text": "가나') == "가나"
+    assert extractor.feed('다"}') == "다"
+    assert extractor.feed(' trailing') == ""
+
+
+def test_incomplete_escape_is_held_until_next_chunk():
+    extractor = ResponseTextExtractor()
+    assert extractor.feed('{"response_text": "a\\') == "a"
+    assert extractor.feed('u00') == ""
+    assert extractor.feed('e9b"}') == "éb"
+
+
+def test_invalid_escapes_are_preserved():
+    extractor = ResponseTextExtractor()
+    assert extractor.feed('{"response_text": "x\\qy\\uZZZZ"}') == "x\\qy\\uZZZZ"
+
+
+def test_unpaired_surrogates_become_replacement_characters():
+    body = '{"response_text": "a\\ud83db\\ude00c\\ud83d\\u0041\\ud83d"}'
+    for size in range(1, 8):
+        extractor, streamed = feed_chunks(body, size)
+        assert streamed == "a\ufffdb\ufffdc\ufffdA\ufffd", size
+        assert extractor.done
+        streamed.encode('utf-8')
+
+
+def test_format_sse_keeps_korean_readable():
+    assert format_sse({'type': 'delta', 'text': '한글'}) == 'data: {"type": "delta", "text": "한글"}\n\n'